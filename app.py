@@ -1,12 +1,23 @@
+import json
+import sys
+import uuid
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage
 
-from core.db import init_db, get_conn
-from core.data_loader import load_csv
-from core.agent_graph import finance_graph
+from core.db import init_db
+from core import jobs, vendor_risk
+from core.aging import BUCKETS as AGING_BUCKETS, get_aging
+from core.dashboard import get_dashboard_metrics
+from core.explorer import EXPLORABLE_TABLES, OPERATORS as FILTER_OPERATORS, Filter, fetch_page, query_key, table_columns
+from core.forecast import run_forecast
+from core.anomalies import get_alerts
+from core.reconciliation import get_reconciliation_summary, get_status_mismatches
+from core.scenarios import BASELINE_WINDOW_DAYS, CATEGORIES, DELAY, evaluate, evaluate_grid, load_baseline, tornado
+from core.vendor_risk import FEATURES as RISK_FEATURES, get_vendor_risk
+from core import instrumentation
+from core.instrumentation import span
 
 # -------------------------------------------------
 # INIT
@@ -14,344 +25,570 @@ from core.agent_graph import finance_graph
 load_dotenv()
 init_db()
 
+
+@st.cache_resource
+def start_scheduler():
+    """Background job workers, started once per server process."""
+    return jobs.get_scheduler()
+
+
+start_scheduler()
+
 st.set_page_config(page_title="💰 Cash Management System", layout="wide")
 st.title("💰 AI Cash Management System")
 
+
+def render_agent_answer(question, standalone=False):
+    """Stream the agent's answer into the page as it is generated, as the
+    next turn of this session's conversation. A standalone question gets
+    no thread or history, so identical prompts hit the LLM cache."""
+    # LangChain/LangGraph load on the first question, not at startup
+    from core.agent_graph import stream_answer
+    thread_id = None if standalone else st.session_state.setdefault("agent_thread", uuid.uuid4().hex)
+    timing = {}
+
+    def tokens():
+        for event in stream_answer(question, thread_id=thread_id):
+            if event["type"] == "token":
+                yield event["content"]
+            elif event["type"] == "done":
+                timing.update(event)
+
+    st.write_stream(tokens())
+    if timing:
+        st.caption(
+            f"⏱️ first token {timing['ttft_ms']:.0f} ms · total {timing['total_ms']:.0f} ms"
+        )
+
+
+def render_diagnostics():
+    """Span histograms, slow queries and exports (open with ?diagnostics=1)."""
+    snap = instrumentation.snapshot()
+    with st.expander("🩺 Diagnostics", expanded=True):
+        spans = pd.DataFrame(snap["spans"])
+        if spans.empty:
+            st.caption("No spans recorded yet.")
+        else:
+            kind = st.selectbox("Span kind", ["all"] + sorted(spans["kind"].unique()))
+            if kind != "all":
+                spans = spans[spans["kind"] == kind]
+            st.dataframe(
+                spans[["kind", "name", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "sum_ms"]],
+                use_container_width=True
+            )
+
+        st.caption(f"Slow queries (≥ {snap['slow_query_ms']:.0f} ms)")
+        for q in snap["slow_queries"][:10]:
+            st.code(f"-- {q['ms']:.0f} ms at {q['at']}\n{q['sql']}\n" +
+                    "\n".join(f"-- {step}" for step in q["plan"] or []), language="sql")
+
+        agent = sys.modules.get("core.agent_graph")   # not loaded until the first question
+        st.json({"agent": agent.latency_metrics() if agent else {"queries": 0}, **snap["gauges"]},
+                expanded=False)
+
+        d1, d2, d3 = st.columns(3)
+        d1.download_button("JSON", json.dumps(snap, default=str), "metrics.json", "application/json")
+        d2.download_button("Prometheus", instrumentation.to_prometheus(snap), "metrics.prom", "text/plain")
+        if d3.button("Reset"):
+            instrumentation.reset()
+            st.rerun()
+
 # -------------------------------------------------
 # SIDEBAR – DATA LOAD
 # -------------------------------------------------
+JOB_POLL_SECONDS = 2
+JOB_LABELS = {
+    "ingest": "📥 Load CSV Data",
+    "rollups": "🔁 Rebuild Rollups",
+    "reconciliation": "🔗 Re-run Reconciliation",
+    "forecast": "📆 Refresh Forecast",
+    "vendor_risk": "⚠️ Re-score Vendors",
+    "anomalies": "🚨 Re-scan Anomalies",
+}
+JOB_ICONS = {"pending": "⏳", "running": "⚙️", "succeeded": "✅", "failed": "❌", "cancelled": "🚫"}
+
+
+def render_jobs():
+    """Recent background jobs; polled by the fragment while any are active."""
+    recent = jobs.list_jobs(limit=5)
+    active = recent["status"].isin(jobs.ACTIVE).any()
+    for job in recent.itertuples():
+        label = f"{JOB_ICONS.get(job.status, '')} {JOB_LABELS.get(job.kind, job.kind)} · {job.status}"
+        if job.status == "running":
+            st.progress(job.progress, text=f"{label} — {job.message or ''}")
+        else:
+            st.caption(label)
+        if job.status == "failed" and job.error:
+            st.caption(job.error.splitlines()[0])
+        if job.status in jobs.ACTIVE and not job.cancel_requested:
+            if st.button("Cancel", key=f"cancel_job_{job.id}"):
+                jobs.cancel(job.id)
+                st.rerun(scope="fragment")
+
+    ingest_id = st.session_state.get("ingest_job")
+    if ingest_id is not None:
+        job = jobs.get_job(ingest_id)
+        if job and job["status"] == "succeeded":
+            st.success(
+                f"✅ Data Loaded Successfully ({sum(job['result'].values()):,} new/updated rows)"
+            )
+    # a job finished since the last full run: rerun the page on the new data
+    if st.session_state.get("jobs_active") and not active:
+        st.session_state["jobs_active"] = False
+        st.rerun()
+
+
+def start_job(kind, params=None):
+    """Queue a job, or run it in this rerun when JOB_WORKERS=0 (nothing
+    would ever pick a queued one up)."""
+    if jobs.JOB_WORKERS:
+        return jobs.submit(kind, params)
+    with st.spinner(f"{JOB_LABELS[kind]}…"):
+        return jobs.run_inline(kind, params)
+
+
 with st.sidebar:
     st.header("⚙️ Setup")
 
-    if st.button("📥 Load CSV Data"):
-        load_csv("bank_statements", "data/bank_statements.csv")
-        load_csv("vendor_invoices", "data/vendor_invoices.csv")
-        load_csv("client_invoices", "data/client_invoices.csv")
-        load_csv("payroll", "data/payroll.csv")
-        load_csv("expense_receipts", "data/expense_receipts.csv")
-        st.success("✅ Data Loaded Successfully")
+    if st.button(JOB_LABELS["ingest"]):
+        st.session_state["ingest_job"] = start_job("ingest")
+
+    with st.expander("🛠️ Background Jobs"):
+        for kind in ("rollups", "reconciliation", "forecast", "vendor_risk", "anomalies"):
+            if st.button(JOB_LABELS[kind], key=f"submit_{kind}"):
+                start_job(kind, jobs.forecast_params() if kind == "forecast" else None)
+
 
 # -------------------------------------------------
 # TABS
 # -------------------------------------------------
+# Only the selected tab runs (on_change="rerun"), so opening the app does
+# not pay for the dashboard's charts and forecast, and plotly and the
+# agent stack load when their tab is first used.
 tab_agent, tab_tables, tab_dashboard, tab_alerts = st.tabs(
-    ["🤖 Ask Agent", "📋 Data Tables", "📊 Dashboards", "🚨 Alerts"]
+    ["🤖 Ask Agent", "📋 Data Tables", "📊 Dashboards", "🚨 Alerts"],
+    key="main_tab", on_change="rerun"
 )
 
 # =================================================
 # 🤖 TAB 1 – ASK AGENT
 # =================================================
-with tab_agent:
-    st.subheader("🤖 Ask the Cash Agent")
-
-    query = st.text_input("Ask about your cash situation")
-
-    if query:
-        result = finance_graph.invoke({
-            "messages": [HumanMessage(content=query)]
-        })
-        st.success(result["messages"][-1].content)
+if tab_agent.open:
+    with tab_agent, span("tab", "agent"):
+        st.subheader("🤖 Ask the Cash Agent")
+
+        # the conversation lives in the agent's checkpoint, not session state
+        thread_id = st.session_state.get("agent_thread")
+        if thread_id:
+            from core.agent_graph import forget, get_conversation
+            summary, turns = get_conversation(thread_id)
+            if summary:
+                with st.expander("🗂️ Earlier in this conversation"):
+                    st.markdown(summary)
+            for role, text in turns:
+                with st.chat_message(role):
+                    st.markdown(text)
+            if st.button("🆕 New conversation"):
+                forget(thread_id)
+                del st.session_state["agent_thread"]
+                st.rerun()
+
+        query = st.chat_input("Ask about your cash situation")
+
+        if query:
+            with st.chat_message("user"):
+                st.markdown(query)
+            with st.chat_message("assistant"):
+                render_agent_answer(query)
 
 # =================================================
 # 📋 TAB 2 – DATA TABLES
 # =================================================
-with tab_tables:
-    st.subheader("📋 Financial Data Explorer")
-
-    table = st.selectbox(
-        "Select table",
-        [
-            "bank_statements",
-            "vendor_invoices",
-            "client_invoices",
-            "payroll",
-            "expense_receipts"
-        ]
-    )
-
-    conn = get_conn()
-    df = pd.read_sql(f"SELECT * FROM {table} LIMIT 500", conn)
-    conn.close()
-
-    st.dataframe(df, use_container_width=True)
+if tab_tables.open:
+    with tab_tables, span("tab", "tables"):
+        st.subheader("📋 Financial Data Explorer")
+
+        table = st.selectbox("Select table", EXPLORABLE_TABLES)
+        all_columns = table_columns(table)
+
+        e1, e2, e3 = st.columns(3)
+        shown = e1.multiselect("Columns", all_columns, default=all_columns)
+        sort_col = e2.selectbox("Sort by", all_columns)
+        descending = e3.toggle("Descending")
+
+        f1, f2, f3 = st.columns(3)
+        filter_col = f1.selectbox("Filter column", ["(none)"] + all_columns)
+        filter_op = f2.selectbox("Operator", list(FILTER_OPERATORS))
+        filter_value = f3.text_input("Value")
+        filters = (
+            [Filter(filter_col, filter_op, filter_value)]
+            if filter_col != "(none)" and (filter_value or filter_op == "is empty") else []
+        )
+        page_size = st.select_slider("Rows per page", [50, 100, 250, 500, 1000], value=100)
+
+        # cursors of the pages visited so far; reset whenever the query changes
+        current = query_key(table, shown, sort_col, descending, filters, page_size)
+        if st.session_state.get("explorer_query") != current:
+            st.session_state["explorer_query"] = current
+            st.session_state["explorer_cursors"] = [None]
+        cursors = st.session_state["explorer_cursors"]
+
+        page = fetch_page(
+            table, columns=shown, filters=filters, sort=sort_col,
+            descending=descending, after=cursors[-1], page_size=page_size
+        )
+
+        st.dataframe(page.rows, use_container_width=True)
+
+        p1, p2, p3 = st.columns([1, 1, 4])
+        if p1.button("◀ Prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if p2.button("Next ▶", disabled=page.next_cursor is None):
+            cursors.append(page.next_cursor)
+            st.rerun()
+        first_row = (len(cursors) - 1) * page_size + 1
+        total = f"{page.count:,}" if page.count_exact else f"~{page.count:,}"
+        p3.caption(
+            f"Rows {first_row:,}–{first_row + len(page.rows) - 1:,} of {total} · {page.elapsed_ms:.0f} ms"
+        )
 
 # =================================================
 # 📊 TAB 3 – DASHBOARDS
 # =================================================
-with tab_dashboard:
-    st.subheader("📊 Cash & Expense Dashboard")
-
-    conn = get_conn()
-
-    # ------------------------------
-    # KPI CALCULATIONS
-    # ------------------------------
-    balance_df = pd.read_sql("""
-        SELECT balance_after
-        FROM bank_statements
-        ORDER BY transaction_date DESC
-        LIMIT 1
-    """, conn)
-
-    current_balance = balance_df.iloc[0]["balance_after"]
-
-    cash_30d = pd.read_sql("""
-        SELECT
-            SUM(CASE WHEN transaction_type='CREDIT' THEN amount ELSE 0 END) AS inflow,
-            SUM(CASE WHEN transaction_type='DEBIT' THEN amount ELSE 0 END) AS outflow
-        FROM bank_statements
-        WHERE transaction_date >= date('now', '-30 day')
-    """, conn)
-
-    inflow_30d = cash_30d.iloc[0]["inflow"] or 0
-    outflow_30d = cash_30d.iloc[0]["outflow"] or 0
-    net_change = inflow_30d - outflow_30d
-
-    burn_rate = outflow_30d / 30 if outflow_30d else 0
-    runway_days = int(current_balance / burn_rate) if burn_rate else 999
-
-    # ------------------------------
-    # KPI CARDS
-    # ------------------------------
-    c1, c2, c3, c4 = st.columns(4)
-    c1.metric("💰 Cash Balance", f"₹{int(current_balance):,}")
-    c2.metric("📉 Net Change (30d)", f"₹{int(net_change):,}")
-    c3.metric("🔥 Burn / Day", f"₹{int(burn_rate):,}")
-    c4.metric("⏳ Cash Runway", f"{runway_days} days")
-
-    # ------------------------------
-    # CASH TREND
-    # ------------------------------
-    cash_trend = pd.read_sql("""
-        SELECT
-            transaction_date,
-            SUM(
-                CASE WHEN transaction_type='CREDIT'
-                     THEN amount ELSE -amount END
-            ) AS net_flow
-        FROM bank_statements
-        GROUP BY transaction_date
-        ORDER BY transaction_date
-    """, conn)
-
-    cash_trend["balance"] = cash_trend["net_flow"].cumsum()
-
-    fig1 = px.line(
-        cash_trend,
-        x="transaction_date",
-        y="balance",
-        title="Cash Balance Over Time (₹)",
-        markers=True
-    )
-
-    st.plotly_chart(fig1, use_container_width=True)
-
-    # ------------------------------
-    # EXPENSE BREAKDOWN
-    # ------------------------------
-    expense_df = pd.read_sql("""
-        SELECT category, SUM(amount) AS total_spent
-        FROM bank_statements
-        WHERE transaction_type='DEBIT'
-        GROUP BY category
-    """, conn)
-
-    fig2 = px.pie(
-        expense_df,
-        names="category",
-        values="total_spent",
-        title="Expense Distribution"
-    )
-
-    st.plotly_chart(fig2, use_container_width=True)
-
-    # ------------------------------
-    # MONTHLY CASH FLOW TABLE
-    # ------------------------------
-    monthly_df = pd.read_sql("""
-        SELECT
-            strftime('%Y-%m', transaction_date) AS month,
-            SUM(CASE WHEN transaction_type='CREDIT' THEN amount ELSE 0 END) AS inflow,
-            SUM(CASE WHEN transaction_type='DEBIT' THEN amount ELSE 0 END) AS outflow
-        FROM bank_statements
-        GROUP BY month
-        ORDER BY month
-    """, conn)
-
-    monthly_df["net"] = monthly_df["inflow"] - monthly_df["outflow"]
-
-    st.subheader("📆 Monthly Cash Flow")
-    st.dataframe(monthly_df, use_container_width=True)
-
-    # ------------------------------
-    # AI EXPLAIN THIS
-    # ------------------------------
-    if st.button("🧠 Explain Cash Situation"):
-        explanation = finance_graph.invoke({
-            "messages": [HumanMessage(
-                content="Explain the current cash situation and major trends"
-            )]
-        })
-        st.info(explanation["messages"][-1].content)
-
-    st.divider()
-    st.subheader("🔮 What-If Scenario Simulator")
-
-    col1, col2, col3 = st.columns(3)
-
-    salary_hike = col1.slider("Salary Increase (%)", 0, 30, 0)
-    vendor_hike = col2.slider("Vendor Cost Increase (%)", 0, 30, 0)
-    revenue_drop = col3.slider("Revenue Drop (%)", 0, 30, 0)
-
-    conn = get_conn()
-
-    base_df = pd.read_sql("""
-        SELECT
-            SUM(CASE WHEN transaction_type='CREDIT' THEN amount ELSE 0 END) AS inflow,
-            SUM(CASE WHEN transaction_type='DEBIT' THEN amount ELSE 0 END) AS outflow
-        FROM bank_statements
-        WHERE transaction_date >= date('now', '-30 day')
-    """, conn)
-
-    conn.close()
-
-    base_inflow = base_df.iloc[0]["inflow"]
-    base_outflow = base_df.iloc[0]["outflow"]
-
-    adjusted_inflow = base_inflow * (1 - revenue_drop / 100)
-    adjusted_outflow = base_outflow * (
-        1 + (salary_hike + vendor_hike) / 200
-    )
-
-    adjusted_burn = adjusted_outflow / 30
-    adjusted_runway = int(current_balance / adjusted_burn) if adjusted_burn else 999
-
-    st.metric("📉 Adjusted Monthly Outflow", f"₹{int(adjusted_outflow):,}")
-    st.metric("⏳ Adjusted Cash Runway", f"{adjusted_runway} days")
-
-    st.divider()
-    st.subheader("🧠 Root Cause Analysis (MoM)")
-
-    conn = get_conn()
-
-    df = pd.read_sql("""
-        SELECT
-            strftime('%Y-%m', transaction_date) AS month,
-            category,
-            SUM(amount) AS total
-        FROM bank_statements
-        WHERE transaction_type='DEBIT'
-        GROUP BY month, category
-    """, conn)
-
-    conn.close()
-
-    latest_month = df["month"].max()
-    previous_month = sorted(df["month"].unique())[-2]
-
-    latest = df[df["month"] == latest_month]
-    previous = df[df["month"] == previous_month]
-
-    merged = latest.merge(
-        previous,
-        on="category",
-        how="left",
-        suffixes=("_latest", "_prev")
-    ).fillna(0)
-
-    merged["delta"] = merged["total_latest"] - merged["total_prev"]
-    top_drivers = merged.sort_values("delta", ascending=False).head(5)
-
-    for _, row in top_drivers.iterrows():
-        st.write(
-            f"- {row['category']}: +₹{int(row['delta'])}"
+if tab_dashboard.open:
+    with tab_dashboard, span("tab", "dashboard"):
+        import plotly.express as px
+
+        st.subheader("📊 Cash & Expense Dashboard")
+        metrics = get_dashboard_metrics()
+
+        # ------------------------------
+        # KPI CALCULATIONS
+        # ------------------------------
+        current_balance = metrics.current_balance
+        net_change = metrics.net_change_30d
+        burn_rate = metrics.burn_rate
+        runway_days = metrics.runway_days
+
+        # ------------------------------
+        # KPI CARDS
+        # ------------------------------
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("💰 Cash Balance", f"₹{int(current_balance):,}")
+        c2.metric("📉 Net Change (30d)", f"₹{int(net_change):,}")
+        c3.metric("🔥 Burn / Day", f"₹{int(burn_rate):,}")
+        c4.metric("⏳ Cash Runway", f"{runway_days} days")
+
+        # ------------------------------
+        # CASH TREND
+        # ------------------------------
+        cash_trend = metrics.cash_trend
+
+        fig1 = px.line(
+            cash_trend,
+            x="transaction_date",
+            y="balance",
+            title="Cash Balance Over Time (₹)",
+            markers=True
         )
 
-    st.divider()
-    st.subheader("⚠️ Vendor Risk Scoring")
-
-    conn = get_conn()
-
-    vendor_df = pd.read_sql("""
-        SELECT
-            counterparty_name AS vendor,
-            COUNT(*) AS payments,
-            SUM(amount) AS total_paid,
-            AVG(amount) AS avg_payment
-        FROM bank_statements
-        WHERE transaction_type='DEBIT'
-        GROUP BY vendor
-    """, conn)
-
-    conn.close()
+        st.plotly_chart(fig1, use_container_width=True)
 
-    vendor_df["risk_score"] = (
-        vendor_df["total_paid"] * 0.5 +
-        vendor_df["payments"] * 0.3 +
-        vendor_df["avg_payment"] * 0.2
-    )
+        # ------------------------------
+        # EXPENSE BREAKDOWN
+        # ------------------------------
+        expense_df = metrics.expense_breakdown
 
-    top_risk = vendor_df.sort_values(
-        "risk_score", ascending=False
-    ).head(10)
-
-    st.dataframe(
-        top_risk[["vendor", "total_paid", "payments", "risk_score"]],
-        use_container_width=True
-    )
-
-    st.divider()
-    st.subheader("📆 90-Day Cash Forecast")
-
-    forecast_days = 90
-    forecast_df = []
-
-    balance = current_balance
+        fig2 = px.pie(
+            expense_df,
+            names="category",
+            values="total_spent",
+            title="Expense Distribution"
+        )
 
-    for day in range(1, forecast_days + 1):
-        balance -= burn_rate
-        forecast_df.append({
-            "Day": day,
-            "Projected Balance": max(balance, 0)
-        })
+        st.plotly_chart(fig2, use_container_width=True)
+
+        # ------------------------------
+        # MONTHLY CASH FLOW TABLE
+        # ------------------------------
+        monthly_df = metrics.monthly_flow
+
+        st.subheader("📆 Monthly Cash Flow")
+        st.dataframe(monthly_df, use_container_width=True)
+
+        # ------------------------------
+        # RECEIVABLES / PAYABLES AGING
+        # ------------------------------
+        st.subheader("🧾 Receivables & Payables Aging")
+        aging_as_of = st.date_input("As of (blank = today)", value=None, key="aging_as_of")
+        receivables = get_aging("receivables", aging_as_of)
+        payables = get_aging("payables", aging_as_of)
+
+        def days_label(days):
+            return f"{days:.0f} days" if days is not None else "n/a"
+
+        a1, a2, a3, a4 = st.columns(4)
+        a1.metric("📥 Open Receivables", f"₹{int(receivables.open_total):,}")
+        a2.metric("⏱️ DSO", days_label(receivables.turnover_days))
+        a3.metric("📤 Open Payables", f"₹{int(payables.open_total):,}")
+        a4.metric("⏱️ DPO", days_label(payables.turnover_days))
+        for label, report in (("receivables", receivables), ("payables", payables)):
+            if report.status_mismatch["invoices"]:
+                st.caption(
+                    f"ℹ️ {report.status_mismatch['invoices']:,} {label} invoices "
+                    f"(₹{int(report.status_mismatch['amount']):,}) are still marked open but have a "
+                    f"matching bank payment, so they count as settled here. See 🚨 Alerts for the "
+                    f"status mismatches."
+                )
+
+        buckets_df = pd.DataFrame([
+            {"side": label, "bucket": bucket, "amount": report.totals[bucket]}
+            for label, report in (("Receivables", receivables), ("Payables", payables))
+            for bucket in AGING_BUCKETS
+        ])
+        fig_aging = px.bar(
+            buckets_df, x="bucket", y="amount", color="side", barmode="group",
+            title=f"Open Invoices by Days Past Due (as of {receivables.as_of})"
+        )
+        st.plotly_chart(fig_aging, use_container_width=True)
+
+        curve_df = pd.concat([
+            receivables.curve.assign(series="Expected collections"),
+            payables.curve.assign(series="Expected payments"),
+        ])
+        fig_curve = px.line(
+            curve_df, x="date", y="expected_settled", color="series",
+            title="Expected Settlement of Open Invoices (cumulative)"
+        )
+        fig_curve.update_layout(yaxis_title="₹", legend_title_text="")
+        st.plotly_chart(fig_curve, use_container_width=True)
+
+        g1, g2 = st.columns(2)
+        g1.dataframe(receivables.by_counterparty, use_container_width=True)
+        g2.dataframe(payables.by_counterparty, use_container_width=True)
+
+        # ------------------------------
+        # AI EXPLAIN THIS
+        # ------------------------------
+        if st.button("🧠 Explain Cash Situation"):
+            render_agent_answer("Explain the current cash situation and major trends", standalone=True)
+
+        st.divider()
+        st.subheader("🔮 What-If Scenario Simulator")
+
+        baseline = load_baseline()
+        # the baseline ends at the latest transaction, the burn above at today
+        st.caption(
+            f"Baseline: category flows from {baseline.window[0]} to {baseline.window[1]} "
+            f"(the latest {BASELINE_WINDOW_DAYS} days of data), repeated over the horizon."
+        )
 
-    forecast_df = pd.DataFrame(forecast_df)
+        col1, col2, col3 = st.columns(3)
+
+        scenario = {
+            "Salary": col1.slider("Salary Increase (%)", 0, 30, 0),
+            "Vendor Payment": col2.slider("Vendor Cost Increase (%)", 0, 30, 0),
+            "Client Collection": -col3.slider("Revenue Drop (%)", 0, 30, 0),
+            "Rent": col1.slider("Rent Increase (%)", 0, 30, 0),
+            "Operating Expense": col2.slider("Operating Expense Increase (%)", 0, 30, 0),
+        }
+        collection_delay = col3.slider("Collection Delay (days)", 0, 90, 0)
+
+        point = evaluate(baseline, scenario, collection_delay)
+        adjusted_runway = int(point.runway_days[0])
+        runway_label = (
+            f"{adjusted_runway} days" if adjusted_runway < point.horizon_days
+            else f"> {point.horizon_days} days"
+        )
 
-    fig_forecast = px.line(
-        forecast_df,
-        x="Day",
-        y="Projected Balance",
-        title="Projected Cash Balance (Next 90 Days)"
-    )
+        st.metric(
+            "📉 Adjusted Monthly Outflow", f"₹{int(point.outflow_30d[0]):,}",
+            help=f"30 days of the {baseline.window[0]} to {baseline.window[1]} baseline, not the 30 days to today"
+        )
+        st.metric("⏳ Adjusted Cash Runway", runway_label)
+
+        metric_labels = {
+            "end_balance": "Balance at Horizon",
+            "min_balance": "Minimum Balance",
+            "runway_days": "Runway (days)",
+        }
+        sensitivity_metric = st.selectbox(
+            "Sensitivity metric", list(metric_labels), format_func=metric_labels.get
+        )
 
-    st.plotly_chart(fig_forecast, use_container_width=True)
+        grid = evaluate_grid(
+            baseline,
+            {"Salary": range(0, 31), "Vendor Payment": range(0, 31)},
+            fixed={k: v for k, v in scenario.items() if k not in ("Salary", "Vendor Payment")}
+            | {DELAY: collection_delay},
+        )
+        heatmap = grid.pivot(index="Vendor Payment", columns="Salary", values=sensitivity_metric)
+        fig_heatmap = px.imshow(
+            heatmap,
+            origin="lower",
+            aspect="auto",
+            labels={"x": "Salary Increase (%)", "y": "Vendor Cost Increase (%)",
+                    "color": metric_labels[sensitivity_metric]},
+            title=f"{metric_labels[sensitivity_metric]} by Salary × Vendor Cost Increase"
+        )
+        st.plotly_chart(fig_heatmap, use_container_width=True)
 
+        swings = tornado(
+            baseline,
+            {c: (-30, 30) for c in CATEGORIES} | {DELAY: (0, 60)},
+            fixed=scenario | {DELAY: collection_delay},
+            metric=sensitivity_metric,
+        )
+        fig_tornado = px.bar(
+            swings.melt(id_vars="driver", value_vars=["at_low", "at_high"],
+                        var_name="end", value_name="change"),
+            x="change",
+            y="driver",
+            color="end",
+            orientation="h",
+            barmode="overlay",
+            title=f"Sensitivity of {metric_labels[sensitivity_metric]} (±30%, delay 0–60 days)"
+        )
+        st.plotly_chart(fig_tornado, use_container_width=True)
+
+        st.divider()
+        st.subheader("🧠 Root Cause Analysis (MoM)")
+
+        top_drivers = metrics.mom_drivers.head(5)
+
+        for _, row in top_drivers.iterrows():
+            st.write(
+                f"- {row['category']}: +₹{int(row['delta'])}"
+            )
+
+        st.divider()
+        st.subheader("⚠️ Vendor Risk Scoring")
+
+        # late_ratio and exposure are relative to today; re-score once a day
+        # (a failed re-score is left for the sidebar button, not retried per rerun)
+        if vendor_risk.is_stale():
+            if not jobs.JOB_WORKERS:
+                vendor_risk.refresh()
+            else:
+                last = jobs.latest_job("vendor_risk")
+                if last is None or last["status"] not in (*jobs.ACTIVE, "failed"):
+                    jobs.submit("vendor_risk")
+        top_risk = get_vendor_risk(limit=10)
+
+        if top_risk.empty:
+            st.info("No vendor risk scores yet.")
+        else:
+            st.caption(
+                f"Scored {top_risk['computed_at'].iloc[0]} from concentration, late payments, "
+                f"spend volatility, growth and unpaid exposure (0–100)"
+            )
+            st.dataframe(
+                top_risk[["vendor", "score", "score_change", *RISK_FEATURES, "total_paid", "unpaid"]],
+                use_container_width=True
+            )
+
+        st.divider()
+        st.subheader("📆 90-Day Cash Forecast")
+
+        # simulated by a background job; this run only reads the cached or
+        # persisted result
+        ready, forecast = run_forecast.peek(days=90)
+        if not ready and not jobs.JOB_WORKERS:
+            ready, forecast = True, run_forecast(days=90)
+        job = None
+        if not ready:
+            job, forecast = jobs.latest_forecast(days=90)
+            ready = forecast is not None
+
+        if not ready and job is not None and job["status"] == "failed":
+            error = (job["error"] or "unknown error").splitlines()[0]
+            st.error(f"❌ The forecast job failed: {error}")
+            if st.button("Retry forecast"):
+                jobs.submit_forecast(days=90)
+                st.rerun()
+        elif not ready:
+            if job is None or job["status"] == "cancelled":
+                jobs.submit_forecast(days=90)
+            st.info("⏳ The forecast is being computed in the background and will appear here when ready.")
+        else:
+            forecast_df = forecast.to_frame().rename(columns={
+                "date": "Date", "p5": "Pessimistic (P5)", "p50": "Median (P50)", "p95": "Optimistic (P95)"
+            })
+
+            # the simulation starts the day after the last bank transaction,
+            # which can be well before today
+            first, last = (d.strftime("%d %b %Y") for d in (forecast.dates[0], forecast.dates[-1]))
+
+            f1, f2 = st.columns(2)
+            f1.metric(f"📉 P5 Balance on {last}", f"₹{int(forecast.percentiles[5][-1]):,}")
+            f2.metric("⚠️ Shortfall Probability (90d)", f"{forecast.prob_shortfall.max():.1%}")
+
+            fig_forecast = px.line(
+                forecast_df,
+                x="Date",
+                y=["Pessimistic (P5)", "Median (P50)", "Optimistic (P95)"],
+                title=f"Projected Cash Balance, {first} – {last}"
+            )
+            fig_forecast.update_layout(yaxis_title="Projected Balance", legend_title_text="")
+            st.caption(
+                f"Starts {first}, the day after the last bank transaction, from the ledger balance · "
+                f"Monte Carlo over {forecast.paths:,} paths of resampled daily flows plus open invoices "
+                f"and recurring payments · {forecast.elapsed_ms:.0f} ms"
+            )
+
+            st.plotly_chart(fig_forecast, use_container_width=True)
 
-    conn.close()
 
 # =================================================
 # 🚨 TAB 4 – ALERTS
 # =================================================
-with tab_alerts:
-    st.subheader("🚨 Alerts & Risks")
-
-    conn = get_conn()
-
-    # Low Cash Alert
-    if runway_days < 30:
-        st.error("🚨 Cash runway below 30 days")
-    else:
-        st.success("✅ Cash runway healthy")
+if tab_alerts.open:
+    with tab_alerts, span("tab", "alerts"):
+        st.subheader("🚨 Alerts & Risks")
+        metrics = get_dashboard_metrics()
+
+        # Low Cash Alert
+        if metrics.runway_days < 30:
+            st.error("🚨 Cash runway below 30 days")
+        else:
+            st.success("✅ Cash runway healthy")
+
+        # Overdue vendor invoices, aged per vendor
+        payables = get_aging("payables")
+        overdue_df = payables.by_counterparty[payables.by_counterparty["overdue"] > 0]
+
+        if not overdue_df.empty:
+            st.warning(f"⚠️ Overdue Vendor Invoices: ₹{int(payables.totals['overdue']):,}")
+            st.dataframe(overdue_df, use_container_width=True)
+
+        # Transaction anomalies (scored on ingest)
+        anomalies_df = get_alerts()
+        if not anomalies_df.empty:
+            st.warning(f"⚠️ {len(anomalies_df)} unusual transactions")
+            st.dataframe(anomalies_df, use_container_width=True)
+
+        # Bank reconciliation
+        st.subheader("🔗 Bank Reconciliation")
+        st.dataframe(get_reconciliation_summary(), use_container_width=True)
+
+        mismatches = get_status_mismatches()
+        if not mismatches.empty:
+            st.warning(f"⚠️ {len(mismatches)} invoices disagree with the bank statement")
+            st.dataframe(mismatches, use_container_width=True)
 
-    # Unpaid Vendor Invoices
-    unpaid_df = pd.read_sql("""
-        SELECT vendor_name, net_amount, due_date
-        FROM vendor_invoices
-        WHERE payment_status != 'Paid'
-    """, conn)
+# -------------------------------------------------
+# JOB STATUS (after the tabs, which may have queued jobs)
+# -------------------------------------------------
+with st.sidebar:
+    st.session_state["jobs_active"] = jobs.has_active_jobs()
+    st.fragment(render_jobs, run_every=JOB_POLL_SECONDS if st.session_state["jobs_active"] else None)()
 
-    if not unpaid_df.empty:
-        st.warning("⚠️ Unpaid Vendor Invoices")
-        st.dataframe(unpaid_df, use_container_width=True)
+# -------------------------------------------------
+# DIAGNOSTICS (hidden; append ?diagnostics=1 to the URL)
+# -------------------------------------------------
+if st.query_params.get("diagnostics") == "1":
+    with st.sidebar:
+        render_diagnostics()
 
-    conn.close()
+instrumentation.maybe_export()
@@ -0,0 +1,262 @@
+"""End-to-end timings of ingestion and every analytics read path, per scale.
+
+    python -m benchmarks.analytics_paths --scales small,medium --json run.json
+    python -m benchmarks.analytics_paths --scales medium --compare run.json
+
+For each scale the synthetic generator writes a fresh data set, a child
+process ingests it into a fresh database and then times the dashboard
+bundle, explorer pages, every core.tools function, core.analytics, the
+reconciliation/anomaly readers, AR/AP aging, the forecast and the
+scenario engine.
+"cold" runs clear the query cache first; "warm" is the cached repeat.
+
+--compare reads an earlier --json file and flags every workload whose cold
+median grew by more than --threshold (and by at least MIN_REGRESSION_MS);
+the exit status is 1 if any did.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATOR = os.path.join(REPO_ROOT, "data_generation_scripts", "generate_scale_data.py")
+
+# bank rows ~= years * accounts * 365 * rows_per_day
+SCALES = {
+    "small": dict(years=1, accounts=1, clients=5, vendors=8, rows_per_day=13),          # ~4.7k
+    "medium": dict(years=2, accounts=5, clients=25, vendors=40, rows_per_day=40),       # ~146k
+    "large": dict(years=5, accounts=10, clients=100, vendors=200, rows_per_day=100),    # ~1.8M
+    "xl": dict(years=10, accounts=20, clients=200, vendors=400, rows_per_day=137),      # ~10M
+}
+RESULT_PREFIX = "BENCHMARK_RESULT "
+MIN_REGRESSION_MS = 1.0  # sub-millisecond reads are mostly timer noise
+
+# -------------------------------------------------
+# Child: ingest + time every read path
+# -------------------------------------------------
+def _workloads(last_date, first_date, counterparty):
+    # core reads DB_PATH at import time, so only the child imports it
+    from core import analytics, tools
+    from core.aging import get_aging
+    from core.dashboard import get_dashboard_metrics
+    from core.explorer import Filter, fetch_page
+    from core.anomalies import get_alerts
+    from core.forecast import run_forecast
+    from core.reconciliation import get_reconciliation_summary, get_status_mismatches
+    from core.scenarios import DELAY, evaluate_grid, load_baseline
+    from core.vendor_risk import get_vendor_risk
+
+    mid_date = first_date[:8] + "15"
+    return [
+        ("dashboard", "get_dashboard_metrics", get_dashboard_metrics),
+        ("explorer", "first_page", lambda: fetch_page("bank_statements")),
+        ("explorer", "filtered_sorted_page", lambda: fetch_page(
+            "bank_statements", sort="amount", descending=True,
+            filters=[Filter("category", "=", "Vendor Payment")])),
+        ("tools", "get_current_cash_balance", tools._get_current_cash_balance),
+        ("tools", "get_cash_balance_as_of", lambda: tools._get_cash_balance_as_of(mid_date)),
+        ("tools", "get_top_cash_outflows_last_30_days", tools._get_top_cash_outflows_last_30_days),
+        ("tools", "get_flow_summary", lambda: tools._get_flow_summary(first_date, last_date)),
+        ("tools", "get_flow_summary_counterparty",
+         lambda: tools._get_flow_summary(first_date, last_date, None, counterparty)),
+        ("tools", "get_vendor_dues", tools._get_vendor_dues),
+        ("tools", "get_overdue_collections", tools._get_overdue_collections),
+        ("tools", "get_payroll_summary", tools._get_payroll_summary),
+        ("tools", "get_cash_runway", tools._get_cash_runway),
+        ("analytics", "get_daily_balance", analytics.get_daily_balance),
+        ("analytics", "detect_missing_vendor_payments", analytics.detect_missing_vendor_payments),
+        ("analytics", "detect_unexpected_payments", analytics.detect_unexpected_payments),
+        ("analytics", "forecast_cash_shortage", analytics.forecast_cash_shortage),
+        ("aging", "receivables_aging", lambda: get_aging("receivables", last_date)),
+        ("aging", "payables_aging", lambda: get_aging("payables", last_date)),
+        ("dashboard", "get_vendor_risk", get_vendor_risk),
+        ("alerts", "get_reconciliation_summary", get_reconciliation_summary),
+        ("alerts", "get_status_mismatches", get_status_mismatches),
+        ("alerts", "get_alerts", get_alerts),
+        ("forecast", "run_forecast_90d", lambda: run_forecast(days=90)),
+        ("scenarios", "load_baseline", load_baseline),
+        ("scenarios", "evaluate_grid_11x11", lambda: evaluate_grid(
+            load_baseline(), {"Salary": range(-50, 51, 10), DELAY: range(0, 101, 10)})),
+    ]
+
+
+def _child(data_dir, repeat):
+    from core.cache import query_cache
+    from core.data_loader import CSV_SOURCES, load_all
+    from core.db import connection, init_db
+
+    start = time.perf_counter()
+    init_db()
+    init_ms = (time.perf_counter() - start) * 1000
+
+    sources = {t: os.path.join(data_dir, os.path.basename(p)) for t, p in CSV_SOURCES.items()}
+    start = time.perf_counter()
+    written = load_all(sources)
+    ingest_s = time.perf_counter() - start
+
+    with connection() as conn:
+        first_date, last_date = conn.execute(
+            "SELECT MIN(transaction_date), MAX(transaction_date) FROM bank_statements"
+        ).fetchone()
+        counterparty = conn.execute("""
+            SELECT counterparty_name FROM bank_statements
+            GROUP BY counterparty_name ORDER BY COUNT(*) DESC LIMIT 1
+        """).fetchone()[0]
+    db_bytes = os.path.getsize(os.environ["DB_PATH"])
+
+    timings = []
+    for group, name, fn in _workloads(last_date, first_date, counterparty):
+        cold = []
+        for _ in range(repeat):
+            query_cache.clear()
+            start = time.perf_counter()
+            fn()
+            cold.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        fn()
+        warm = (time.perf_counter() - start) * 1000
+        timings.append({
+            "group": group, "name": name,
+            "cold_ms": round(statistics.median(cold), 3),
+            "cold_min_ms": round(min(cold), 3),
+            "warm_ms": round(warm, 3),
+        })
+
+    total = sum(written.values())
+    return {
+        "rows": written,
+        "db_bytes": db_bytes,
+        "init_db_ms": round(init_ms, 3),
+        "ingest": {"seconds": round(ingest_s, 3), "rows_per_s": round(total / ingest_s) if ingest_s else None},
+        "timings": timings,
+    }
+
+# -------------------------------------------------
+# Parent: generate, spawn, collect, compare
+# -------------------------------------------------
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scale(name, params, repeat, workdir):
+    data_dir = os.path.join(workdir, name, "data")
+    db_path = os.path.join(workdir, name, "bench.db")
+    os.makedirs(data_dir, exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    start = time.perf_counter()
+    subprocess.run([
+        sys.executable, GENERATOR, "--out", data_dir,
+        *[a for k, v in params.items() for a in (f"--{k.replace('_', '-')}", str(v))],
+    ], check=True, stdout=subprocess.DEVNULL)
+    generate_s = time.perf_counter() - start
+
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.analytics_paths", "--child", data_dir, "--repeat", str(repeat)],
+        cwd=REPO_ROOT, env={**os.environ, "DB_PATH": db_path},
+        capture_output=True, text=True
+    )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_PREFIX)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"scale {name} failed:\n{proc.stderr[-4000:]}")
+    return {"scale": name, "params": params, "generate_s": round(generate_s, 3),
+            **json.loads(lines[-1][len(RESULT_PREFIX):])}
+
+
+def compare(report, baseline, threshold):
+    """Rows (scale, workload, before, after, ratio) and whether any regressed."""
+    before = {
+        (s["scale"], t["group"], t["name"]): t["cold_ms"]
+        for s in baseline["scales"] for t in s["timings"]
+    }
+    rows, regressed = [], False
+    for s in report["scales"]:
+        for t in s["timings"]:
+            old = before.get((s["scale"], t["group"], t["name"]))
+            if old is None:
+                continue
+            ratio = t["cold_ms"] / old if old else float("inf")
+            flag = ratio > threshold and t["cold_ms"] - old > MIN_REGRESSION_MS
+            regressed |= flag
+            rows.append((s["scale"], f"{t['group']}.{t['name']}", old, t["cold_ms"], ratio, flag))
+    return rows, regressed
+
+
+def _print_scale(s):
+    rows = sum(s["rows"].values())
+    print(f"\n== {s['scale']}: {s['rows'].get('bank_statements', 0):,} bank rows, {rows:,} total "
+          f"(generate {s['generate_s']:.1f}s, ingest {s['ingest']['seconds']:.1f}s "
+          f"= {s['ingest']['rows_per_s'] or 0:,} rows/s, db {s['db_bytes'] / 2**20:.1f} MiB)")
+    width = max(len(f"{t['group']}.{t['name']}") for t in s["timings"])
+    for t in s["timings"]:
+        print(f"  {t['group'] + '.' + t['name']:<{width}}  cold {t['cold_ms']:>10.2f} ms"
+              f"  warm {t['warm_ms']:>8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="cold runs per workload")
+    parser.add_argument("--workdir", help="keep generated data and databases here")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier --json report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="flag workloads slower than baseline by this factor")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(_child(args.child, args.repeat)))
+        return
+
+    names = [n.strip() for n in args.scales.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(unknown)}")
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scales": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        for name in names:
+            result = run_scale(name, SCALES[name], args.repeat, workdir)
+            report["scales"].append(result)
+            _print_scale(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows, regressed = compare(report, json.load(f), args.threshold)
+        print(f"\n== vs {args.compare} (flag > {args.threshold:.2f}x)")
+        for scale, name, old, new, ratio, flag in rows:
+            print(f"  {'!!' if flag else '  '} {scale:<7} {name:<50} {old:>10.2f} -> {new:>10.2f} ms  {ratio:5.2f}x")
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Cold-start and per-rerun cost of the Streamlit app.
+
+    DB_PATH=cash_management.db python -m benchmarks.startup [--reruns 5] [--json out.json]
+
+Every sample runs in a fresh interpreter through streamlit's AppTest:
+the first script run (imports, schema check, first render) is the cold
+start; then each tab is selected and re-run --reruns times, the way
+Streamlit re-executes the script on every interaction. Also reports
+which heavy libraries the first run had to import.
+
+--app points at another checkout's app.py to compare before/after.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["langchain_core", "langgraph", "langchain_groq", "langchain", "plotly"]
+RESULT_PREFIX = "STARTUP_RESULT "
+
+_CHILD = r"""
+import json, os, statistics, sys, time
+start = time.perf_counter()
+os.environ.setdefault("GROQ_API_KEY", "unused")
+from streamlit.testing.v1 import AppTest
+harness_ms = (time.perf_counter() - start) * 1000
+preloaded = set(sys.modules)
+
+at = AppTest.from_file({app!r}, default_timeout=300)
+start = time.perf_counter()
+at.run()
+first_ms = (time.perf_counter() - start) * 1000
+errors = [e.message for e in at.exception]
+loaded = {{m: m in sys.modules and m not in preloaded for m in {heavy!r}}}
+
+reruns = {{}}
+for label in {tabs!r}:
+    at.session_state["main_tab"] = label
+    at.run()
+    samples = []
+    for _ in range({reruns}):
+        start = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - start) * 1000)
+    errors += [e.message for e in at.exception]
+    reruns[label] = round(statistics.median(samples), 2)
+
+print({prefix!r} + json.dumps({{
+    "harness_import_ms": round(harness_ms, 2),
+    "first_run_ms": round(first_ms, 2),
+    "heavy_modules_loaded_on_first_run": loaded,
+    "rerun_ms": reruns,
+    "errors": errors,
+}}))
+"""
+
+TABS = ["🤖 Ask Agent", "📋 Data Tables", "📊 Dashboards", "🚨 Alerts"]
+
+
+def run_once(app, reruns):
+    app_dir = os.path.dirname(os.path.abspath(app))
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(
+            app=os.path.abspath(app), heavy=HEAVY_MODULES, tabs=TABS,
+            reruns=reruns, prefix=RESULT_PREFIX,
+        )],
+        cwd=app_dir, env={**os.environ, "PYTHONPATH": app_dir},
+        capture_output=True, text=True
+    )
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_PREFIX)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"startup run failed:\n{proc.stderr[-4000:]}")
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+
+def run(app, samples=3, reruns=5):
+    runs = [run_once(app, reruns) for _ in range(samples)]
+    return {
+        "app": os.path.abspath(app),
+        "samples": samples,
+        "first_run_ms": round(statistics.median(r["first_run_ms"] for r in runs), 2),
+        "rerun_ms": {
+            tab: round(statistics.median(r["rerun_ms"][tab] for r in runs), 2) for tab in TABS
+        },
+        "heavy_modules_loaded_on_first_run": runs[0]["heavy_modules_loaded_on_first_run"],
+        "errors": sorted({e for r in runs for e in r["errors"]}),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(REPO_ROOT, "app.py"))
+    parser.add_argument("--samples", type=int, default=3, help="fresh processes to run")
+    parser.add_argument("--reruns", type=int, default=5, help="timed reruns per tab")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    if not os.getenv("DB_PATH"):
+        parser.error("set DB_PATH to the database the app should open")
+
+    report = run(args.app, args.samples, args.reruns)
+    print(f"first run (cold start): {report['first_run_ms']:.0f} ms")
+    for tab, ms in report["rerun_ms"].items():
+        print(f"rerun {tab}: {ms:.1f} ms")
+    loaded = [m for m, hit in report["heavy_modules_loaded_on_first_run"].items() if hit]
+    print(f"heavy modules imported by the first run: {', '.join(loaded) or 'none'}")
+    if report["errors"]:
+        print("errors:", *report["errors"], sep="\n  ")
+    print(json.dumps({k: v for k, v in report.items() if k != "runs"}))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Time the same full-history scans against SQLite and the Parquet copy.
+
+    python -m benchmarks.storage_backends [--repeat N] [--json out.json]
+
+The Parquet copy is exported into a temporary directory, so the
+configured COLUMNAR_ROOT is left alone.
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+from core.db import connection, init_db
+from core.storage import ParquetStore, SQLiteStore, PARTITION_DATES
+
+
+def _workloads():
+    with connection() as conn:
+        last = conn.execute("SELECT MAX(transaction_date) FROM bank_statements").fetchone()[0]
+    month_start = (pd.Timestamp(last) - pd.offsets.MonthBegin(1)).strftime("%Y-%m-%d")
+
+    def balance_trend(store):
+        df = store.scan("bank_statements", ["transaction_date", "balance_after"])
+        return df.groupby("transaction_date")["balance_after"].last()
+
+    def monthly_category_flow(store):
+        df = store.scan("bank_statements", ["transaction_date", "category", "transaction_type", "amount"])
+        return df.groupby([df["transaction_date"].str[:7], "category", "transaction_type"])["amount"].sum()
+
+    def vendor_totals(store):
+        df = store.scan("bank_statements", ["counterparty_name", "amount"],
+                        [("transaction_type", "=", "DEBIT")])
+        return df.groupby("counterparty_name")["amount"].sum()
+
+    def one_month(store):
+        return store.scan("bank_statements", date_range=(month_start, last))
+
+    return {
+        "balance_trend": balance_trend,
+        "monthly_category_flow": monthly_category_flow,
+        "vendor_totals": vendor_totals,
+        "one_month": one_month,
+    }
+
+
+def _time(fn, store, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(store)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(repeat=5):
+    init_db()
+    with tempfile.TemporaryDirectory() as root:
+        parquet = ParquetStore(root)
+        start = time.perf_counter()
+        for table in PARTITION_DATES:
+            parquet.export_from_sqlite(table)
+        export_ms = (time.perf_counter() - start) * 1000
+
+        stores = [SQLiteStore(), parquet]
+        results = []
+        for name, fn in _workloads().items():
+            for store in stores:
+                fn(store)  # warm the page cache / file metadata
+            row = {"workload": name}
+            for store in stores:
+                row[f"{store.name}_ms"] = round(_time(fn, store, repeat), 2)
+            row["speedup"] = round(row["sqlite_ms"] / max(row["parquet_ms"], 1e-9), 2)
+            results.append(row)
+
+    with connection() as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM bank_statements").fetchone()[0]
+    return {"bank_statements_rows": rows, "export_ms": round(export_ms, 2),
+            "repeat": repeat, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+    print(pd.DataFrame(report["results"]).to_string(index=False))
+    print(f"\n{report['bank_statements_rows']} rows, Parquet export {report['export_ms']} ms")
+    print(json.dumps(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
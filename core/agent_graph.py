@@ -1,114 +1,487 @@
-from typing import TypedDict, List
-from langgraph.graph import StateGraph
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
-from core.tools import (
-    _get_current_cash_balance,
-    _get_top_cash_outflows_last_30_days
-)
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from typing import Annotated, TypedDict, List
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
+from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage, SystemMessage, ToolMessage
+from core.checkpoints import SQLiteCheckpointer
+from core.instrumentation import observe, timed
+from core.intents import route, answer
+from core.llm_cache import CachedLLM, LLMUnavailableError
+from core.tools import TOOLS, TOOLS_BY_NAME
 
 # -------------------------------------------------
 # Agent State
 # -------------------------------------------------
+# Nodes return only the messages they add; add_messages appends them
+# (and applies RemoveMessage) on the bounded history in the checkpoint.
+# tool_trace and tool_rounds are per turn and reset by every query.
 class AgentState(TypedDict):
-    messages: List
+    messages: Annotated[List, add_messages]
+    summary: str
+    tool_trace: List
+    tool_rounds: int
 
 # -------------------------------------------------
 # LLM (Groq)
 # -------------------------------------------------
-llm = ChatGroq(
-    model="meta-llama/llama-4-scout-17b-16e-instruct",
-    temperature=0
+# Built on first use and shared by every session in the process: the
+# Groq client (and its HTTP stack) costs more to import than the rest of
+# the app, and local intent answers never need it.
+LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+_cached_llm = None
+_summary_llm = None
+_llm_lock = threading.Lock()
+
+
+def _build_llms():
+    global _cached_llm, _summary_llm
+    with _llm_lock:
+        if _cached_llm is None:
+            from langchain_groq import ChatGroq
+            llm = ChatGroq(model=LLM_MODEL, temperature=0)
+            _summary_llm = CachedLLM(llm, model=LLM_MODEL)
+            _cached_llm = CachedLLM(llm.bind_tools(TOOLS), model=f"{LLM_MODEL}+tools")
+
+
+def get_llm():
+    if _cached_llm is None:
+        _build_llms()
+    return _cached_llm
+
+
+def get_summary_llm():
+    """Same model without tools, for conversation summaries."""
+    if _cached_llm is None:
+        _build_llms()
+    return _summary_llm
+
+SYSTEM_PROMPT = (
+    "You are a cash management assistant for an Indian company.\n"
+    "Currency is INR. Today is {today}.\n"
+    "Use the tools for any figure you quote. When a question needs several "
+    "facts, request all the tools you need in the same turn.\n"
+    "Explain clearly and concisely."
+)
+SUMMARY_CONTEXT = "\n\nEarlier in this conversation (summarized):\n{summary}"
+
+# -------------------------------------------------
+# Conversation memory
+# -------------------------------------------------
+# Each session is a LangGraph thread checkpointed in SQLite
+# (core.checkpoints). When a turn ends with the history over
+# HISTORY_TOKEN_BUDGET, the oldest whole turns are folded into a rolling
+# summary and removed until HISTORY_TOKEN_TARGET is met; the current
+# turn is always kept. The summary is capped at SUMMARY_TOKEN_BUDGET, so
+# the prompt, the checkpoint and the per-node state copies stay the
+# same size however long the conversation runs.
+HISTORY_TOKEN_BUDGET = 3000
+HISTORY_TOKEN_TARGET = 1500
+SUMMARY_TOKEN_BUDGET = 300
+CHARS_PER_TOKEN = 4      # estimate; the model's tokenizer is not available locally
+THREAD_TTL_DAYS = 30
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and a cash "
+    "management assistant with the new turns below. Keep the figures, dates, "
+    "names and open questions the user may refer back to. Reply with the "
+    "summary only, in at most {words} words."
 )
+TOOL_BUDGET_NOTE = "I could not finish looking this up within the tool budget. Please narrow the question."
+
+
+def estimate_tokens(message):
+    text = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+    for call in getattr(message, "tool_calls", None) or []:
+        text += call["name"] + json.dumps(call["args"], default=str)
+    return len(text) // CHARS_PER_TOKEN + 4     # + role / framing overhead
+
+
+def _turn_cut(messages):
+    """Index of the first message to keep: the earliest turn start such
+    that the rest fits HISTORY_TOKEN_TARGET, or the current turn."""
+    sizes = [estimate_tokens(m) for m in messages]
+    remaining = sum(sizes)
+    cut = 0
+    for i, m in enumerate(messages):
+        if i and isinstance(m, HumanMessage):
+            cut = i
+            if remaining <= HISTORY_TOKEN_TARGET:
+                break
+        remaining -= sizes[i]
+    return cut
+
+
+def _transcript(messages):
+    lines = []
+    for m in messages:
+        if isinstance(m, HumanMessage):
+            lines.append(f"User: {m.content}")
+        elif isinstance(m, AIMessage) and m.content and not m.tool_calls:
+            lines.append(f"Assistant: {m.content}")
+    return "\n".join(lines)
+
+
+def summarize(summary, dropped):
+    """Fold `dropped` messages into the rolling summary."""
+    limit = SUMMARY_TOKEN_BUDGET * CHARS_PER_TOKEN
+    transcript = _transcript(dropped)
+    try:
+        response = get_summary_llm().invoke([
+            SystemMessage(content=SUMMARY_PROMPT.format(words=SUMMARY_TOKEN_BUDGET * 3 // 4)),
+            HumanMessage(content=f"Summary so far:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"),
+        ])
+        updated = response.content.strip()
+    except LLMUnavailableError:
+        # keep the user's words; the newest lines survive the cap
+        updated = "\n".join(filter(None, [summary, transcript]))
+    return updated[-limit:]
 
 # -------------------------------------------------
-# Finance Agent Logic
+# Tool execution limits
 # -------------------------------------------------
+MAX_TOOL_ROUNDS = 3
+TOOL_TIMEOUT_S = 10
+TOOL_RESULT_MAX_CHARS = 4000
+
+_tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+# -------------------------------------------------
+# Nodes
+# -------------------------------------------------
+@timed("node")
+def router(state: AgentState):
+    """Answer locally from SQL when the intent router recognises the question."""
+    user_query = state["messages"][-1].content
+
+    routed = route(user_query)
+    if routed is None:
+        return {}
+
+    response = answer(routed)
+    get_stream_writer()({"type": "tool", "name": routed.name, "content": response})
+    return {"messages": [AIMessage(content=response)]}
+
+
+@timed("node")
 def finance_agent(state: AgentState):
-    user_query = state["messages"][-1].content.lower()
-
-    # ===============================
-    # WHY IS CASH REDUCING?
-    # ===============================
-    if "why" in user_query and "cash" in user_query:
-        balance = _get_current_cash_balance()
-        outflows = _get_top_cash_outflows_last_30_days()
-
-        if not outflows["outflows"]:
-            response = "Insufficient recent transaction data to explain cash reduction."
-        else:
-            lines = [
-                "Your cash is reducing mainly due to the following expenses (last 30 days):"
-            ]
-
-            for item in outflows["outflows"]:
-                lines.append(
-                    f"- {item['category']}: approximately ₹{int(item['total_spent'])}"
-                )
-
-            lines.append(
-                f"\nCurrent available cash balance is approximately ₹{int(balance['balance'])}."
-            )
-
-            response = "\n".join(lines)
-
-        return {
-            "messages": state["messages"] + [AIMessage(content=response)]
-        }
-
-    # ===============================
-    # CURRENT BALANCE
-    # ===============================
-    if "balance" in user_query:
-        balance = _get_current_cash_balance()
-        response = f"Your current cash balance is approximately ₹{int(balance['balance'])}."
-        return {
-            "messages": state["messages"] + [AIMessage(content=response)]
-        }
-
-    # ===============================
-    # CASH FLOW (LAST 30 DAYS)
-    # ===============================
-    if "cash flow" in user_query or "outflow" in user_query:
-        outflows = _get_top_cash_outflows_last_30_days()
-
-        if not outflows["outflows"]:
-            response = "No cash outflow data available for the last 30 days."
-        else:
-            lines = ["Top cash outflows in the last 30 days:"]
-            for item in outflows["outflows"]:
-                lines.append(
-                    f"- {item['category']}: approximately ₹{int(item['total_spent'])}"
-                )
-            response = "\n".join(lines)
-
-        return {
-            "messages": state["messages"] + [AIMessage(content=response)]
-        }
-
-    # ===============================
-    # FALLBACK (EXPLANATION ONLY)
-    # ===============================
-    llm_response = llm.invoke([
-        HumanMessage(
-            content=(
-                "You are a cash management assistant for an Indian company.\n"
-                "Currency is INR.\n"
-                "Explain clearly and concisely:\n\n"
-                f"{state['messages'][-1].content}"
-            )
+    """LLM turn: either answer (streamed) or request tool calls."""
+    writer = get_stream_writer()
+    system = SYSTEM_PROMPT.format(today=date.today().isoformat())
+    if state.get("summary"):
+        system += SUMMARY_CONTEXT.format(summary=state["summary"])
+    prompt = [SystemMessage(content=system)] + state["messages"]
+
+    final = None
+    try:
+        for chunk in get_llm().stream(prompt):
+            if chunk.content:
+                writer({"type": "token", "content": chunk.content})
+            final = chunk if final is None else final + chunk
+        llm_response = AIMessage(
+            content=final.content if final is not None else "",
+            tool_calls=getattr(final, "tool_calls", None) or []
+        )
+    except LLMUnavailableError:
+        llm_response = AIMessage(
+            content="The assistant could not reach the language model. Please try again shortly."
+        )
+
+    return {"messages": [llm_response]}
+
+
+def _format_result(result):
+    text = result if isinstance(result, str) else json.dumps(result, default=str)
+    if len(text) > TOOL_RESULT_MAX_CHARS:
+        text = text[:TOOL_RESULT_MAX_CHARS] + f"... [truncated {len(text) - TOOL_RESULT_MAX_CHARS} chars]"
+    return text
+
+
+def _run_tool(call):
+    start = time.perf_counter()
+    tool = TOOLS_BY_NAME[call["name"]]
+    try:
+        result = tool.invoke(call["args"])
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        observe("tool", call["name"], elapsed)
+    return result, elapsed
+
+
+@timed("node", "tools")
+def run_tools(state: AgentState):
+    """Execute every tool call of the last AI message concurrently."""
+    writer = get_stream_writer()
+    calls = state["messages"][-1].tool_calls
+
+    futures = {}
+    results = {}
+    for call in calls:
+        if call["name"] not in TOOLS_BY_NAME:
+            results[call["id"]] = (f"Unknown tool: {call['name']}", 0.0, "error")
+            continue
+        futures[_tool_executor.submit(_run_tool, call)] = call
+
+    start = time.perf_counter()
+    done, not_done = wait(futures, timeout=TOOL_TIMEOUT_S)
+    for future, call in futures.items():
+        if future in not_done:
+            future.cancel()
+            elapsed = (time.perf_counter() - start) * 1000
+            results[call["id"]] = (f"Timed out after {TOOL_TIMEOUT_S}s", elapsed, "timeout")
+            continue
+        try:
+            result, elapsed = future.result()
+            results[call["id"]] = (_format_result(result), elapsed, "ok")
+        except Exception as e:
+            results[call["id"]] = (f"Tool failed: {e}", 0.0, "error")
+
+    tool_messages = []
+    trace = []
+    for call in calls:
+        content, elapsed, status = results[call["id"]]
+        tool_messages.append(
+            ToolMessage(content=content, tool_call_id=call["id"], name=call["name"])
         )
-    ])
+        trace.append({
+            "tool": call["name"],
+            "args": call["args"],
+            "ms": round(elapsed, 2),
+            "status": status,
+            "chars": len(content),
+        })
+        writer({"type": "tool", "name": call["name"], "content": content, "ms": elapsed})
 
     return {
-        "messages": state["messages"] + [llm_response]
+        "messages": tool_messages,
+        "tool_trace": (state.get("tool_trace") or []) + trace,
+        "tool_rounds": (state.get("tool_rounds") or 0) + 1,
     }
 
+@timed("node")
+def remember(state: AgentState):
+    """End of turn: settle unanswered tool calls, then compact the history."""
+    messages = state["messages"]
+    update = []
+
+    last = messages[-1]
+    if getattr(last, "tool_calls", None):
+        # out of tool rounds; a call without its result would be rejected next turn
+        last = AIMessage(content=last.content or TOOL_BUDGET_NOTE, id=last.id)
+        messages = messages[:-1] + [last]
+        update.append(last)
+
+    if sum(estimate_tokens(m) for m in messages) <= HISTORY_TOKEN_BUDGET:
+        return {"messages": update} if update else {}
+
+    cut = _turn_cut(messages)
+    if not cut:
+        return {"messages": update} if update else {}
+    dropped = messages[:cut]
+    return {
+        # the kept reply goes last: stream readers take the final message
+        "messages": [RemoveMessage(id=m.id) for m in dropped] + update,
+        "summary": summarize(state.get("summary"), dropped),
+    }
+
+# -------------------------------------------------
+# Edges
+# -------------------------------------------------
+def after_router(state: AgentState):
+    return "remember" if isinstance(state["messages"][-1], AIMessage) else "finance_agent"
+
+
+def after_agent(state: AgentState):
+    last = state["messages"][-1]
+    if getattr(last, "tool_calls", None) and (state.get("tool_rounds") or 0) < MAX_TOOL_ROUNDS:
+        return "tools"
+    return "remember"
+
 # -------------------------------------------------
 # Graph
 # -------------------------------------------------
-graph = StateGraph(AgentState)
-graph.add_node("finance_agent", finance_agent)
-graph.set_entry_point("finance_agent")
+def build_graph():
+    graph = StateGraph(AgentState)
+    graph.add_node("router", router)
+    graph.add_node("finance_agent", finance_agent)
+    graph.add_node("tools", run_tools)
+    graph.add_node("remember", remember)
+    graph.set_entry_point("router")
+    graph.add_conditional_edges("router", after_router, ["finance_agent", "remember"])
+    graph.add_conditional_edges("finance_agent", after_agent, ["tools", "remember"])
+    graph.add_edge("tools", "finance_agent")
+    graph.add_edge("remember", END)
+    return graph.compile(checkpointer=get_checkpointer())
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = SQLiteCheckpointer()
+                _checkpointer.delete_stale_threads(THREAD_TTL_DAYS)
+    return _checkpointer
+
+
+def get_graph():
+    """The compiled graph, built once per process on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
+
+
+def _thread_config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def get_conversation(thread_id):
+    """(summary, [(role, text)]) of what the thread still holds."""
+    values = get_graph().get_state(_thread_config(thread_id)).values
+    turns = [
+        ("user" if isinstance(m, HumanMessage) else "assistant", m.content)
+        for m in values.get("messages", [])
+        if isinstance(m, HumanMessage) or (isinstance(m, AIMessage) and m.content and not m.tool_calls)
+    ]
+    return values.get("summary", ""), turns
+
 
-finance_graph = graph.compile()
+def forget(thread_id):
+    get_checkpointer().delete_thread(thread_id)
+
+# -------------------------------------------------
+# Streaming
+# -------------------------------------------------
+# Events yielded by stream_answer / astream_answer:
+#   {"type": "tool",  "name": ..., "content": ...}   local answer or tool result
+#   {"type": "token", "content": ...}                answer text, incrementally
+#   {"type": "done",  "content": ..., "ttft_ms": ..., "total_ms": ...,
+#    "tool_trace": [...]}
+
+QUERY_LATENCIES = deque(maxlen=500)
+_latency_lock = threading.Lock()
+
+
+class _StreamRecorder:
+    def __init__(self, query):
+        self.query = query
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.final = None
+        self.used_llm = False
+        self.tool_trace = []
+
+    def on_chunk(self, mode, chunk):
+        """Translate one graph stream chunk into zero or more events."""
+        if mode == "custom":
+            if chunk["type"] == "token":
+                self.used_llm = True
+                self._mark_first_token()
+            yield chunk
+        elif mode == "updates":
+            for update in chunk.values():
+                last = update["messages"][-1] if update and update.get("messages") else None
+                if last is not None and not isinstance(last, RemoveMessage):
+                    self.final = last.content
+                if update and update.get("tool_trace"):
+                    self.tool_trace = update["tool_trace"]
+
+    def _mark_first_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def finish(self):
+        events = []
+        if not self.used_llm and self.final is not None:
+            # local answers arrive whole
+            self._mark_first_token()
+            events.append({"type": "token", "content": self.final})
+        end = time.perf_counter()
+        ttft_ms = ((self.first_token or end) - self.start) * 1000
+        total_ms = (end - self.start) * 1000
+        with _latency_lock:
+            QUERY_LATENCIES.append({
+                "query": self.query,
+                "source": "llm" if self.used_llm else "local",
+                "ttft_ms": ttft_ms,
+                "total_ms": total_ms,
+                "tool_trace": self.tool_trace,
+            })
+        events.append({
+            "type": "done",
+            "content": self.final,
+            "ttft_ms": ttft_ms,
+            "total_ms": total_ms,
+            "tool_trace": self.tool_trace,
+        })
+        return events
+
+
+def _turn_input(query):
+    return {"messages": [HumanMessage(content=query)], "tool_trace": [], "tool_rounds": 0}
+
+
+def stream_answer(query, thread_id=None):
+    """Run the agent for `query` as the next turn of `thread_id`, yielding
+    events as they are produced. Without a thread the turn stands alone."""
+    recorder = _StreamRecorder(query)
+    config = _thread_config(thread_id or uuid.uuid4().hex)
+    try:
+        for mode, chunk in get_graph().stream(
+            _turn_input(query), config, stream_mode=["custom", "updates"]
+        ):
+            yield from recorder.on_chunk(mode, chunk)
+    finally:
+        if thread_id is None:
+            forget(config["configurable"]["thread_id"])
+    yield from recorder.finish()
+
+
+async def astream_answer(query, thread_id=None):
+    recorder = _StreamRecorder(query)
+    config = _thread_config(thread_id or uuid.uuid4().hex)
+    try:
+        async for mode, chunk in get_graph().astream(
+            _turn_input(query), config, stream_mode=["custom", "updates"]
+        ):
+            for event in recorder.on_chunk(mode, chunk):
+                yield event
+    finally:
+        if thread_id is None:
+            forget(config["configurable"]["thread_id"])
+    for event in recorder.finish():
+        yield event
+
+
+def latency_metrics():
+    with _latency_lock:
+        rows = list(QUERY_LATENCIES)
+    if not rows:
+        return {"queries": 0}
+
+    def p50(values):
+        values = sorted(values)
+        return values[len(values) // 2]
+
+    return {
+        "queries": len(rows),
+        "ttft_ms_p50": p50([r["ttft_ms"] for r in rows]),
+        "total_ms_p50": p50([r["total_ms"] for r in rows]),
+        "llm_ratio": sum(r["source"] == "llm" for r in rows) / len(rows),
+    }
@@ -0,0 +1,226 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from core.cache import cached, RELATIVE_WINDOW_TTL
+from core.db import connection
+
+# -------------------------------------------------
+# Receivables / payables aging
+# -------------------------------------------------
+# A document is open as of D when it was issued on or before D and not
+# settled by D. The settlement date is the matched bank payment's date
+# (core.reconciliation); a document whose status says settled but has
+# no matched payment is taken as settled on its due date (its invoice
+# date if it has none). Unpaid documents stay open.
+#
+# A matched payment wins over the recorded status, so a document still
+# marked Unpaid / not Collected whose payment is in the bank counts as
+# settled. Those are reported separately as status_mismatch: they are
+# the gap between these totals and the status-based ones in core.tools.
+#
+# Documents are read once per side, sorted by due date. Aging as of any
+# date is then a searchsorted of the four bucket edges into that order
+# plus one bincount per counterparty, never a query per bucket.
+
+BUCKETS = ("current", "1-30", "31-60", "61-90", "90+")
+BUCKET_EDGES_DAYS = (90, 60, 30, 0)    # due before as_of - edge => older bucket
+TURNOVER_WINDOW_DAYS = 90              # DSO/DPO sales/purchases window
+CURVE_HORIZON_DAYS = 90
+
+SIDES = {
+    "receivables": {
+        "table": "client_invoices", "name": "client_name", "status": "collection_status",
+        "settled": ("Collected",), "document_type": "client_invoice", "turnover": "dso",
+    },
+    "payables": {
+        "table": "vendor_invoices", "name": "vendor_name", "status": "payment_status",
+        "settled": ("Paid",), "document_type": "vendor_invoice", "turnover": "dpo",
+    },
+}
+
+
+@dataclass
+class AgingReport:
+    side: str
+    as_of: str
+    by_counterparty: pd.DataFrame   # counterparty, open_invoices, current .. 90+, total, overdue
+    totals: dict                    # bucket -> amount, plus total and overdue
+    turnover_days: float | None     # DSO for receivables, DPO for payables
+    turnover_basis: float           # invoiced over the TURNOVER_WINDOW_DAYS before as_of
+    curve: pd.DataFrame             # days_ahead, date, expected_settled, share_of_open
+    status_mismatch: dict           # invoices, amount: settled by a bank match, marked open
+
+    @property
+    def open_total(self):
+        return self.totals["total"]
+
+
+def _today():
+    # matches SQLite's date('now'), which is UTC
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _as_of(as_of):
+    return pd.Timestamp(as_of).date().isoformat() if as_of else _today()
+
+# -------------------------------------------------
+# Documents, sorted by due date
+# -------------------------------------------------
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def _documents(side):
+    """Arrays over every document of `side`, ordered by due date."""
+    src = SIDES[side]
+    statuses = ", ".join("?" for _ in src["settled"])
+    with connection() as conn:
+        df = pd.read_sql(f"""
+            SELECT d.{src['name']} AS counterparty,
+                   d.invoice_date, d.due_date, d.net_amount AS amount,
+                   d.{src['status']} IN ({statuses}) AS status_settled,
+                   CASE WHEN m.days_from_due IS NOT NULL
+                        THEN date(d.due_date, printf('%+d days', m.days_from_due))
+                   END AS paid_on
+            FROM {src['table']} d
+            LEFT JOIN reconciliation_matches m
+              ON m.document_type = ? AND m.document_id = d.invoice_id
+            WHERE d.due_date IS NOT NULL AND d.net_amount IS NOT NULL
+            ORDER BY d.due_date
+        """, conn, params=(*src["settled"], src["document_type"]))
+
+    due = pd.to_datetime(df["due_date"], format="ISO8601").to_numpy("datetime64[D]")
+    issued = pd.to_datetime(df["invoice_date"], format="ISO8601").to_numpy("datetime64[D]")
+    issued = np.where(np.isnat(issued), due, issued)
+    paid_on = pd.to_datetime(df["paid_on"], format="ISO8601").to_numpy("datetime64[D]")
+    assumed = np.where(np.isnat(due), issued, due)
+    settled_on = np.where(
+        np.isnat(paid_on) & df["status_settled"].astype(bool).to_numpy(), assumed, paid_on
+    )
+    names, codes = np.unique(df["counterparty"].fillna("(unknown)").astype(str), return_inverse=True)
+    return {
+        "due": due,
+        "issued": issued,
+        "settled_on": settled_on,
+        "paid_on": paid_on,
+        "status_settled": df["status_settled"].astype(bool).to_numpy(),
+        "amount": df["amount"].to_numpy(dtype=float),
+        "codes": codes,
+        "names": names,
+    }
+
+# -------------------------------------------------
+# Aging sweep
+# -------------------------------------------------
+def _bucket_codes(due, as_of):
+    """Bucket index per document (0 = current .. 4 = 90+) for due dates
+    sorted ascending: five runs split at the searchsorted edges."""
+    edges = np.searchsorted(due, [as_of - np.timedelta64(d, "D") for d in BUCKET_EDGES_DAYS])
+    runs = np.diff(np.concatenate(([0], edges, [len(due)])))
+    return np.repeat(np.arange(len(BUCKETS))[::-1], runs)
+
+
+def _is_open(docs, as_of):
+    settled = ~np.isnat(docs["settled_on"]) & (docs["settled_on"] <= as_of)
+    return (docs["issued"] <= as_of) & ~settled
+
+
+def _collection_curve(docs, open_mask, as_of, horizon_days):
+    """Expected amount settled within each of the next `horizon_days`.
+
+    Uses the empirical distribution of days-past-due at payment over the
+    documents already paid by `as_of`: a document d days overdue today is
+    settled within h days with P(delay <= d + h | delay > d).
+    """
+    paid = ~np.isnat(docs["paid_on"]) & (docs["paid_on"] <= as_of)
+    delays = np.sort((docs["paid_on"][paid] - docs["due"][paid]).astype(int))
+    if not len(delays):
+        delays = np.zeros(1, dtype=int)     # no history: assume paid on the due date
+
+    overdue_days = (as_of - docs["due"][open_mask]).astype(int)
+    ages, inverse = np.unique(overdue_days, return_inverse=True)
+    amounts = np.bincount(inverse, weights=docs["amount"][open_mask], minlength=len(ages))
+
+    def cdf(x):
+        return np.searchsorted(delays, x, side="right") / len(delays)
+
+    horizon = np.arange(horizon_days + 1)
+    already = cdf(ages)
+    remaining = 1.0 - already
+    within = cdf(ages[:, None] + horizon[None, :]) - already[:, None]
+    prob = np.divide(within, remaining[:, None], out=np.zeros_like(within), where=remaining[:, None] > 0)
+    expected = amounts @ prob if len(ages) else np.zeros(len(horizon))
+
+    total = amounts.sum()
+    return pd.DataFrame({
+        "days_ahead": horizon,
+        "date": (as_of + horizon.astype("timedelta64[D]")).astype(str),
+        "expected_settled": expected,
+        "share_of_open": expected / total if total else np.zeros(len(horizon)),
+    })
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def _aging(side, as_of, horizon_days):
+    docs = _documents(side)
+    day = np.datetime64(as_of, "D")
+    open_mask = _is_open(docs, day)
+    buckets = _bucket_codes(docs["due"], day)
+    mismatch = (docs["issued"] <= day) & ~open_mask & ~docs["status_settled"]
+
+    n_names = len(docs["names"])
+    amounts = np.bincount(
+        docs["codes"] * len(BUCKETS) + buckets,
+        weights=np.where(open_mask, docs["amount"], 0.0),
+        minlength=n_names * len(BUCKETS),
+    ).reshape(n_names, len(BUCKETS))
+    counts = np.bincount(docs["codes"], weights=open_mask.astype(float), minlength=n_names).astype(int)
+
+    by_counterparty = pd.DataFrame(amounts, columns=list(BUCKETS))
+    by_counterparty.insert(0, "open_invoices", counts)
+    by_counterparty.insert(0, "counterparty", docs["names"])
+    by_counterparty["total"] = amounts.sum(axis=1)
+    by_counterparty["overdue"] = amounts[:, 1:].sum(axis=1)
+    by_counterparty = (
+        by_counterparty[by_counterparty["open_invoices"] > 0]
+        .sort_values("total", ascending=False)
+        .reset_index(drop=True)
+    )
+
+    totals = {b: float(amounts[:, i].sum()) for i, b in enumerate(BUCKETS)}
+    totals["total"] = float(amounts.sum())
+    totals["overdue"] = totals["total"] - totals["current"]
+
+    window_start = day - np.timedelta64(TURNOVER_WINDOW_DAYS, "D")
+    in_window = (docs["issued"] > window_start) & (docs["issued"] <= day)
+    basis = float(docs["amount"][in_window].sum())
+    turnover = totals["total"] / basis * TURNOVER_WINDOW_DAYS if basis else None
+
+    return AgingReport(
+        side=side,
+        as_of=as_of,
+        by_counterparty=by_counterparty,
+        totals=totals,
+        turnover_days=turnover,
+        turnover_basis=basis,
+        curve=_collection_curve(docs, open_mask, day, horizon_days),
+        status_mismatch={
+            "invoices": int(mismatch.sum()),
+            "amount": float(docs["amount"][mismatch].sum()),
+        },
+    )
+
+
+def get_aging(side, as_of=None, horizon_days=CURVE_HORIZON_DAYS):
+    """AgingReport for "receivables" or "payables" as of an ISO date
+    (today if omitted). Cached per (side, as_of)."""
+    if side not in SIDES:
+        raise ValueError(f"Unknown side: {side}")
+    return _aging(side, _as_of(as_of), horizon_days)
+
+
+def get_receivables_aging(as_of=None):
+    return get_aging("receivables", as_of)
+
+
+def get_payables_aging(as_of=None):
+    return get_aging("payables", as_of)
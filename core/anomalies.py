@@ -0,0 +1,253 @@
+import math
+from datetime import date as Date
+
+import pandas as pd
+from core.cache import cached
+from core.db import connection
+
+# -------------------------------------------------
+# Streaming anomaly detection
+# -------------------------------------------------
+# Every (scope, key, transaction_type) - scope being the counterparty or
+# the category - keeps a few numbers in anomaly_state: an EWMA mean and
+# variance of log(amount), an EWMA of the gap in days between
+# transactions, and streaming p50/p95 estimates. core.data_loader scores
+# each new transaction against that state and then folds it in, O(1) per
+# row, so the Alerts tab only reads anomaly_alerts.
+#
+# Re-ingested versions of an existing row are not re-scored: an EWMA
+# cannot take an observation back out.
+
+EWMA_ALPHA = 0.1         # weight of the newest observation once warmed up
+QUANTILE_RATE = 0.05     # step of the multiplicative quantile updates
+MIN_HISTORY = 10         # observations before a key can raise alerts
+Z_THRESHOLD = 4.0
+MIN_LOG_STD = 0.05       # ~5%: fixed amounts (rent) still tolerate small changes
+FREQUENCY_RATIO = 0.2    # gap shorter than 20% of the usual gap
+MIN_USUAL_GAP_DAYS = 7   # only for keys that do not occur daily
+
+SCOPES = {"counterparty": "counterparty_name", "category": "category"}
+
+ANOMALY_TABLES = {
+    "anomaly_state": """
+    CREATE TABLE IF NOT EXISTS anomaly_state (
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        transaction_type TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        var REAL NOT NULL,
+        p50 REAL NOT NULL,
+        p95 REAL NOT NULL,
+        gap_mean REAL,
+        last_date TEXT NOT NULL,
+        PRIMARY KEY (scope, key, transaction_type)
+    )""",
+    "anomaly_alerts": """
+    CREATE TABLE IF NOT EXISTS anomaly_alerts (
+        transaction_id TEXT NOT NULL,
+        rule TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        transaction_date TEXT,
+        transaction_type TEXT,
+        counterparty_name TEXT,
+        category TEXT,
+        amount REAL,
+        score REAL,
+        expected REAL,
+        detail TEXT,
+        detected_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (transaction_id, rule, scope)
+    )""",
+}
+
+ANOMALY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_anomaly_alerts_date ON anomaly_alerts (transaction_date)",
+]
+
+HOOK_COLUMNS = ["transaction_id"]
+SCORE_COLUMNS = [
+    "transaction_id", "transaction_date", "transaction_type",
+    "amount", "counterparty_name", "category",
+]
+
+
+def _reader(cur):
+    """pandas needs the connection; migrations hand us a cursor."""
+    return getattr(cur, "connection", cur)
+
+
+def create_tables(cur):
+    for ddl in ANOMALY_TABLES.values():
+        cur.execute(ddl)
+    for ddl in ANOMALY_INDEXES:
+        cur.execute(ddl)
+
+# -------------------------------------------------
+# Scoring
+# -------------------------------------------------
+def _new_state(x, amount, date):
+    return {"n": 1, "mean": x, "var": 0.0, "p50": amount, "p95": amount,
+            "gap_mean": None, "last_date": date}
+
+
+def _update(state, x, amount, date, gap):
+    """Fold one observation in. Early on alpha = 1/n, i.e. the plain
+    running mean/variance, so the first few points are not over-weighted."""
+    n = state["n"] + 1
+    alpha = max(EWMA_ALPHA, 1.0 / n)
+    d = x - state["mean"]
+    state["mean"] += alpha * d
+    state["var"] = (1 - alpha) * (state["var"] + alpha * d * d)
+
+    for q, tau in (("p50", 0.5), ("p95", 0.95)):
+        step = tau - (1.0 if amount < state[q] else 0.0)
+        state[q] *= math.exp(QUANTILE_RATE * step)
+
+    if gap is not None:
+        g = state["gap_mean"]
+        state["gap_mean"] = gap if g is None else g + alpha * (gap - g)
+    state["n"] = n
+    state["last_date"] = max(state["last_date"], date)
+
+
+def _check(scope, state, x, amount, gap):
+    """Alerts (rule, score, expected, detail) for one transaction against
+    the state *before* it is folded in."""
+    if state["n"] < MIN_HISTORY:
+        return []
+    alerts = []
+
+    z = (x - state["mean"]) / max(math.sqrt(state["var"]), MIN_LOG_STD)
+    if z >= Z_THRESHOLD and amount > state["p95"]:
+        alerts.append((
+            "amount_spike", z, math.exp(state["mean"]),
+            f"{z:.1f} sd above the usual {scope} amount (p95 {state['p95']:,.0f})",
+        ))
+
+    usual = state["gap_mean"]
+    if gap is not None and usual and usual >= MIN_USUAL_GAP_DAYS and gap < usual * FREQUENCY_RATIO:
+        alerts.append((
+            "unusual_frequency", usual / max(gap, 1.0), usual,
+            f"{gap:.0f} days since the previous transaction, usually {usual:.0f}",
+        ))
+    return alerts
+
+
+def _load_states(cur, rows):
+    keys = set()
+    for scope, column in SCOPES.items():
+        keys.update(zip([scope] * len(rows), rows[column], rows["transaction_type"]))
+    if not keys:
+        return {}
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS _anomaly_keys (scope TEXT, key TEXT, transaction_type TEXT)")
+    cur.execute("DELETE FROM _anomaly_keys")
+    cur.executemany("INSERT INTO _anomaly_keys VALUES (?, ?, ?)", keys)
+    found = pd.read_sql("""
+        SELECT s.* FROM anomaly_state s
+        JOIN _anomaly_keys k
+          ON s.scope = k.scope AND s.key = k.key AND s.transaction_type = k.transaction_type
+    """, _reader(cur))
+    found["gap_mean"] = found["gap_mean"].astype(object).where(found["gap_mean"].notna(), None)
+    return {
+        (r.pop("scope"), r.pop("key"), r.pop("transaction_type")): r
+        for r in found.to_dict("records")
+    }
+
+
+def score(cur, rows):
+    """Score `rows` in date order, update the state and store alerts."""
+    rows = rows[SCORE_COLUMNS].dropna(subset=["transaction_date", "transaction_type", "amount"])
+    rows = rows[rows["amount"] > 0]
+    if rows.empty:
+        return 0
+    rows = rows.assign(
+        transaction_id=rows["transaction_id"].astype(str),
+        transaction_date=rows["transaction_date"].astype(str),
+        counterparty_name=rows["counterparty_name"].fillna(""),
+        category=rows["category"].fillna(""),
+    ).sort_values("transaction_date", kind="stable")
+
+    states = _load_states(cur, rows)
+    alerts = []
+    for txn in rows.itertuples(index=False):
+        x = math.log(txn.amount)
+        date = Date.fromisoformat(txn.transaction_date[:10])
+        for scope, column in SCOPES.items():
+            key = (scope, getattr(txn, column), txn.transaction_type)
+            state = states.get(key)
+            if state is None:
+                states[key] = _new_state(x, txn.amount, txn.transaction_date)
+                continue
+            gap = (date - Date.fromisoformat(state["last_date"][:10])).days
+            gap = gap if gap >= 0 else None
+            for rule, value, expected, detail in _check(scope, state, x, txn.amount, gap):
+                alerts.append((
+                    txn.transaction_id, rule, scope, txn.transaction_date,
+                    txn.transaction_type, txn.counterparty_name, txn.category,
+                    float(txn.amount), float(value), float(expected), detail,
+                ))
+            _update(state, x, txn.amount, txn.transaction_date, gap)
+
+    cur.executemany("""
+        INSERT OR REPLACE INTO anomaly_state
+            (scope, key, transaction_type, n, mean, var, p50, p95, gap_mean, last_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (*key, s["n"], s["mean"], s["var"], s["p50"], s["p95"], s["gap_mean"], s["last_date"])
+        for key, s in states.items()
+    ))
+    cur.executemany("""
+        INSERT OR REPLACE INTO anomaly_alerts
+            (transaction_id, rule, scope, transaction_date, transaction_type,
+             counterparty_name, category, amount, score, expected, detail)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, alerts)
+    return len(alerts)
+
+
+def apply_transactions(cur, new_rows, old_rows=None):
+    """Score the genuinely new rows of an ingested bank_statements chunk."""
+    if old_rows is not None and not old_rows.empty:
+        new_rows = new_rows[~new_rows["transaction_id"].astype(str).isin(
+            old_rows["transaction_id"].astype(str)
+        )]
+    score(cur, new_rows)
+
+
+def rebuild(cur):
+    """Replay the whole history (migration / repair only)."""
+    cur.execute("DELETE FROM anomaly_state")
+    cur.execute("DELETE FROM anomaly_alerts")
+    history = pd.read_sql(f"""
+        SELECT {", ".join(SCORE_COLUMNS)} FROM bank_statements
+        ORDER BY transaction_date
+    """, _reader(cur))
+    score(cur, history)
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+@cached()
+def get_alerts(limit=200, rule=None):
+    """Most recent anomaly alerts, newest transaction first."""
+    with connection() as conn:
+        return pd.read_sql(f"""
+            SELECT transaction_date, rule, scope, counterparty_name, category,
+                   transaction_type, amount, expected, score, detail, transaction_id
+            FROM anomaly_alerts
+            {"WHERE rule = ?" if rule else ""}
+            ORDER BY transaction_date DESC, score DESC
+            LIMIT ?
+        """, conn, params=((rule,) if rule else ()) + (limit,))
+
+
+@cached()
+def get_alert_counts():
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT rule, scope, COUNT(*) AS alerts
+            FROM anomaly_alerts
+            GROUP BY rule, scope
+            ORDER BY alerts DESC
+        """, conn)
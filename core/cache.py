@@ -0,0 +1,151 @@
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from core.db import connection
+
+# Results computed against date('now') windows go stale at midnight
+# even when the data does not change.
+RELATIVE_WINDOW_TTL = 300
+
+# -------------------------------------------------
+# Data version
+# -------------------------------------------------
+# A single counter the ingestion path bumps inside every write
+# transaction. Cache keys include it, so any ingest invalidates every
+# cached read without tracking which tables a query touches.
+
+def get_data_version():
+    with connection() as conn:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn):
+    """Increment the data version. Call inside the writing transaction."""
+    conn.execute("""
+        INSERT INTO data_version (id, version) VALUES (1, 1)
+        ON CONFLICT(id) DO UPDATE SET version = version + 1
+    """)
+
+# -------------------------------------------------
+# LRU cache
+# -------------------------------------------------
+def _sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if hasattr(value, "__dict__"):
+        return sum(_sizeof(v) for v in vars(value).values())
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values()) + sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value) + sys.getsizeof(value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """Thread-safe LRU bounded by entry count and approximate bytes,
+    with an optional per-entry TTL."""
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached(ttl=None, cache=None):
+    """Memoize a read function on (name, args, data version).
+
+    Use `ttl` (seconds) for results that depend on date('now') so that
+    relative windows roll over even when no new data arrives. Cached
+    values are shared between callers and must be treated as read-only.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        def key(args, kwargs):
+            return (name, args, tuple(sorted(kwargs.items())), get_data_version())
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            store = cache or query_cache
+            k = key(args, kwargs)
+            hit, value = store.get(k)
+            if hit:
+                return value
+            value = fn(*args, **kwargs)
+            store.set(k, value, ttl=ttl)
+            return value
+
+        def peek(*args, **kwargs):
+            """(hit, value) for these arguments, without computing on a miss."""
+            return (cache or query_cache).get(key(args, kwargs))
+
+        wrapper.uncached = fn
+        wrapper.peek = peek
+        return wrapper
+
+    return decorator
+
+
+def cache_stats():
+    return query_cache.stats()
@@ -0,0 +1,195 @@
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from core.db import connection
+
+# -------------------------------------------------
+# LangGraph checkpointer on the app database
+# -------------------------------------------------
+# Agent conversations are LangGraph threads (one per Streamlit session)
+# saved in agent_checkpoints / agent_checkpoint_writes (migration 13).
+# Each checkpoint is stored whole; that stays cheap because
+# core.agent_graph bounds the state it holds. Only the newest
+# KEEP_CHECKPOINTS of a thread are kept, so a long conversation does
+# not grow the table either.
+
+KEEP_CHECKPOINTS = 10
+
+
+def _config(thread_id, checkpoint_ns, checkpoint_id):
+    return {"configurable": {
+        "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+    }}
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """BaseCheckpointSaver over core.db's connection pool."""
+
+    def __init__(self, keep=KEEP_CHECKPOINTS, serde=None):
+        super().__init__(serde=serde)
+        self.keep = keep
+
+    # ---------------- reads ----------------
+    def _writes(self, conn, thread_id, checkpoint_ns, checkpoint_id):
+        rows = conn.execute("""
+            SELECT task_id, channel, type, value FROM agent_checkpoint_writes
+            WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+            ORDER BY task_id, idx
+        """, (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        return [(task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in rows]
+
+    def _tuple(self, conn, row):
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, meta_type, metadata = row
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((meta_type, metadata)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=self._writes(conn, thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                       type, checkpoint, metadata_type, metadata
+                FROM agent_checkpoints
+                WHERE thread_id = ? AND checkpoint_ns = ? AND (? IS NULL OR checkpoint_id = ?)
+                ORDER BY checkpoint_id DESC
+                LIMIT 1
+            """, (thread_id, checkpoint_ns, checkpoint_id, checkpoint_id)).fetchone()
+            return self._tuple(conn, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """Newest first. The metadata filter is applied after loading."""
+        configurable = (config or {}).get("configurable", {})
+        where, params = [], []
+        if "thread_id" in configurable:
+            where.append("thread_id = ?")
+            params.append(configurable["thread_id"])
+        if configurable.get("checkpoint_ns") is not None:
+            where.append("checkpoint_ns = ?")
+            params.append(configurable["checkpoint_ns"])
+        if config and get_checkpoint_id(config):
+            where.append("checkpoint_id = ?")
+            params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            where.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+
+        with connection() as conn:
+            rows = conn.execute(f"""
+                SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                       type, checkpoint, metadata_type, metadata
+                FROM agent_checkpoints
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY checkpoint_id DESC
+            """, params).fetchall()
+            found = []
+            for row in rows:
+                item = self._tuple(conn, row)
+                if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                found.append(item)
+                if limit is not None and len(found) >= limit:
+                    break
+        yield from found
+
+    # ---------------- writes ----------------
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        meta_type, meta = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with connection() as conn:
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO agent_checkpoints
+                        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                         type, checkpoint, metadata_type, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (thread_id, checkpoint_ns, checkpoint["id"],
+                      config["configurable"].get("checkpoint_id"), type_, blob, meta_type, meta))
+                self._prune(conn, thread_id, checkpoint_ns)
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id,
+                         WRITES_IDX_MAP.get(channel, idx), channel, type_, blob, task_path))
+        # special writes (errors, interrupts) replace; regular ones are written once
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        with connection() as conn:
+            with conn:
+                conn.executemany(f"""
+                    {verb} INTO agent_checkpoint_writes
+                        (thread_id, checkpoint_ns, checkpoint_id, task_id, idx,
+                         channel, type, value, task_path)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+
+    def _prune(self, conn, thread_id, checkpoint_ns):
+        cutoff = conn.execute("""
+            SELECT checkpoint_id FROM agent_checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC
+            LIMIT 1 OFFSET ?
+        """, (thread_id, checkpoint_ns, self.keep - 1)).fetchone()
+        if cutoff is None:
+            return
+        for table in ("agent_checkpoints", "agent_checkpoint_writes"):
+            conn.execute(f"""
+                DELETE FROM {table}
+                WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?
+            """, (thread_id, checkpoint_ns, cutoff[0]))
+
+    def delete_thread(self, thread_id):
+        with connection() as conn:
+            with conn:
+                conn.execute("DELETE FROM agent_checkpoints WHERE thread_id = ?", (thread_id,))
+                conn.execute("DELETE FROM agent_checkpoint_writes WHERE thread_id = ?", (thread_id,))
+
+    def delete_stale_threads(self, days):
+        """Drop threads with no checkpoint in the last `days` days."""
+        with connection() as conn:
+            with conn:
+                stale = [r[0] for r in conn.execute("""
+                    SELECT thread_id FROM agent_checkpoints
+                    GROUP BY thread_id
+                    HAVING MAX(created_at) < datetime('now', ?)
+                """, (f"-{int(days)} days",))]
+                for table in ("agent_checkpoints", "agent_checkpoint_writes"):
+                    conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", ((t,) for t in stale))
+        return len(stale)
+
+    # ---------------- async ----------------
+    # astream_answer runs the graph on an event loop; the SQLite calls
+    # are short, so the async API just calls the sync one.
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from core.cache import cached, RELATIVE_WINDOW_TTL
+from core import ledger
+from core.db import connection
+
+# -------------------------------------------------
+# Dashboard metric bundle
+# -------------------------------------------------
+NO_BURN_RUNWAY_DAYS = 999
+
+
+@dataclass
+class DashboardMetrics:
+    current_balance: float
+    inflow_30d: float
+    outflow_30d: float
+    net_change_30d: float
+    burn_rate: float
+    runway_days: int
+    cash_trend: pd.DataFrame           # transaction_date, net_flow, balance
+    expense_breakdown: pd.DataFrame    # category, total_spent
+    monthly_flow: pd.DataFrame         # month, inflow, outflow, net
+    mom_drivers: pd.DataFrame          # category, total_latest, total_prev, delta
+
+
+def _window_start(days):
+    # date('now', '-N day') in SQLite is UTC
+    return (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+
+
+def _mom_drivers(monthly_cat):
+    outflow = monthly_cat[monthly_cat["outflow"] > 0]
+    months = sorted(outflow["year_month"].unique())
+    if len(months) < 2:
+        return pd.DataFrame(columns=["category", "total_latest", "total_prev", "delta"])
+
+    latest = outflow[outflow["year_month"] == months[-1]][["category", "outflow"]]
+    previous = outflow[outflow["year_month"] == months[-2]][["category", "outflow"]]
+    merged = latest.merge(
+        previous, on="category", how="left", suffixes=("_latest", "_prev")
+    ).fillna(0)
+    merged.columns = ["category", "total_latest", "total_prev"]
+    merged["delta"] = merged["total_latest"] - merged["total_prev"]
+    return merged.sort_values("delta", ascending=False).reset_index(drop=True)
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def get_dashboard_metrics(window_days=30):
+    """Every number the Dashboards and Alerts tabs need, from one read
+    of each rollup table plus the balance ledger."""
+    with connection() as conn:
+        daily = pd.read_sql("""
+            SELECT transaction_date, inflow, outflow, net_flow
+            FROM daily_cash_flow
+            ORDER BY transaction_date
+        """, conn)
+        monthly_cat = pd.read_sql("""
+            SELECT year_month, category, inflow, outflow
+            FROM monthly_category_flow
+        """, conn)
+
+    current_balance = ledger.get_balance()
+    daily["balance"] = ledger.balance_on(daily["transaction_date"])
+
+    recent = daily[daily["transaction_date"] >= _window_start(window_days)]
+    inflow = float(recent["inflow"].sum())
+    outflow = float(recent["outflow"].sum())
+    burn_rate = outflow / window_days if outflow else 0.0
+    runway_days = int(current_balance / burn_rate) if burn_rate else NO_BURN_RUNWAY_DAYS
+
+    expense = (
+        monthly_cat[monthly_cat["outflow"] > 0]
+        .groupby("category", as_index=False)["outflow"].sum()
+        .rename(columns={"outflow": "total_spent"})
+    )
+
+    monthly = (
+        monthly_cat.groupby("year_month", as_index=False)[["inflow", "outflow"]].sum()
+        .rename(columns={"year_month": "month"})
+        .sort_values("month")
+        .reset_index(drop=True)
+    )
+    monthly["net"] = monthly["inflow"] - monthly["outflow"]
+
+    return DashboardMetrics(
+        current_balance=current_balance,
+        inflow_30d=inflow,
+        outflow_30d=outflow,
+        net_change_30d=inflow - outflow,
+        burn_rate=burn_rate,
+        runway_days=runway_days,
+        cash_trend=daily[["transaction_date", "net_flow", "balance"]],
+        expense_breakdown=expense,
+        monthly_flow=monthly,
+        mom_drivers=_mom_drivers(monthly_cat),
+    )
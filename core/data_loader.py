@@ -1,8 +1,253 @@
+import hashlib
+import os
+
 import pandas as pd
-from core.db import get_conn
+from core import anomalies, ledger, normalize, reconciliation, rollups, storage, vendor_risk
+from core.cache import bump_data_version
+from core.db import connection, NATURAL_KEYS
+from core.instrumentation import span
+
+# -------------------------------------------------
+# Sources
+# -------------------------------------------------
+CSV_SOURCES = {
+    "bank_statements": "data/bank_statements.csv",
+    "vendor_invoices": "data/vendor_invoices.csv",
+    "client_invoices": "data/client_invoices.csv",
+    "payroll": "data/payroll.csv",
+    "expense_receipts": "data/expense_receipts.csv",
+    "cash_forecast": "data/cash_forecast.csv",
+}
+
+# Called as hook(conn, new_rows, old_rows) inside each chunk's transaction;
+# old_rows is the previous version of rows the chunk overwrites.
+INGEST_HOOKS = {
+    "bank_statements": [
+        (rollups.apply_transactions, rollups.ROLLUP_COLUMNS),
+        (ledger.apply_transactions, ledger.HOOK_COLUMNS),
+        (reconciliation.apply_transactions, reconciliation.HOOK_COLUMNS["bank_statements"]),
+        (anomalies.apply_transactions, anomalies.HOOK_COLUMNS),
+        (vendor_risk.apply_transactions, vendor_risk.HOOK_COLUMNS),
+    ],
+    "vendor_invoices": [
+        (reconciliation.apply_vendor_invoices, reconciliation.HOOK_COLUMNS["vendor_invoices"]),
+    ],
+    "client_invoices": [
+        (reconciliation.apply_client_invoices, reconciliation.HOOK_COLUMNS["client_invoices"]),
+    ],
+    "expense_receipts": [
+        (reconciliation.apply_expense_receipts, reconciliation.HOOK_COLUMNS["expense_receipts"]),
+    ],
+}
+
+# Same signature, called after each chunk's transaction commits: for
+# writes outside SQLite (the Parquet mirror) that must not keep rows a
+# rolled-back chunk never stored. If one fails, the watermark is not
+# advanced and the next run re-ingests (and re-mirrors) the chunk.
+COMMIT_HOOKS = {}
+
+if storage.columnar_enabled():
+    for _table, _date_col in storage.PARTITION_DATES.items():
+        COMMIT_HOOKS.setdefault(_table, []).append(
+            (storage.columnar_hook(_table), [NATURAL_KEYS[_table], _date_col])
+        )
+
+CHUNK_SIZE = 50_000
+HASH_WINDOW = 64 * 1024
+
+# -------------------------------------------------
+# Watermarks
+# -------------------------------------------------
+def _fingerprint(path, offset):
+    """Hash of the file head and of the bytes just before `offset`.
+
+    Cheap to recompute on every run and enough to tell an appended
+    file (same prefix) from a rewritten one.
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        h.update(f.read(min(HASH_WINDOW, offset)))
+        tail_start = max(0, offset - HASH_WINDOW)
+        f.seek(tail_start)
+        h.update(f.read(offset - tail_start))
+    return h.hexdigest()
+
+
+def _get_watermark(conn, path):
+    row = conn.execute("""
+        SELECT byte_offset, file_size, mtime, content_hash
+        FROM ingest_watermarks
+        WHERE source_path = ?
+    """, (path,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "byte_offset": row[0],
+        "file_size": row[1],
+        "mtime": row[2],
+        "content_hash": row[3],
+    }
+
+
+def _save_watermark(conn, table, path, offset, mtime, rows):
+    conn.execute("""
+        INSERT INTO ingest_watermarks
+            (source_path, table_name, byte_offset, file_size, mtime,
+             content_hash, rows_ingested, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source_path) DO UPDATE SET
+            table_name = excluded.table_name,
+            byte_offset = excluded.byte_offset,
+            file_size = excluded.file_size,
+            mtime = excluded.mtime,
+            content_hash = excluded.content_hash,
+            rows_ingested = ingest_watermarks.rows_ingested + excluded.rows_ingested,
+            updated_at = CURRENT_TIMESTAMP
+    """, (path, table, offset, offset, mtime, _fingerprint(path, offset), rows))
+
+
+def _resume_offset(path, watermark, size):
+    """Byte offset to resume from, or None when nothing changed."""
+    if watermark is None:
+        return 0
+    offset = watermark["byte_offset"]
+    if size == watermark["file_size"] and os.path.getmtime(path) == watermark["mtime"]:
+        return None
+    if size > offset and _fingerprint(path, offset) == watermark["content_hash"]:
+        return offset
+    # file was rewritten or truncated: re-ingest it, upserts keep this idempotent
+    return 0
+
+# -------------------------------------------------
+# Upsert
+# -------------------------------------------------
+def _table_columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _upsert_sql(table, key, columns):
+    cols = ", ".join(columns)
+    params = ", ".join("?" for _ in columns)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+    return (
+        f"INSERT INTO {table} ({cols}) VALUES ({params}) "
+        f"ON CONFLICT({key}) DO UPDATE SET {updates}"
+    )
+
+
+def _existing_rows(conn, table, key, keys, columns):
+    """Current stored version of the rows whose natural key is in `keys`."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _ingest_keys (k TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM _ingest_keys")
+    conn.executemany(
+        "INSERT OR IGNORE INTO _ingest_keys (k) VALUES (?)",
+        ((k,) for k in keys)
+    )
+    cols = ", ".join(f"t.{c}" for c in columns)
+    return pd.read_sql(
+        f"SELECT {cols} FROM {table} t JOIN _ingest_keys k ON t.{key} = k.k",
+        conn
+    )
+
+
+def _upsert_chunk(conn, table, key, df, table_columns):
+    columns = [c for c in df.columns if c in table_columns]
+    df = df[columns].astype(object).where(df[columns].notna(), None)
+    conn.executemany(
+        _upsert_sql(table, key, columns),
+        df.itertuples(index=False, name=None)
+    )
+
+# -------------------------------------------------
+# Ingestion
+# -------------------------------------------------
+def _read_chunks(f, path, offset, chunksize):
+    if offset == 0:
+        return pd.read_csv(f, chunksize=chunksize)
+
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    f.seek(offset)
+    return pd.read_csv(f, header=None, names=header, chunksize=chunksize)
+
+
+def load_csv(table, path, chunksize=CHUNK_SIZE):
+    """Stream `path` into `table` in chunks, upserting on the natural key.
+
+    Only bytes appended since the last run are read; each chunk is
+    normalized (see core.normalize), with malformed rows quarantined,
+    and committed in its own transaction so memory stays bounded by
+    `chunksize`. Returns the number of rows written.
+    """
+    if table not in NATURAL_KEYS:
+        raise ValueError(f"Unknown table: {table}")
+    key = NATURAL_KEYS[table]
+
+    with connection() as conn:
+        size = os.path.getsize(path)
+        mtime = os.path.getmtime(path)
+        offset = _resume_offset(path, _get_watermark(conn, path), size)
+        if offset is None:
+            return 0
+
+        table_columns = _table_columns(conn, table)
+        if key not in table_columns:
+            raise ValueError(f"{table} has no natural key column {key}")
+
+        rows = 0
+        with open(path, "rb") as f, _read_chunks(f, path, offset, chunksize) as reader:
+            for chunk in reader:
+                if key not in chunk.columns:
+                    raise ValueError(f"{path} has no {key} column")
+                with span("ingest", f"{table}.normalize"):
+                    chunk, rejects = normalize.normalize(table, chunk)
+                chunk = chunk.drop_duplicates(subset=[key], keep="last")
+                hooks = INGEST_HOOKS.get(table, [])
+                after_commit = COMMIT_HOOKS.get(table, [])
+                with conn:
+                    normalize.quarantine(conn, table, path, rejects)
+                    if chunk.empty:
+                        continue
+                    # one keyed read of the previous versions; each hook gets its columns
+                    hook_columns = list(dict.fromkeys(c for _, cols in hooks + after_commit for c in cols))
+                    existing = (
+                        _existing_rows(conn, table, key, chunk[key].astype(str), hook_columns)
+                        if hook_columns else None
+                    )
+                    old = {hook: existing[cols] for hook, cols in hooks + after_commit}
+                    with span("ingest", f"{table}.upsert"):
+                        _upsert_chunk(conn, table, key, chunk, table_columns)
+                    for hook, _ in hooks:
+                        with span("ingest", f"{table}.{hook.__module__.rsplit('.', 1)[-1]}.{hook.__name__}"):
+                            hook(conn, chunk, old[hook])
+                    bump_data_version(conn)
+                for hook, _ in after_commit:
+                    with span("ingest", f"{table}.{hook.__module__.rsplit('.', 1)[-1]}.{hook.__name__}"):
+                        hook(conn, chunk, old[hook])
+                rows += len(chunk)
+
+        with conn:
+            _save_watermark(conn, table, path, size, mtime, rows)
+        return rows
+
+
+def load_all(sources=None, chunksize=CHUNK_SIZE, progress=None):
+    """Incrementally ingest every CSV source, then re-score vendors if
+    bank or vendor rows changed. Returns rows written per table.
 
-def load_csv(table, path):
-    df = pd.read_csv(path)
-    conn = get_conn()
-    df.to_sql(table, conn, if_exists="replace", index=False)
-    conn.close()
+    `progress(fraction, message)` is called before each table; it may
+    raise to stop between tables (core.jobs uses this for cancellation).
+    A load that stops early skips the re-score, so an error raised by it
+    is the one the caller sees; the chunks it did commit are scored by the
+    next daily re-score (vendor_risk.is_stale) or the vendor_risk job.
+    """
+    sources = sources or CSV_SOURCES
+    written = {}
+    for i, (table, path) in enumerate(sources.items()):
+        if progress:
+            progress(i / len(sources), f"loading {table}")
+        with span("ingest", table):
+            written[table] = load_csv(table, path, chunksize=chunksize)
+    if written.get("bank_statements") or written.get("vendor_invoices"):
+        with span("ingest", "vendor_risk.refresh"):
+            vendor_risk.refresh()
+    return written
@@ -1,64 +1,614 @@
 import sqlite3
 import os
+import threading
+import time
+from contextlib import contextmanager
 
 from dotenv import load_dotenv
+from core import instrumentation
 load_dotenv()
 
 DB_PATH = os.getenv("DB_PATH")
 
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",      # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MiB memory map
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
 def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    """Open a new, tuned connection. The caller owns it and must close it.
+
+    Prefer `connection()`, which borrows from the shared pool.
+    """
+    conn = sqlite3.connect(
+        DB_PATH, check_same_thread=False, factory=instrumentation.connection_factory()
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+# -------------------------------------------------
+# Connection pool
+# -------------------------------------------------
+class ConnectionPool:
+    """Bounded pool of SQLite connections with per-thread reuse.
+
+    A thread that already holds a connection gets the same one back on
+    nested `connection()` calls, so helpers can open a connection freely
+    without holding several pool slots at once.
+    """
+
+    def __init__(self, factory=get_conn, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self._factory = factory
+        self._max_size = max_size
+        self._timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open = 0
+        self._local = threading.local()
+        self._stats = {
+            "checkouts": 0,
+            "reuses": 0,
+            "waits": 0,
+            "wait_time_s": 0.0,
+            "max_wait_s": 0.0,
+            "created": 0,
+        }
+
+    def _acquire(self):
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while not self._idle and self._open >= self._max_size:
+                waited = True
+                remaining = self._timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No database connection free after {self._timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._open += 1
+                self._stats["created"] += 1
+                conn = None
+
+            wait = time.perf_counter() - start
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_s"] += wait
+                self._stats["max_wait_s"] = max(self._stats["max_wait_s"], wait)
+
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            held[1] += 1
+            with self._cond:
+                self._stats["reuses"] += 1
+            try:
+                yield held[0]
+            finally:
+                held[1] -= 1
+            return
+
+        conn = self._acquire()
+        self._local.held = [conn, 1]
+        try:
+            yield conn
+        finally:
+            self._local.held = None
+            self._release(conn)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "max_size": self._max_size,
+            }
+
+    def close_all(self):
+        """Close idle connections, e.g. before replacing the database file."""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def connection():
+    """Borrow a pooled connection: `with connection() as conn: ...`"""
+    return get_pool().connection()
+
 
-def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
+def pool_metrics():
+    return get_pool().metrics()
 
-    cur.executescript("""
+# -------------------------------------------------
+# Managed schema
+# -------------------------------------------------
+# Natural key of every ingested table; it is the PRIMARY KEY and the
+# upsert target for core.data_loader.
+NATURAL_KEYS = {
+    "bank_statements": "transaction_id",
+    "vendor_invoices": "invoice_id",
+    "client_invoices": "invoice_id",
+    "payroll": "payroll_id",
+    "expense_receipts": "receipt_id",
+    "cash_forecast": "forecast_date",
+}
+
+# Dates are stored as ISO-8601 TEXT (YYYY-MM-DD), normalized on ingest by
+# core.normalize, so they sort and range-scan correctly on the indexes below.
+TABLES = {
+    "bank_statements": """
     CREATE TABLE IF NOT EXISTS bank_statements (
-        transaction_id TEXT,
+        transaction_id TEXT PRIMARY KEY,
         account_number TEXT,
         transaction_date TEXT,
+        value_date TEXT,
         transaction_type TEXT,
         amount REAL,
         balance_after REAL,
+        currency TEXT,
         counterparty_name TEXT,
         narration TEXT,
         category TEXT,
         payment_mode TEXT
-    );
-
+    )""",
+    "vendor_invoices": """
     CREATE TABLE IF NOT EXISTS vendor_invoices (
-        invoice_id TEXT,
+        invoice_id TEXT PRIMARY KEY,
+        vendor_id TEXT,
         vendor_name TEXT,
+        invoice_number TEXT,
         invoice_date TEXT,
         due_date TEXT,
+        category TEXT,
+        gross_amount REAL,
+        tax_amount REAL,
         net_amount REAL,
-        payment_status TEXT
-    );
-
+        payment_status TEXT,
+        expected_payment_mode TEXT
+    )""",
+    "client_invoices": """
     CREATE TABLE IF NOT EXISTS client_invoices (
-        invoice_id TEXT,
+        invoice_id TEXT PRIMARY KEY,
+        client_id TEXT,
         client_name TEXT,
+        invoice_number TEXT,
         invoice_date TEXT,
         due_date TEXT,
+        service_type TEXT,
+        gross_amount REAL,
+        tax_amount REAL,
         net_amount REAL,
         collection_status TEXT
-    );
-
+    )""",
+    "payroll": """
     CREATE TABLE IF NOT EXISTS payroll (
+        payroll_id TEXT PRIMARY KEY,
+        employee_id TEXT,
         employee_name TEXT,
+        designation TEXT,
+        department TEXT,
         pay_period TEXT,
+        gross_salary REAL,
+        tax_deduction REAL,
         net_salary REAL,
-        payment_status TEXT
-    );
-
+        payment_status TEXT,
+        payment_reference TEXT
+    )""",
+    "expense_receipts": """
     CREATE TABLE IF NOT EXISTS expense_receipts (
+        receipt_id TEXT PRIMARY KEY,
         expense_date TEXT,
         merchant_name TEXT,
         expense_category TEXT,
-        amount REAL
-    );
+        amount REAL,
+        tax_amount REAL,
+        payment_mode TEXT,
+        linked_transaction_id TEXT
+    )""",
+    "cash_forecast": """
+    CREATE TABLE IF NOT EXISTS cash_forecast (
+        forecast_date TEXT PRIMARY KEY,
+        expected_inflow REAL,
+        expected_outflow REAL,
+        source TEXT,
+        confidence_level TEXT
+    )""",
+}
+
+# -------------------------------------------------
+# Migrations
+# -------------------------------------------------
+def _has_primary_key(cur, table, key):
+    cols = cur.execute(f"PRAGMA table_info({table})").fetchall()
+    return any(c[1] == key and c[5] for c in cols)
+
+
+def _migrate_base_tables(cur):
+    """Create the managed tables, rebuilding any legacy heap table.
+
+    Older databases were written by `DataFrame.to_sql(if_exists="replace")`
+    and have no primary key; their rows are copied into the managed table.
+    """
+    for table, ddl in TABLES.items():
+        exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone()
+        if exists and not _has_primary_key(cur, table, NATURAL_KEYS[table]):
+            legacy = f"{table}_legacy"
+            cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+            cur.execute(ddl)
+            new_cols = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+            old_cols = [r[1] for r in cur.execute(f"PRAGMA table_info({legacy})")]
+            cols = ", ".join(c for c in old_cols if c in new_cols)
+            cur.execute(f"""
+                INSERT OR REPLACE INTO {table} ({cols})
+                SELECT {cols} FROM {legacy}
+                WHERE {NATURAL_KEYS[table]} IS NOT NULL
+            """)
+            cur.execute(f"DROP TABLE {legacy}")
+        else:
+            cur.execute(ddl)
+
+    cur.execute("""
+    -- one row per source file: how far it has been ingested
+    CREATE TABLE IF NOT EXISTS ingest_watermarks (
+        source_path TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        byte_offset INTEGER NOT NULL,
+        file_size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        content_hash TEXT NOT NULL,
+        rows_ingested INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+
+INDEXES = [
+    ("ix_bank_txn_date", "bank_statements", "transaction_date"),
+    ("ix_bank_type_date", "bank_statements", "transaction_type, transaction_date"),
+    ("ix_bank_counterparty", "bank_statements", "counterparty_name"),
+    ("ix_bank_category", "bank_statements", "category"),
+    ("ix_vendor_inv_status", "vendor_invoices", "payment_status"),
+    ("ix_vendor_inv_due", "vendor_invoices", "due_date"),
+    ("ix_vendor_inv_vendor", "vendor_invoices", "vendor_name"),
+    ("ix_client_inv_status", "client_invoices", "collection_status"),
+    ("ix_client_inv_due", "client_invoices", "due_date"),
+    ("ix_client_inv_client", "client_invoices", "client_name"),
+    ("ix_payroll_period", "payroll", "pay_period"),
+    ("ix_expense_date", "expense_receipts", "expense_date"),
+    ("ix_expense_linked_txn", "expense_receipts", "linked_transaction_id"),
+]
+
+# year_month columns come with migration 10
+NORMALIZED_INDEXES = [
+    ("ix_bank_year_month", "bank_statements", "year_month, category"),
+    ("ix_vendor_inv_year_month", "vendor_invoices", "year_month"),
+    ("ix_client_inv_year_month", "client_invoices", "year_month"),
+    ("ix_expense_year_month", "expense_receipts", "year_month"),
+    ("ix_quarantine_table", "ingest_quarantine", "table_name, quarantined_at"),
+]
+
+
+def _migrate_indexes(cur):
+    for name, table, cols in INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+    cur.execute("ANALYZE")
+
+
+def _migrate_rollups(cur):
+    from core import rollups
+    rollups.create_tables(cur)
+    rollups.rebuild(cur)
+
+
+def _migrate_data_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )""")
+    cur.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+
+def _migrate_llm_responses(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            data_version INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )""")
+
+
+def _migrate_cash_forecast(cur):
+    cur.execute(TABLES["cash_forecast"])
+
+
+def _migrate_reconciliation(cur):
+    from core import reconciliation
+    reconciliation.create_tables(cur)
+    reconciliation.rebuild(cur)
+
+
+def _migrate_anomalies(cur):
+    from core import anomalies
+    anomalies.create_tables(cur)
+    anomalies.rebuild(cur)
+
+
+def _migrate_ledger(cur):
+    from core import ledger
+    ledger.create_tables(cur)
+    ledger.rebuild(cur)
+
+
+def _migrate_normalized_columns(cur):
+    """Add year_month and the quarantine table, then bring rows written
+    before ingest-time normalization to the same canonical form."""
+    import pandas as pd
+    from core import anomalies, ledger, normalize, reconciliation, rollups
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_quarantine (
+            id INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            source_path TEXT,
+            row_key TEXT,
+            row_hash TEXT NOT NULL,
+            raw TEXT NOT NULL,          -- the row as read, JSON
+            reason TEXT NOT NULL,
+            quarantined_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (table_name, row_hash)
+        )""")
+
+    changed = 0
+    iso = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+    for table, schema in normalize.SCHEMAS.items():
+        columns = [r[1] for r in cur.execute(f"PRAGMA table_info({table})")]
+        if table in normalize.MONTH_SOURCES and normalize.MONTH_COLUMN not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {normalize.MONTH_COLUMN} TEXT")
+
+        # rows with a non-ISO date or a non-canonical enum go through normalize()
+        checks = [f"({c} IS NOT NULL AND {c} NOT GLOB '{iso}')" for c in schema.get("dates", [])]
+        checks += [
+            f"({c} IS NOT NULL AND {c} NOT IN ({', '.join(repr(v) for v in allowed)}))"
+            for c, allowed in schema.get("enums", {}).items()
+        ]
+        if checks:
+            df = pd.read_sql(
+                f"SELECT rowid AS _rowid, * FROM {table} WHERE {' OR '.join(checks)}",
+                cur.connection
+            )
+            if not df.empty:
+                clean, rejects = normalize.normalize(table, df.drop(columns="_rowid"))
+                fixed = schema.get("dates", []) + list(schema.get("enums", {}))
+                cur.executemany(
+                    f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in fixed)} WHERE rowid = ?",
+                    [
+                        tuple(None if pd.isna(v) else v for v in row[:-1]) + (int(row[-1]),)
+                        for row in clean[fixed].assign(_rowid=df["_rowid"]).itertuples(index=False)
+                    ]
+                )
+                normalize.quarantine(cur, table, None, rejects)
+                cur.executemany(
+                    f"DELETE FROM {table} WHERE rowid = ?",
+                    [(int(r),) for r in df.loc[rejects.index, "_rowid"]]
+                )
+                changed += len(df)
+
+        for c in schema.get("money", []):
+            cur.execute(f"""
+                UPDATE {table} SET {c} = ROUND({c} * 100) / 100.0
+                WHERE {c} != ROUND({c} * 100) / 100.0
+            """)
+            changed += cur.rowcount
+        if table in normalize.MONTH_SOURCES:
+            cur.execute(f"""
+                UPDATE {table}
+                SET {normalize.MONTH_COLUMN} = substr({normalize.MONTH_SOURCES[table]}, 1, 7)
+            """)
+
+    for name, table, cols in NORMALIZED_INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+
+    if changed:
+        for module in (rollups, ledger, reconciliation, anomalies):
+            module.rebuild(cur)
+    cur.execute("ANALYZE")
+
+
+def _migrate_vendor_risk(cur):
+    from core import vendor_risk
+    vendor_risk.create_tables(cur)
+    vendor_risk.rebuild(cur)
+
+
+def _migrate_jobs(cur):
+    from core import jobs
+    jobs.create_tables(cur)
+
+
+def _migrate_agent_checkpoints(cur):
+    # core.checkpoints imports LangGraph, so its tables are declared here
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS agent_checkpoints (
+            thread_id TEXT NOT NULL,
+            checkpoint_ns TEXT NOT NULL DEFAULT '',
+            checkpoint_id TEXT NOT NULL,
+            parent_checkpoint_id TEXT,
+            type TEXT,
+            checkpoint BLOB,
+            metadata_type TEXT,
+            metadata BLOB,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+        )""")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS agent_checkpoint_writes (
+            thread_id TEXT NOT NULL,
+            checkpoint_ns TEXT NOT NULL DEFAULT '',
+            checkpoint_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            type TEXT,
+            value BLOB,
+            task_path TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+        )""")
+
+
+# counterparty_key columns come with migration 14; reconciliation looks up
+# candidates by name, then amount range, and checks the date window on
+# the index entry before reading the row
+COUNTERPARTY_INDEXES = [
+    ("ix_bank_counterparty_key", "bank_statements",
+     "counterparty_key, transaction_type, amount, transaction_date"),
+    ("ix_vendor_inv_counterparty_key", "vendor_invoices", "counterparty_key, net_amount, due_date, invoice_date"),
+    ("ix_client_inv_counterparty_key", "client_invoices", "counterparty_key, net_amount, due_date, invoice_date"),
+]
+
+
+def _migrate_counterparty_keys(cur):
+    """Store the normalized counterparty name, so reconciliation can find
+    candidates on an index instead of wrapping the name in functions.
+    Backfilled in Python: SQLite's lower() does not casefold non-ASCII."""
+    import pandas as pd
+    from core import normalize
+
+    for table, column in normalize.NAME_SOURCES.items():
+        columns = [r[1] for r in cur.execute(f"PRAGMA table_info({table})")]
+        if normalize.KEY_COLUMN not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {normalize.KEY_COLUMN} TEXT")
+        names = pd.read_sql(f"SELECT DISTINCT {column} AS name FROM {table}", cur.connection)
+        names["key"] = normalize.counterparty_key(names["name"])
+        cur.executemany(
+            f"UPDATE {table} SET {normalize.KEY_COLUMN} = ? WHERE {column} IS ?",
+            names[["key", "name"]].itertuples(index=False, name=None)
+        )
+
+    for name, table, cols in COUNTERPARTY_INDEXES:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+    cur.execute("ANALYZE")
+
+
+# Append-only: (version, name, fn). Never edit an applied migration,
+# add a new one instead.
+MIGRATIONS = [
+    (1, "base tables with natural primary keys", _migrate_base_tables),
+    (2, "query indexes", _migrate_indexes),
+    (3, "cash rollup tables", _migrate_rollups),
+    (4, "data version counter", _migrate_data_version),
+    (5, "llm response cache", _migrate_llm_responses),
+    (6, "cash forecast table", _migrate_cash_forecast),
+    (7, "reconciliation matches", _migrate_reconciliation),
+    (8, "streaming anomaly state and alerts", _migrate_anomalies),
+    (9, "per-account balance ledger", _migrate_ledger),
+    (10, "normalized dates, year_month and ingest quarantine", _migrate_normalized_columns),
+    (11, "vendor risk features and score snapshots", _migrate_vendor_risk),
+    (12, "background job queue", _migrate_jobs),
+    (13, "agent conversation checkpoints", _migrate_agent_checkpoints),
+    (14, "indexed counterparty keys", _migrate_counterparty_keys),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
     """)
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
 
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction."""
+    current = get_schema_version(conn)
     conn.commit()
-    conn.close()
+    for version, name, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            fn(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return SCHEMA_VERSION
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def init_db(force=False):
+    """Bring the schema up to date, once per process (Streamlit calls this
+    on every rerun). `force` re-checks, e.g. after replacing the file."""
+    global _schema_ready
+    if _schema_ready and not force:
+        return
+    with _schema_lock:
+        if _schema_ready and not force:
+            return
+        with connection() as conn:
+            migrate(conn)
+        _schema_ready = True
@@ -0,0 +1,167 @@
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+from core.db import connection, NATURAL_KEYS
+
+# -------------------------------------------------
+# Data explorer backend
+# -------------------------------------------------
+# Keyset pagination: a page is "the next `page_size` rows after the last
+# (sort value, key) seen", so every page costs one index range scan no
+# matter how deep it is - unlike OFFSET, which re-reads every skipped row.
+# Table and column names are checked against the schema; values are
+# always bound parameters.
+
+EXPLORABLE_TABLES = list(NATURAL_KEYS)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+COUNT_CAP = 100_000     # filtered counts stop here and report ">="
+
+OPERATORS = {
+    "=": "{col} = ?",
+    "!=": "{col} != ?",
+    "<": "{col} < ?",
+    "<=": "{col} <= ?",
+    ">": "{col} > ?",
+    ">=": "{col} >= ?",
+    "contains": "{col} LIKE ? ESCAPE '\\'",
+    "starts with": "{col} LIKE ? ESCAPE '\\'",
+    "is empty": "({col} IS NULL OR {col} = '')",
+}
+
+
+@dataclass
+class Filter:
+    column: str
+    op: str
+    value: object = None
+
+
+@dataclass
+class Page:
+    rows: pd.DataFrame
+    next_cursor: tuple           # pass back as `after` for the next page; None at the end
+    count: int
+    count_exact: bool
+    elapsed_ms: float
+    columns: list = field(default_factory=list)
+
+
+def query_key(table, columns, sort, descending, filters, page_size):
+    """Hashable identity of a query; a change means paging restarts.
+    Filters are keyed on their values, not only the columns they test."""
+    return (table, tuple(columns), sort, descending,
+            tuple((f.column, f.op, f.value) for f in filters), page_size)
+
+
+def table_columns(table):
+    if table not in EXPLORABLE_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    with connection() as conn:
+        return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _escape_like(value):
+    return str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _where(filters, columns):
+    clauses, params = [], []
+    for f in filters:
+        if f.column not in columns:
+            raise ValueError(f"Unknown column: {f.column}")
+        if f.op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {f.op}")
+        clauses.append(OPERATORS[f.op].format(col=f.column))
+        if f.op == "contains":
+            params.append(f"%{_escape_like(f.value)}%")
+        elif f.op == "starts with":
+            params.append(f"{_escape_like(f.value)}%")
+        elif f.op != "is empty":
+            params.append(f.value)
+    return clauses, params
+
+
+def _keyset(sort, key, descending, after):
+    """Rows strictly after cursor `after` = (sort value, key value) in
+    ORDER BY sort, key. SQLite puts NULLs first ascending and last
+    descending; a row-value comparison would drop them, so spell it out."""
+    value, last_key = after
+    if sort == key:
+        return (f"{key} < ?" if descending else f"{key} > ?"), [last_key]
+    cmp = "<" if descending else ">"
+    if value is None:
+        if descending:
+            return f"({sort} IS NULL AND {key} < ?)", [last_key]
+        return f"(({sort} IS NULL AND {key} > ?) OR {sort} IS NOT NULL)", [last_key]
+    clause = f"({sort} {cmp} ? OR ({sort} = ? AND {key} {cmp} ?)"
+    clause += f" OR {sort} IS NULL)" if descending else ")"
+    return clause, [value, value, last_key]
+
+
+def estimate_count(conn, table, where, params):
+    """Exact when cheap, bounded otherwise: (count, exact)."""
+    if not where:
+        row = conn.execute(f"SELECT MAX(rowid) - MIN(rowid) + 1 FROM {table}").fetchone()
+        return int(row[0] or 0), False
+    n = conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {' AND '.join(where)} LIMIT ?)",
+        params + [COUNT_CAP + 1]
+    ).fetchone()[0]
+    return min(n, COUNT_CAP), n <= COUNT_CAP
+
+
+def fetch_page(table, columns=None, filters=(), sort=None, descending=False,
+               after=None, page_size=DEFAULT_PAGE_SIZE, with_count=True):
+    """One page of `table`. `after` is the previous page's next_cursor."""
+    start = time.perf_counter()
+    all_columns = table_columns(table)
+    key = NATURAL_KEYS[table]
+    sort = sort or key
+    if sort not in all_columns:
+        raise ValueError(f"Unknown column: {sort}")
+    columns = [c for c in (columns or all_columns) if c in all_columns] or all_columns
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+    where, params = _where(filters, all_columns)
+    count_where, count_params = list(where), list(params)
+    if after is not None:
+        clause, extra = _keyset(sort, key, descending, after)
+        where.append(clause)
+        params += extra
+
+    direction = "DESC" if descending else "ASC"
+    order = f"{sort} {direction}" + (f", {key} {direction}" if sort != key else "")
+    # the cursor columns always come back, even when not displayed
+    select = list(dict.fromkeys(columns + [sort, key]))
+    sql = (
+        f"SELECT {', '.join(select)} FROM {table}"
+        + (f" WHERE {' AND '.join(where)}" if where else "")
+        + f" ORDER BY {order} LIMIT ?"
+    )
+
+    with connection() as conn:
+        rows = pd.read_sql(sql, conn, params=params + [page_size + 1])
+        count, exact = (
+            estimate_count(conn, table, count_where, count_params)
+            if with_count else (0, False)
+        )
+
+    has_more = len(rows) > page_size
+    rows = rows.iloc[:page_size]
+    next_cursor = None
+    if has_more:
+        last = rows.iloc[-1]
+        value = last[sort]
+        next_cursor = (None if pd.isna(value) else value.item() if hasattr(value, "item") else value,
+                       last[key])
+
+    return Page(
+        rows=rows[columns].reset_index(drop=True),
+        next_cursor=next_cursor,
+        count=count,
+        count_exact=exact,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+        columns=columns,
+    )
@@ -0,0 +1,330 @@
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from core import ledger, storage
+from core.cache import cached
+from core.db import connection
+
+# -------------------------------------------------
+# Monte Carlo cash forecast
+# -------------------------------------------------
+# Daily net flow = bootstrap of historical "unscheduled" flows
+#                + scheduled items (recurring Salary/Rent, open vendor and
+#                  client invoices, cash_forecast entries), each realised
+#                  with a probability and, for collections, a delay.
+# Everything is simulated as (days x paths) float32 NumPy arrays; no
+# Python loop runs per path or per day. float32 halves the memory traffic
+# of the draw, cumsum and sort, and its ~1e-7 relative error is far below
+# the spread between paths.
+
+# Bank categories modelled from schedules rather than resampled history.
+RECURRING_CATEGORIES = ("Salary", "Rent")
+INVOICE_CATEGORIES = ("Vendor Payment", "Client Collection")
+
+# Probability that an open item is realised inside the horizon.
+VENDOR_PAYMENT_PROB = 0.95
+CLIENT_COLLECTION_PROB = {"Pending": 0.9, "Overdue": 0.6}
+CONFIDENCE_PROB = {"High": 0.9, "Medium": 0.6, "Low": 0.3}
+
+# cash_forecast sources already covered by another schedule above.
+MODELLED_FORECAST_SOURCES = ("Rent", "Payroll", "Client Invoice")
+
+CLIENT_DELAY_MEAN_DAYS = 10      # geometric delay after the due date
+OVERDUE_SPREAD_DAYS = 30         # past-due items land uniformly in this window
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class Schedule:
+    """Scheduled items grouped by day: n items of `amount` each (signed)."""
+    day: np.ndarray       # int, day offset from the start
+    count: np.ndarray     # int, items due that day
+    amount: np.ndarray    # float, mean signed amount per item
+    prob: np.ndarray      # float, probability each item is realised
+    delay_mean: float = 0.0
+
+
+@dataclass
+class ForecastInputs:
+    start_date: pd.Timestamp
+    opening_balance: float
+    hist_net: np.ndarray  # historical daily unscheduled net flow
+    schedules: list
+
+
+@dataclass
+class ForecastResult:
+    dates: pd.DatetimeIndex
+    percentiles: dict          # pct -> balance per day
+    prob_shortfall: np.ndarray  # P(balance < threshold) per day
+    expected_balance: np.ndarray
+    threshold: float
+    paths: int
+    elapsed_ms: float
+
+    def to_frame(self):
+        df = pd.DataFrame({"date": self.dates, "expected": self.expected_balance,
+                           "prob_shortfall": self.prob_shortfall})
+        for p, values in self.percentiles.items():
+            df[f"p{p}"] = values
+        return df
+
+    def to_dict(self):
+        """JSON-serialisable form, e.g. for a job result."""
+        return {
+            "start_date": self.dates[0].date().isoformat() if len(self.dates) else None,
+            "percentiles": {str(p): values.tolist() for p, values in self.percentiles.items()},
+            "prob_shortfall": self.prob_shortfall.tolist(),
+            "expected_balance": self.expected_balance.tolist(),
+            "threshold": self.threshold,
+            "paths": self.paths,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            dates=pd.date_range(d["start_date"], periods=len(d["expected_balance"])),
+            percentiles={int(p): np.array(v) for p, v in d["percentiles"].items()},
+            prob_shortfall=np.array(d["prob_shortfall"]),
+            expected_balance=np.array(d["expected_balance"]),
+            threshold=d["threshold"],
+            paths=d["paths"],
+            elapsed_ms=d["elapsed_ms"],
+        )
+
+# -------------------------------------------------
+# Inputs
+# -------------------------------------------------
+def _group_schedule(days, amounts, probs, delay_mean=0.0):
+    """Group items sharing (day, prob) so the simulation draws one
+    binomial per group instead of one Bernoulli per item. Past-due items
+    are spread oldest-first over the first OVERDUE_SPREAD_DAYS days."""
+    if len(days) == 0:
+        return None
+    df = pd.DataFrame({"day": days, "amount": amounts, "prob": probs})
+    overdue = df["day"] < 0
+    if overdue.any():
+        rank = df.loc[overdue, "day"].rank(method="first").astype(np.int64) - 1
+        df.loc[overdue, "day"] = rank % OVERDUE_SPREAD_DAYS
+    g = df.groupby(["day", "prob"], as_index=False).agg(
+        count=("amount", "size"), amount=("amount", "mean")
+    )
+    return Schedule(
+        day=g["day"].to_numpy(np.int64),
+        count=g["count"].to_numpy(np.int64),
+        amount=g["amount"].to_numpy(np.float64),
+        prob=g["prob"].to_numpy(np.float64),
+        delay_mean=delay_mean,
+    )
+
+
+def _recurring_schedule(start, horizon_days):
+    hist = storage.get_store().scan(
+        "bank_statements", ["transaction_date", "category", "amount"],
+        [("transaction_type", "=", "DEBIT"), ("category", "in", RECURRING_CATEGORIES)]
+    )
+    if hist.empty:
+        return None
+    hist = hist.groupby(["transaction_date", "category"], as_index=False)["amount"].sum()
+
+    hist["transaction_date"] = pd.to_datetime(hist["transaction_date"])
+    dates = pd.date_range(start, periods=horizon_days)
+    days, amounts = [], []
+    for _, g in hist.groupby("category"):
+        dom = int(g["transaction_date"].dt.day.mode().iloc[0])
+        amount = float(g["amount"].median())
+        hits = np.flatnonzero(dates.day == dom)
+        days.extend(hits)
+        amounts.extend([-amount] * len(hits))
+    return _group_schedule(np.array(days), np.array(amounts), np.ones(len(days)))
+
+
+def _vendor_schedule(conn, start):
+    df = pd.read_sql("""
+        SELECT due_date, net_amount FROM vendor_invoices
+        WHERE payment_status != 'Paid'
+    """, conn)
+    due = pd.to_datetime(df["due_date"], format="ISO8601", errors="coerce")
+    df = df[due.notna()]
+    days = (due[due.notna()] - start).dt.days.to_numpy()
+    return _group_schedule(days, -df["net_amount"].to_numpy(), np.full(len(df), VENDOR_PAYMENT_PROB))
+
+
+def _client_schedule(conn, start):
+    df = pd.read_sql("""
+        SELECT due_date, net_amount, collection_status FROM client_invoices
+        WHERE collection_status != 'Collected'
+    """, conn)
+    due = pd.to_datetime(df["due_date"], format="ISO8601", errors="coerce")
+    df = df[due.notna()]
+    days = (due[due.notna()] - start).dt.days.to_numpy()
+    probs = df["collection_status"].map(CLIENT_COLLECTION_PROB).fillna(0.5).to_numpy()
+    return _group_schedule(days, df["net_amount"].to_numpy(), probs, CLIENT_DELAY_MEAN_DAYS)
+
+
+def _cash_forecast_schedule(conn, start, horizon_days):
+    df = pd.read_sql(f"""
+        SELECT forecast_date, expected_inflow, expected_outflow, confidence_level
+        FROM cash_forecast
+        WHERE source NOT IN ({", ".join("?" for _ in MODELLED_FORECAST_SOURCES)})
+    """, conn, params=MODELLED_FORECAST_SOURCES)
+    days = (pd.to_datetime(df["forecast_date"], errors="coerce") - start).dt.days
+    df = df[(days >= 0) & (days < horizon_days)]
+    days = days[df.index].to_numpy()
+    net = (df["expected_inflow"] - df["expected_outflow"]).to_numpy()
+    probs = df["confidence_level"].map(CONFIDENCE_PROB).fillna(0.5).to_numpy()
+    return _group_schedule(days, net, probs)
+
+
+def _has_table(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone() is not None
+
+
+@cached()
+def load_forecast_inputs(horizon_days=365):
+    """History and schedules as of the latest bank transaction."""
+    with connection() as conn:
+        daily = pd.read_sql(f"""
+            SELECT transaction_date, SUM(inflow) - SUM(outflow) AS net
+            FROM daily_category_flow
+            WHERE category NOT IN ({", ".join("?" for _ in RECURRING_CATEGORIES + INVOICE_CATEGORIES)})
+            GROUP BY transaction_date
+            ORDER BY transaction_date
+        """, conn, params=RECURRING_CATEGORIES + INVOICE_CATEGORIES)
+        last = conn.execute("""
+            SELECT transaction_date, running_balance FROM daily_cash_flow
+            ORDER BY transaction_date DESC LIMIT 1
+        """).fetchone()
+
+        if last is None:
+            start = pd.Timestamp.now(tz="UTC").tz_localize(None).normalize()
+        else:
+            start = pd.Timestamp(last[0]) + pd.Timedelta(days=1)
+
+        schedules = [
+            _recurring_schedule(start, horizon_days),
+            _vendor_schedule(conn, start),
+            _client_schedule(conn, start),
+        ]
+        if _has_table(conn, "cash_forecast"):
+            schedules.append(_cash_forecast_schedule(conn, start, horizon_days))
+
+    hist_net = daily["net"].to_numpy(np.float64) if not daily.empty else np.zeros(1)
+    return ForecastInputs(
+        start_date=start,
+        opening_balance=ledger.get_balance(),
+        hist_net=hist_net,
+        schedules=[s for s in schedules if s is not None],
+    )
+
+# -------------------------------------------------
+# Simulation
+# -------------------------------------------------
+def _binomial_by_inversion(rng, count, prob, paths, eps=1e-12):
+    """Binomial(count, prob) per path and group, 0 < prob < 1, by
+    inverting each group's CDF: one uniform and one searchsorted per
+    draw, several times cheaper than rng.binomial for small counts.
+    CDF entries within `eps` of 0 or 1 are trimmed so the search table
+    stays a few entries long."""
+    out = np.empty((len(count), paths), dtype=np.float32)
+    u = rng.random((len(count), paths))
+    for g, (n, p) in enumerate(zip(count, prob)):
+        k = np.arange(n + 1)
+        log_choose = np.concatenate(([0.0], np.cumsum(np.log((n - k[1:] + 1) / k[1:]))))
+        cdf = np.cumsum(np.exp(log_choose + k * np.log(p) + (n - k) * np.log1p(-p)))[:-1]
+        lead, tail = np.searchsorted(cdf, [eps, 1 - eps])
+        out[g] = np.searchsorted(cdf[lead:tail], u[g], side="right") + lead
+    return out.T
+
+
+def _draw_counts(rng, count, prob, paths):
+    """Binomial(count, prob) per path and group. Certain groups are not
+    sampled, groups with variance >= 9 use the normal approximation and
+    the rest are drawn by CDF inversion."""
+    out = np.zeros((paths, len(count)), dtype=np.float32)
+    certain = prob >= 1
+    out[:, certain] = count[certain]
+    var = count * prob * (1 - prob)
+    big = ~certain & (var >= 9)
+    small = ~certain & ~big & (prob > 0) & (count > 0)
+    if big.any():
+        z = rng.standard_normal((paths, int(big.sum())), dtype=np.float32)
+        drawn = np.rint(count[big] * prob[big] + np.sqrt(var[big]) * z)
+        out[:, big] = np.clip(drawn, 0, count[big])
+    if small.any():
+        out[:, small] = _binomial_by_inversion(rng, count[small], prob[small], paths)
+    return out
+
+
+def _add_schedule(rng, flows, schedule):
+    """Add one schedule's realised items into `flows` (days x paths)."""
+    days, paths = flows.shape
+    in_range = schedule.day < days
+    if not in_range.any():
+        return
+    day, count = schedule.day[in_range], schedule.count[in_range]
+    amount, prob = schedule.amount[in_range], schedule.prob[in_range]
+
+    value = _draw_counts(rng, count, prob, paths) * amount.astype(np.float32)
+    if not schedule.delay_mean:
+        np.add.at(flows, day, value.T)
+        return
+
+    # geometric(1 / (1 + delay_mean)) by inversion; uniforms in (0, 1]
+    u = 1 - rng.random(value.shape, dtype=np.float32)
+    delay = np.ceil(np.log(u) / np.float32(np.log1p(-1.0 / (1.0 + schedule.delay_mean))))
+    when = day + np.maximum(delay, 1).astype(np.int64) - 1
+    keep = when < days
+    flat = (when * paths + np.arange(paths)[:, None])[keep]
+    np.add.at(flows.reshape(-1), flat, value[keep])
+
+
+def _percentiles(values, q):
+    """np.percentile(values, q, axis=1) (linear interpolation), but via a
+    full row sort, which is several times faster than the partition-based
+    path for (days x paths) arrays."""
+    ordered = np.sort(values, axis=1)
+    pos = np.asarray(q, dtype=np.float64) / 100 * (ordered.shape[1] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, ordered.shape[1] - 1)
+    frac = pos - lo
+    return (ordered[:, lo] * (1 - frac) + ordered[:, hi] * frac).T
+
+
+def simulate(inputs, days=90, paths=10_000, threshold=0.0, seed=0):
+    """Simulate `paths` balance trajectories. Arrays are laid out
+    (days x paths) so the cumulative sum and the per-day percentiles
+    both run over contiguous memory."""
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    hist_net = inputs.hist_net.astype(np.float32)
+    flows = hist_net[rng.integers(0, len(hist_net), size=(days, paths))]
+    for schedule in inputs.schedules:
+        _add_schedule(rng, flows, schedule)
+
+    balances = np.cumsum(flows, axis=0, out=flows)
+    balances += inputs.opening_balance
+    pct = _percentiles(balances, PERCENTILES)
+
+    return ForecastResult(
+        dates=pd.date_range(inputs.start_date, periods=days),
+        percentiles={p: pct[i].astype(np.float64) for i, p in enumerate(PERCENTILES)},
+        prob_shortfall=(balances < threshold).mean(axis=1),
+        expected_balance=balances.mean(axis=1, dtype=np.float64),
+        threshold=threshold,
+        paths=paths,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+@cached()
+def run_forecast(days=90, paths=10_000, threshold=0.0, seed=0):
+    """Percentile bands and shortfall probability for the next `days` days."""
+    return simulate(load_forecast_inputs(max(days, 365)), days, paths, threshold, seed)
@@ -0,0 +1,342 @@
+import atexit
+import functools
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# -------------------------------------------------
+# Timing spans and histograms
+# -------------------------------------------------
+# Every span lands in a fixed-bucket histogram keyed by (kind, name):
+#   sql   - one per statement, named by its normalized text
+#   node  - LangGraph nodes
+#   llm   - upstream model calls (cache misses only)
+#   tool  - agent tool calls
+#   tab   - Streamlit tab renders
+#   ingest
+#   job   - background jobs (core.jobs)
+# Recording is a perf_counter pair and a dict update under one lock.
+# Statements slower than SLOW_QUERY_MS also keep their EXPLAIN QUERY PLAN.
+#
+# INSTRUMENTATION=0 turns it all off. METRICS_EXPORT_PATH=/path/metrics.json
+# writes a JSON snapshot there, plus Prometheus text next to it
+# (metrics.prom), at most every EXPORT_INTERVAL_S and at exit.
+
+ENABLED = os.getenv("INSTRUMENTATION", "1") not in ("0", "false", "")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH")
+EXPORT_INTERVAL_S = 10
+
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+MAX_SERIES_PER_KIND = 500   # further names are folded into "(other)"
+SLOW_QUERY_LOG_SIZE = 50
+LABEL_MAX_CHARS = 200
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding q."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen, lower = 0, 0.0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            if n and seen + n >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max, 3),
+            "buckets": {("+Inf" if math.isinf(b) else str(b)): n for b, n in zip(BUCKETS_MS, self.counts)},
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}        # kind -> {name: Histogram}
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_started_at = time.time()
+
+
+def observe(kind, name, ms):
+    if not ENABLED:
+        return
+    with _lock:
+        series = _histograms.setdefault(kind, {})
+        hist = series.get(name)
+        if hist is None:
+            if len(series) >= MAX_SERIES_PER_KIND:
+                name = "(other)"
+                hist = series.get(name)
+            if hist is None:
+                hist = series[name] = Histogram()
+        hist.observe(ms)
+
+
+@contextmanager
+def span(kind, name):
+    """Time the enclosed block into the (kind, name) histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(kind, name, (time.perf_counter() - start) * 1000)
+
+
+def timed(kind, name=None):
+    """Decorator form of `span`; the name defaults to the function's."""
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _slow_queries.clear()
+
+# -------------------------------------------------
+# SQL statements
+# -------------------------------------------------
+_WS_RE = re.compile(r"\s+")
+_PLACEHOLDERS_RE = re.compile(r"\?(\s*,\s*\?)+")
+_NO_PLAN = ("EXPLAIN", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "CREATE", "DROP")
+
+
+def normalize_sql(sql):
+    """One label per statement shape: whitespace collapsed, IN lists folded."""
+    text = _PLACEHOLDERS_RE.sub("?, ...", _WS_RE.sub(" ", sql).strip())
+    return text if len(text) <= LABEL_MAX_CHARS else text[:LABEL_MAX_CHARS - 3] + "..."
+
+
+def _explain(conn, sql, params):
+    try:
+        cur = sqlite3.Cursor(conn)
+        return [row[-1] for row in cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def _record_sql(conn, sql, params, ms, many=False):
+    label = normalize_sql(sql)
+    observe("sql", label, ms)
+    if ms < SLOW_QUERY_MS:
+        return
+    plan = None
+    if not many and not label.upper().startswith(_NO_PLAN):
+        plan = _explain(conn, sql, params)
+    with _lock:
+        _slow_queries.append({
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "ms": round(ms, 3),
+            "sql": label,
+            "params": None if many else repr(params)[:LABEL_MAX_CHARS],
+            "plan": plan,
+        })
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times execute() plus the fetches that drain its rows as one span,
+    recorded when the rows are drained, the cursor is reused or closed."""
+
+    _pending = None     # [sql, params, elapsed_ms, many]
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            _record_sql(self.connection, *pending)
+
+    def execute(self, sql, parameters=()):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, (time.perf_counter() - start) * 1000, False]
+            if self.description is None:
+                self._flush()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending = [sql, None, (time.perf_counter() - start) * 1000, True]
+            self._flush()
+
+    def _timed_fetch(self, fetch, *args, done=lambda rows: True):
+        start = time.perf_counter()
+        rows = fetch(*args)
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - start) * 1000
+            if done(rows):
+                self._flush()
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        return self._timed_fetch(super().fetchmany, size, done=lambda rows: len(rows) < size)
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        # rows consumed by iterating the cursor end up here
+        self._flush()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (and execute shortcuts) are timed.
+    Pass as `factory=` to sqlite3.connect."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    return InstrumentedConnection if ENABLED else sqlite3.Connection
+
+# -------------------------------------------------
+# Snapshot + export
+# -------------------------------------------------
+def _gauges():
+    # imported here: core.db imports this module
+    from core.cache import cache_stats
+    from core.db import get_pool
+    gauges = {"uptime_seconds": time.time() - _started_at}
+    for prefix, stats in (("db_pool", get_pool().metrics()), ("query_cache", cache_stats())):
+        gauges.update({f"{prefix}_{k}": v for k, v in stats.items() if isinstance(v, (int, float))})
+    return gauges
+
+
+def snapshot():
+    """Histograms, the slow-query log and pool/cache gauges as plain data."""
+    with _lock:
+        spans = [
+            {"kind": kind, "name": name, **hist.to_dict()}
+            for kind, series in _histograms.items()
+            for name, hist in series.items()
+        ]
+        slow = list(_slow_queries)
+    try:
+        gauges = _gauges()
+    except Exception:   # e.g. no database configured yet
+        gauges = {}
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "slow_query_ms": SLOW_QUERY_MS,
+        "spans": sorted(spans, key=lambda s: -s["sum_ms"]),
+        "slow_queries": slow[::-1],
+        "gauges": gauges,
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(snap=None):
+    """Prometheus text exposition of a snapshot (durations in seconds)."""
+    snap = snap or snapshot()
+    lines = [
+        "# HELP cash_span_seconds Duration of instrumented spans.",
+        "# TYPE cash_span_seconds histogram",
+    ]
+    for s in snap["spans"]:
+        labels = f'kind="{_label(s["kind"])}",name="{_label(s["name"])}"'
+        cumulative = 0
+        for bound, n in s["buckets"].items():
+            cumulative += n
+            le = bound if bound == "+Inf" else repr(float(bound) / 1000)
+            lines.append(f'cash_span_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"cash_span_seconds_sum{{{labels}}} {s['sum_ms'] / 1000}")
+        lines.append(f"cash_span_seconds_count{{{labels}}} {s['count']}")
+    for name, value in snap["gauges"].items():
+        lines.append(f"# TYPE cash_{name} gauge")
+        lines.append(f"cash_{name} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path=None):
+    """Write the JSON snapshot to `path` and Prometheus text beside it."""
+    path = path or METRICS_EXPORT_PATH
+    if not path:
+        return None
+    snap = snapshot()
+    prom_path = os.path.splitext(path)[0] + ".prom"
+    for target, text in ((path, json.dumps(snap, indent=2, default=str)), (prom_path, to_prometheus(snap))):
+        tmp = target + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, target)
+    return path
+
+
+_last_export = 0.0
+
+
+def maybe_export():
+    """export() if METRICS_EXPORT_PATH is set and the last one is stale."""
+    global _last_export
+    if not (ENABLED and METRICS_EXPORT_PATH):
+        return
+    now = time.monotonic()
+    if now - _last_export >= EXPORT_INTERVAL_S:
+        _last_export = now
+        export()
+
+
+if ENABLED and METRICS_EXPORT_PATH:
+    atexit.register(export)
@@ -0,0 +1,535 @@
+import calendar
+import difflib
+import functools
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+from core.cache import cached
+from core.db import connection
+from core.tools import (
+    _get_current_cash_balance,
+    _get_top_cash_outflows_last_30_days,
+    _get_flow_summary,
+    _get_vendor_dues,
+    _get_overdue_collections,
+    _get_receivables_aging,
+    _get_payables_aging,
+    _get_payroll_summary,
+    _get_cash_runway
+)
+
+# -------------------------------------------------
+# Intent rules (compiled once at import)
+# -------------------------------------------------
+# First matching intent wins, so more specific intents come first.
+INTENT_RULES = [
+    ("explain_cash_drop", [
+        r"\bwhy\b.*\b(cash|balance|money)\b",
+        r"\b(cash|balance)\b.*\b(down|drop\w*|reduc\w*|decreas\w*|falling|declin\w*)\b",
+    ]),
+    ("runway", [
+        r"\brunway\b",
+        r"\bburn(ing)?\b",
+        r"\bhow long\b.*\b(cash|money)\b",
+    ]),
+    ("aging", [
+        r"\bage?ing\b",
+        r"\b(dso|dpo)\b",
+        r"\bdays? (sales|payables?) outstanding\b",
+    ]),
+    ("overdue_collections", [
+        r"\b(overdue|pending|outstanding|uncollected|unpaid)\b.*\b(collections?|receivables?|clients?|customers?)\b",
+        r"\b(clients?|customers?)\b.*\b(owe|overdue|pending|outstanding|unpaid)\b",
+        r"\breceivables?\b",
+        r"\bwho owes us\b",
+    ]),
+    ("vendor_dues", [
+        r"\b(vendors?|suppliers?)\b.*\b(dues?|owe|owed|unpaid|outstanding|pending|payables?)\b",
+        r"\b(dues?|unpaid|outstanding|pending)\b.*\b(vendors?|suppliers?|bills?)\b",
+        r"\b(what|how much) do we owe\b",
+        r"\bpayables?\b",
+    ]),
+    ("payroll", [
+        r"\b(payroll|salary|salaries|wages)\b",
+    ]),
+    ("balance", [
+        r"\bbalance\b",
+        r"\bhow much (cash|money)\b",
+    ]),
+    ("inflows", [
+        r"\b(inflows?|collections?|collected|received|revenue|income)\b",
+    ]),
+    ("outflows", [
+        r"\bcash ?flow\b",
+        r"\boutflows?\b",
+        r"\b(spend|spent|spending|expenses?|pay|paid|payments?)\b",
+    ]),
+]
+
+_COMPILED_RULES = [
+    (name, [re.compile(p) for p in patterns])
+    for name, patterns in INTENT_RULES
+]
+
+# Words the rules care about; misspelt query tokens are snapped to them.
+_VOCABULARY = sorted({
+    w for _, patterns in INTENT_RULES for p in patterns
+    for w in re.findall(r"[a-z]{4,}", re.sub(r"\\[a-z]", " ", p))
+})
+
+_PAYABLES_RE = re.compile(r"\b(payables?|vendors?|suppliers?|dpo|bills?)\b")
+_RECEIVABLES_RE = re.compile(r"\b(receivables?|clients?|customers?|dso|collections?)\b")
+
+# Clause boundaries used to spot compound questions.
+_CLAUSE_SPLIT_RE = re.compile(r"[?;]|\band\b|\balso\b|\bplus\b")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+MONTHS = {}
+for _i in range(1, 13):
+    MONTHS[calendar.month_name[_i].lower()] = _i
+    MONTHS[calendar.month_abbr[_i].lower()] = _i
+
+_RELATIVE_RE = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b")
+_LAST_PERIOD_RE = re.compile(r"\b(this|current|last|previous)\s+(week|month|year)\b")
+_ISO_MONTH_RE = re.compile(r"\b(20\d{2})-(0[1-9]|1[0-2])\b")
+_MONTH_NAME_RE = re.compile(
+    r"\b(in\s+)?(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b"
+    r"(?:\s*,?\s*(20\d{2}))?"
+)
+_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# Tokens too common in company names to identify one on their own.
+GENERIC_NAME_TOKENS = {
+    "india", "pvt", "ltd", "corp", "solutions", "systems", "technologies",
+    "infotech", "office", "rentals", "tech", "the", "and", "co",
+}
+
+# -------------------------------------------------
+# Routing metrics
+# -------------------------------------------------
+_metrics_lock = threading.Lock()
+_route_latencies_ms = deque(maxlen=2000)
+_intent_counts = {}
+
+
+def _record(intent, elapsed_ms):
+    with _metrics_lock:
+        _route_latencies_ms.append(elapsed_ms)
+        _intent_counts[intent] = _intent_counts.get(intent, 0) + 1
+
+
+def routing_metrics():
+    with _metrics_lock:
+        latencies = sorted(_route_latencies_ms)
+        counts = dict(_intent_counts)
+    total = sum(counts.values())
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {
+        "queries": total,
+        "by_intent": counts,
+        "local_ratio": 1 - counts.get("llm_fallback", 0) / total if total else 0.0,
+        "route_ms_p50": pct(0.50),
+        "route_ms_p95": pct(0.95),
+        "route_ms_max": latencies[-1] if latencies else 0.0,
+    }
+
+# -------------------------------------------------
+# Slot extraction
+# -------------------------------------------------
+@dataclass
+class DateRange:
+    start: str
+    end: str
+    label: str
+
+
+@dataclass
+class RoutedIntent:
+    name: str
+    slots: dict = field(default_factory=dict)
+    route_ms: float = 0.0
+
+
+def _today():
+    # matches SQLite's date('now'), which is UTC
+    return datetime.now(timezone.utc).date()
+
+
+def _month_range(year, month, label=None):
+    last = calendar.monthrange(year, month)[1]
+    return DateRange(
+        date(year, month, 1).isoformat(),
+        date(year, month, last).isoformat(),
+        label or f"in {calendar.month_name[month]} {year}"
+    )
+
+
+def extract_date_range(text, today=None):
+    today = today or _today()
+
+    m = _RELATIVE_RE.search(text)
+    if m:
+        n, unit = int(m.group(1)), m.group(2)
+        start = today - timedelta(days=n * UNIT_DAYS[unit])
+        return DateRange(start.isoformat(), today.isoformat(), f"in the last {n} {unit}s")
+
+    m = _LAST_PERIOD_RE.search(text)
+    if m:
+        which, unit = m.group(1), m.group(2)
+        current = which in ("this", "current")
+        if unit == "week":
+            start = today - timedelta(days=7 if current else 14)
+            end = today if current else today - timedelta(days=7)
+            return DateRange(start.isoformat(), end.isoformat(), f"{which} week")
+        if unit == "month":
+            if current:
+                return DateRange(today.replace(day=1).isoformat(), today.isoformat(), "this month")
+            prev = today.replace(day=1) - timedelta(days=1)
+            return _month_range(prev.year, prev.month, "last month")
+        year = today.year if current else today.year - 1
+        end = today if current else date(year, 12, 31)
+        return DateRange(date(year, 1, 1).isoformat(), end.isoformat(), f"in {year}")
+
+    m = _ISO_MONTH_RE.search(text)
+    if m:
+        return _month_range(int(m.group(1)), int(m.group(2)))
+
+    for m in _MONTH_NAME_RE.finditer(text):
+        word, year = m.group(2), m.group(3)
+        # "may" is usually the verb unless anchored by "in" or a year
+        if word == "may" and not (m.group(1) or year):
+            continue
+        month = MONTHS[word]
+        if year:
+            return _month_range(int(year), month)
+        # most recent occurrence of that month
+        year = today.year if month <= today.month else today.year - 1
+        return _month_range(year, month)
+
+    m = _YEAR_RE.search(text)
+    if m:
+        year = int(m.group(1))
+        return DateRange(date(year, 1, 1).isoformat(), date(year, 12, 31).isoformat(), f"in {year}")
+
+    return None
+
+
+@cached()
+def _entities():
+    """Known categories and counterparty names, reloaded when data changes."""
+    with connection() as conn:
+        categories = pd.read_sql(
+            "SELECT DISTINCT category FROM monthly_category_flow WHERE category != ''", conn
+        )["category"].tolist()
+        parties = pd.read_sql(
+            "SELECT DISTINCT counterparty_name FROM counterparty_flow WHERE counterparty_name != ''", conn
+        )["counterparty_name"].tolist()
+        vendors = pd.read_sql(
+            "SELECT DISTINCT vendor_name FROM vendor_invoices", conn
+        )["vendor_name"].dropna().tolist()
+        clients = pd.read_sql(
+            "SELECT DISTINCT client_name FROM client_invoices", conn
+        )["client_name"].dropna().tolist()
+
+    return {
+        "categories": categories,
+        "counterparties": sorted(set(parties) | set(vendors) | set(clients)),
+        "vendors": set(vendors),
+        "clients": set(clients),
+    }
+
+
+def _singular(token):
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _fuzzy_in(word, tokens):
+    return bool(difflib.get_close_matches(word, tokens, n=1, cutoff=0.85))
+
+
+def match_category(text, categories):
+    """First category whose stemmed tokens appear as a run of whole query tokens."""
+    stems = [_singular(t) for t in _tokens(text)]
+    for category in categories:
+        key = [_singular(t) for t in _tokens(category)]
+        if not key:
+            continue
+        n = len(key)
+        if any(stems[i:i + n] == key for i in range(len(stems) - n + 1)):
+            return category
+    return None
+
+
+def match_counterparty(text, names):
+    lowered = text.lower()
+    tokens = _tokens(text)
+    best, best_score = None, 0
+    for name in names:
+        if name.lower() in lowered:
+            return name
+        key_tokens = [t for t in _tokens(name) if t not in GENERIC_NAME_TOKENS and len(t) > 2]
+        score = sum(1 for t in key_tokens if t in tokens or _fuzzy_in(t, tokens))
+        if key_tokens and score > best_score:
+            best, best_score = name, score
+    return best
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_token(token):
+    if len(token) < 4 or token in _VOCABULARY:
+        return token
+    match = difflib.get_close_matches(token, _VOCABULARY, n=1, cutoff=0.8)
+    return match[0] if match else token
+
+
+def normalize(text):
+    """Lowercase, tokenise and snap near-miss spellings to the rule vocabulary."""
+    return " ".join(_normalize_token(t) for t in _tokens(text))
+
+# -------------------------------------------------
+# Routing
+# -------------------------------------------------
+def classify(text):
+    normalized = normalize(text)
+    for name, patterns in _COMPILED_RULES:
+        if any(p.search(normalized) for p in patterns):
+            return name
+    return None
+
+
+def is_compound(text):
+    """True when separate clauses of `text` ask for different intents."""
+    intents = {classify(clause) for clause in _CLAUSE_SPLIT_RE.split(text.lower())}
+    intents.discard(None)
+    return len(intents) > 1
+
+
+def _aging_side(text):
+    """"receivables", "payables" or None (both) for an aging question."""
+    payables = _PAYABLES_RE.search(text)
+    receivables = _RECEIVABLES_RE.search(text)
+    if payables and not receivables:
+        return "payables"
+    if receivables and not payables:
+        return "receivables"
+    return None
+
+
+def route(query):
+    """Classify `query` and extract its slots.
+
+    None means "ask the LLM": either nothing matched or the question
+    combines several intents, which the tool-calling agent handles.
+    Every call is timed and counted, fallbacks included.
+    """
+    start = time.perf_counter()
+    intent = classify(query)
+    if intent is None or is_compound(query):
+        _record("llm_fallback", (time.perf_counter() - start) * 1000)
+        return None
+
+    text = query.lower()
+    entities = _entities()
+    slots = {
+        "date_range": extract_date_range(text),
+        "category": match_category(text, entities["categories"]),
+        "counterparty": match_counterparty(text, entities["counterparties"]),
+    }
+    # the payroll/salary wording already selects the intent
+    if intent == "payroll" and slots["category"] == "Salary":
+        slots["category"] = None
+    if intent == "aging":
+        slots["side"] = _aging_side(text)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    _record(intent, elapsed_ms)
+    return RoutedIntent(intent, slots, elapsed_ms)
+
+# -------------------------------------------------
+# Local answers
+# -------------------------------------------------
+def _inr(amount):
+    return f"₹{int(amount or 0):,}"
+
+
+def _default_range():
+    today = _today()
+    return DateRange((today - timedelta(days=30)).isoformat(), today.isoformat(), "in the last 30 days")
+
+
+def _answer_explain_cash_drop(slots):
+    balance = _get_current_cash_balance()
+    outflows = _get_top_cash_outflows_last_30_days()
+
+    if not outflows["outflows"]:
+        return "Insufficient recent transaction data to explain cash reduction."
+
+    lines = [
+        "Your cash is reducing mainly due to the following expenses (last 30 days):"
+    ]
+    for item in outflows["outflows"]:
+        lines.append(
+            f"- {item['category']}: approximately ₹{int(item['total_spent'])}"
+        )
+    lines.append(
+        f"\nCurrent available cash balance is approximately ₹{int(balance['balance'])}."
+    )
+    return "\n".join(lines)
+
+
+def _answer_balance(slots):
+    balance = _get_current_cash_balance()
+    return f"Your current cash balance is approximately ₹{int(balance['balance'])}."
+
+
+def _answer_flow(slots, direction):
+    rng = slots["date_range"]
+    category = slots["category"]
+    counterparty = slots["counterparty"]
+
+    if direction == "outflow" and not (rng or category or counterparty):
+        outflows = _get_top_cash_outflows_last_30_days()
+        if not outflows["outflows"]:
+            return "No cash outflow data available for the last 30 days."
+        lines = ["Top cash outflows in the last 30 days:"]
+        for item in outflows["outflows"]:
+            lines.append(
+                f"- {item['category']}: approximately ₹{int(item['total_spent'])}"
+            )
+        return "\n".join(lines)
+
+    rng = rng or _default_range()
+    summary = _get_flow_summary(rng.start, rng.end, category, counterparty)
+    subject = "Cash inflow" if direction == "inflow" else "Cash outflow"
+    if category:
+        subject += f" for {category}"
+    if counterparty:
+        subject += f" {'from' if direction == 'inflow' else 'to'} {counterparty}"
+
+    total = summary[direction]
+    if not total:
+        return f"No {direction} recorded {rng.label} ({rng.start} to {rng.end})."
+
+    lines = [f"{subject} {rng.label} ({rng.start} to {rng.end}): approximately {_inr(total)}."]
+    rows = [r for r in summary["by_category"] if r[direction]]
+    if len(rows) > 1:
+        rows.sort(key=lambda r: r[direction], reverse=True)
+        for r in rows[:5]:
+            lines.append(f"- {r['category']}: approximately {_inr(r[direction])}")
+    return "\n".join(lines)
+
+
+def _answer_vendor_dues(slots):
+    vendor = slots["counterparty"] if slots["counterparty"] in _entities()["vendors"] else None
+    dues = _get_vendor_dues(vendor)
+    if not dues["vendors"]:
+        return f"No unpaid invoices for {vendor}." if vendor else "No unpaid vendor invoices."
+
+    lines = [
+        f"Unpaid vendor invoices{' for ' + vendor if vendor else ''}: "
+        f"approximately {_inr(dues['total_due'])}, of which {_inr(dues['total_overdue'])} is past due."
+    ]
+    for v in dues["vendors"][:5]:
+        lines.append(
+            f"- {v['vendor_name']}: {_inr(v['total_due'])} across {v['open_invoices']} invoices "
+            f"({_inr(v['overdue'])} overdue)"
+        )
+    return "\n".join(lines)
+
+
+def _answer_overdue_collections(slots):
+    client = slots["counterparty"] if slots["counterparty"] in _entities()["clients"] else None
+    overdue = _get_overdue_collections(client)
+    if not overdue["clients"]:
+        return f"No overdue collections from {client}." if client else "No overdue client collections."
+
+    lines = [f"Overdue client collections: approximately {_inr(overdue['total_overdue'])}."]
+    for c in overdue["clients"][:5]:
+        lines.append(
+            f"- {c['client_name']}: {_inr(c['overdue_amount'])} across "
+            f"{c['overdue_invoices']} invoices (oldest due {c['oldest_due_date']})"
+        )
+    return "\n".join(lines)
+
+
+def _answer_aging(slots):
+    rng = slots["date_range"]
+    as_of = rng.end if rng else None
+    sides = [("receivables", "DSO", "dso_days"), ("payables", "DPO", "dpo_days")]
+    if slots.get("side"):
+        sides = [s for s in sides if s[0] == slots["side"]]
+
+    lines = []
+    for side, label, key in sides:
+        report = _get_receivables_aging(as_of) if side == "receivables" else _get_payables_aging(as_of)
+        b = report["buckets"]
+        days = f"{report[key]:.0f} days" if report[key] is not None else "n/a (nothing invoiced in the last 90 days)"
+        lines.append(
+            f"Open {side} as of {report['as_of']}: {_inr(b['total'])} "
+            f"(current {_inr(b['current'])}, 1-30 {_inr(b['1-30'])}, 31-60 {_inr(b['31-60'])}, "
+            f"61-90 {_inr(b['61-90'])}, 90+ {_inr(b['90+'])}). {label}: {days}."
+        )
+        for c in report["counterparties"][:3]:
+            lines.append(f"- {c['counterparty']}: {_inr(c['total'])} open, {_inr(c['overdue'])} overdue")
+    return "\n".join(lines)
+
+
+def _answer_payroll(slots):
+    rng = slots["date_range"]
+    period = rng.start[:7] if rng and rng.start[:7] == rng.end[:7] else None
+    payroll = _get_payroll_summary(period)
+    if not payroll["employees"]:
+        return f"No payroll recorded for {payroll['pay_period']}."
+    return (
+        f"Payroll for {payroll['pay_period']}: {payroll['employees']} employees, "
+        f"gross {_inr(payroll['gross'])}, net {_inr(payroll['net'])} "
+        f"({_inr(payroll['paid'])} paid)."
+    )
+
+
+def _answer_runway(slots):
+    runway = _get_cash_runway()
+    if not runway["burn_rate_per_day"]:
+        return (
+            f"No outflows in the last 30 days, so there is no measurable burn. "
+            f"Current balance is approximately {_inr(runway['balance'])}."
+        )
+    return (
+        f"At the last 30 days' burn of about {_inr(runway['burn_rate_per_day'])}/day, "
+        f"the current balance of {_inr(runway['balance'])} lasts about "
+        f"{runway['runway_days']} days."
+    )
+
+
+HANDLERS = {
+    "explain_cash_drop": _answer_explain_cash_drop,
+    "balance": _answer_balance,
+    "outflows": lambda slots: _answer_flow(slots, "outflow"),
+    "inflows": lambda slots: _answer_flow(slots, "inflow"),
+    "vendor_dues": _answer_vendor_dues,
+    "overdue_collections": _answer_overdue_collections,
+    "aging": _answer_aging,
+    "payroll": _answer_payroll,
+    "runway": _answer_runway,
+}
+
+
+def answer(routed):
+    return HANDLERS[routed.name](routed.slots)
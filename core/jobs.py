@@ -0,0 +1,501 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+import pandas as pd
+from core.db import connection
+from core.instrumentation import span
+
+# -------------------------------------------------
+# Background jobs
+# -------------------------------------------------
+# Heavy work (ingestion, rebuilds, the forecast) is queued in the jobs
+# table and run by a small pool of worker threads, so a Streamlit rerun
+# only submits a job and polls its row.
+#
+#   - priority: higher runs first, then oldest first
+#   - dedup:    submitting a job identical (kind + params) to one still
+#               pending returns the pending job instead of adding another
+#   - writers:  jobs in WRITER_KINDS run one at a time, so background
+#               jobs never fight each other for the SQLite write lock
+#   - cancel:   pending jobs are cancelled at once; running jobs stop at
+#               their next progress() call
+#
+# The queue lives in SQLite, so jobs survive a restart: jobs left
+# "running" by a process that is gone are put back to pending when the
+# scheduler starts. Workers are stamped with a per-process boot id as well
+# as the pid, because a restarted container usually gets the same pid
+# (often 1) back. JOB_WORKERS=0 disables the workers: jobs still queue,
+# but nothing runs them, so callers use run_inline() instead.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL_S = 1.0       # workers also re-check the table for jobs from other processes
+JOB_HISTORY = 500           # finished jobs kept
+BOOT_ID = uuid.uuid4().hex[:12]   # tells this process apart from an earlier one with the same pid
+FINISH_ATTEMPTS = 5         # status writes are retried, e.g. on "database is locked"
+
+PENDING, RUNNING, SUCCEEDED, FAILED, CANCELLED = "pending", "running", "succeeded", "failed", "cancelled"
+ACTIVE = (PENDING, RUNNING)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to every job function: progress reporting + cancellation."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def progress(self, fraction, message=None):
+        """Record progress (0..1); raises JobCancelled if cancel was requested.
+
+        Progress is advisory: a write that loses the lock is skipped
+        rather than failing the job.
+        """
+        with connection() as conn:
+            try:
+                with conn:
+                    conn.execute(
+                        "UPDATE jobs SET progress = ?, message = COALESCE(?, message) WHERE id = ?",
+                        (min(max(float(fraction), 0.0), 1.0), message, self.job_id)
+                    )
+            except sqlite3.OperationalError:
+                pass
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        if row and row[0]:
+            raise JobCancelled()
+
+# -------------------------------------------------
+# Job types
+# -------------------------------------------------
+def _rebuild(ctx, *modules):
+    from core.cache import bump_data_version
+    for i, module in enumerate(modules):
+        ctx.progress(i / len(modules), f"rebuilding {module.__name__.rsplit('.', 1)[-1]}")
+        with connection() as conn:
+            with conn:
+                module.rebuild(conn.cursor())
+                bump_data_version(conn)
+    return {"rebuilt": [m.__name__.rsplit(".", 1)[-1] for m in modules]}
+
+
+def _job_ingest(ctx, sources=None):
+    from core.data_loader import load_all
+    return load_all(sources, progress=ctx.progress)
+
+
+def _job_rollups(ctx):
+    from core import ledger, rollups
+    return _rebuild(ctx, rollups, ledger)
+
+
+def _job_reconciliation(ctx):
+    from core import reconciliation
+    return _rebuild(ctx, reconciliation)
+
+
+def _job_anomalies(ctx):
+    from core import anomalies
+    return _rebuild(ctx, anomalies)
+
+
+def _job_vendor_risk(ctx):
+    from core import vendor_risk
+    return {"snapshot_id": vendor_risk.refresh()}
+
+
+def _job_forecast(ctx, days=90, data_version=None):
+    # warms this process's query cache and persists the result in the job
+    # row, which is what other processes read (see latest_forecast)
+    from core.forecast import run_forecast
+    ctx.progress(0.0, f"simulating {days} days")
+    result = run_forecast(days=days)
+    return {
+        "days": days,
+        "p5_end": float(result.percentiles[5][-1]),
+        "p50_end": float(result.percentiles[50][-1]),
+        "max_shortfall_probability": float(result.prob_shortfall.max()),
+        "elapsed_ms": result.elapsed_ms,
+        "forecast": result.to_dict(),
+    }
+
+
+# kind -> (function, default priority)
+JOB_TYPES = {
+    "ingest": (_job_ingest, 100),
+    "rollups": (_job_rollups, 50),
+    "reconciliation": (_job_reconciliation, 50),
+    "anomalies": (_job_anomalies, 40),
+    "vendor_risk": (_job_vendor_risk, 30),
+    "forecast": (_job_forecast, 10),
+}
+WRITER_KINDS = ("ingest", "rollups", "reconciliation", "anomalies", "vendor_risk")
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        params TEXT NOT NULL,           -- canonical JSON
+        priority INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,                    -- JSON
+        error TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,                    -- pid:boot_id:thread that ran it
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        started_at TEXT,
+        finished_at TEXT
+    )"""
+
+JOBS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_jobs_queue ON jobs (status, priority DESC, id)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_dedup ON jobs (kind, params, status)",
+]
+
+
+def create_tables(cur):
+    cur.execute(JOBS_DDL)
+    for ddl in JOBS_INDEXES:
+        cur.execute(ddl)
+
+# -------------------------------------------------
+# Queue
+# -------------------------------------------------
+def _canonical(params):
+    return json.dumps(params or {}, sort_keys=True, default=str)
+
+
+def submit(kind, params=None, priority=None):
+    """Queue a job and return its id (an identical pending job's id if any)."""
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params = _canonical(params)
+    priority = JOB_TYPES[kind][1] if priority is None else int(priority)
+    with connection() as conn:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, priority FROM jobs WHERE kind = ? AND params = ? AND status = ? ORDER BY id LIMIT 1",
+                (kind, params, PENDING)
+            ).fetchone()
+            if row:
+                job_id = row[0]
+                if priority > row[1]:
+                    conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, job_id))
+            else:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (kind, params, priority, status) VALUES (?, ?, ?, ?)",
+                    (kind, params, priority, PENDING)
+                ).lastrowid
+    get_scheduler().wake()
+    return job_id
+
+
+def cancel(job_id):
+    """Cancel a pending job now, or ask a running one to stop.
+    Returns the job's status afterwards."""
+    with connection() as conn:
+        with conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = ?
+            """, (CANCELLED, job_id, PENDING))
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            )
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _decode(job):
+    job = dict(job)
+    job["params"] = json.loads(job["params"]) if job.get("params") else {}
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+    return job
+
+
+def get_job(job_id):
+    with connection() as conn:
+        df = pd.read_sql("SELECT * FROM jobs WHERE id = ?", conn, params=(job_id,))
+    return _decode(df.iloc[0].to_dict()) if not df.empty else None
+
+
+def list_jobs(limit=20, active_only=False):
+    """Most recent jobs first; not cached, callers poll it."""
+    with connection() as conn:
+        return pd.read_sql(f"""
+            SELECT id, kind, params, priority, status, progress, message, error,
+                   cancel_requested, created_at, started_at, finished_at
+            FROM jobs
+            {"WHERE status IN (?, ?)" if active_only else ""}
+            ORDER BY id DESC
+            LIMIT ?
+        """, conn, params=(*(ACTIVE if active_only else ()), limit))
+
+
+def latest_job(kind, params=None):
+    """Most recent job of `kind` submitted with exactly `params`, or None."""
+    with connection() as conn:
+        df = pd.read_sql(
+            "SELECT * FROM jobs WHERE kind = ? AND params = ? ORDER BY id DESC LIMIT 1",
+            conn, params=(kind, _canonical(params))
+        )
+    return _decode(df.iloc[0].to_dict()) if not df.empty else None
+
+
+def forecast_params(days=90):
+    from core.cache import get_data_version
+    return {"days": days, "data_version": get_data_version()}
+
+
+def submit_forecast(days=90):
+    """Queue a forecast of the current data."""
+    return submit("forecast", forecast_params(days))
+
+
+def latest_forecast(days=90):
+    """(job, ForecastResult or None) for the current data version.
+
+    The result is read back from the job row, so it is available to
+    every process, not only the one whose worker ran the job. No job
+    means none was submitted for this data yet; a failed job stays
+    failed until it is resubmitted.
+    """
+    from core.forecast import ForecastResult
+    job = latest_job("forecast", forecast_params(days))
+    if job and job["status"] == SUCCEEDED and job["result"]:
+        return job, ForecastResult.from_dict(job["result"]["forecast"])
+    return job, None
+
+
+def has_active_jobs():
+    with connection() as conn:
+        return conn.execute(
+            "SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1", ACTIVE
+        ).fetchone() is not None
+
+# -------------------------------------------------
+# Workers
+# -------------------------------------------------
+def _claim(worker):
+    """Atomically move the next runnable job to running."""
+    writers = ", ".join("?" for _ in WRITER_KINDS)
+    with connection() as conn:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(f"""
+                UPDATE jobs
+                SET status = ?, worker = ?, started_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = ?
+                      AND (kind NOT IN ({writers}) OR NOT EXISTS (
+                          SELECT 1 FROM jobs WHERE status = ? AND kind IN ({writers})
+                      ))
+                    ORDER BY priority DESC, id
+                    LIMIT 1
+                )
+                RETURNING id, kind, params
+            """, (RUNNING, worker, PENDING, *WRITER_KINDS, RUNNING, *WRITER_KINDS)).fetchone()
+    return row
+
+
+def _finish(job_id, status, result=None, error=None):
+    """Record a job's outcome, retrying transient write errors."""
+    for attempt in range(FINISH_ATTEMPTS):
+        try:
+            return _write_finish(job_id, status, result, error)
+        except sqlite3.OperationalError:
+            if attempt == FINISH_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def _write_finish(job_id, status, result, error):
+    with connection() as conn:
+        with conn:
+            conn.execute("""
+                UPDATE jobs
+                SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP,
+                    progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END
+                WHERE id = ?
+            """, (status, None if result is None else json.dumps(result, default=str), error, status, job_id))
+            conn.execute(f"""
+                DELETE FROM jobs
+                WHERE status NOT IN (?, ?)
+                  AND id <= (SELECT id FROM jobs ORDER BY id DESC LIMIT 1 OFFSET {JOB_HISTORY})
+            """, ACTIVE)
+
+
+def _error(e):
+    return f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=5)}"
+
+
+def run_job(job_id, kind, params):
+    fn = JOB_TYPES[kind][0]
+    ctx = JobContext(job_id)
+    try:
+        with span("job", kind):
+            result = fn(ctx, **json.loads(params))
+    except JobCancelled:
+        _finish(job_id, CANCELLED)
+    except Exception as e:
+        _finish(job_id, FAILED, error=_error(e))
+    else:
+        _finish(job_id, SUCCEEDED, result=result)
+
+
+def run_inline(kind, params=None):
+    """Run a job in the calling thread and return its id, for when there
+    are no workers to pick a queued one up. It is recorded like any other."""
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params = _canonical(params)
+    with connection() as conn:
+        with conn:
+            job_id = conn.execute("""
+                INSERT INTO jobs (kind, params, priority, status, worker, started_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (kind, params, JOB_TYPES[kind][1], RUNNING, _worker_name())).lastrowid
+    run_job(job_id, kind, params)
+    return job_id
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+def _worker_name():
+    return f"{os.getpid()}:{BOOT_ID}:{threading.current_thread().name}"
+
+
+def _is_orphan(worker):
+    """True when the process stamped in `worker` is no longer running it.
+
+    Another live process may be running the job, so only its pid is checked;
+    a stamp with our pid but another boot id is an earlier run of this one.
+    Stamps from before boot ids were added read as pid:thread.
+    """
+    if not worker:
+        return True
+    parts = worker.split(":")
+    pid, boot_id = int(parts[0]), parts[1] if len(parts) > 2 else None
+    if boot_id == BOOT_ID:
+        return False
+    return pid == os.getpid() or not _pid_alive(pid)
+
+
+def recover_orphans():
+    """Requeue jobs whose process died (or restarted) while running them."""
+    with connection() as conn:
+        with conn:
+            rows = conn.execute("SELECT id, worker FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            orphans = [job_id for job_id, worker in rows if _is_orphan(worker)]
+            conn.executemany("""
+                UPDATE jobs SET status = ?, worker = NULL, started_at = NULL, progress = 0,
+                                message = 'requeued after restart'
+                WHERE id = ?
+            """, [(PENDING, job_id) for job_id in orphans])
+    return len(orphans)
+
+
+class Scheduler:
+    """Worker threads draining the jobs table."""
+
+    def __init__(self, workers=JOB_WORKERS, poll_interval=POLL_INTERVAL_S):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._unrecorded = {}       # job id -> error, for failures not yet written
+        self._unrecorded_lock = threading.Lock()
+
+    def start(self):
+        recover_orphans()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def wake(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        self.wake()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _fail(self, job_id, error):
+        """Mark a job failed; if even that cannot be written, keep it and
+        retry from the loop. A job left running under this process's live
+        stamp would never be requeued, and a writer would block the queue."""
+        try:
+            _finish(job_id, FAILED, error=error)
+        except Exception:
+            with self._unrecorded_lock:
+                self._unrecorded[job_id] = error
+            return False
+        with self._unrecorded_lock:
+            self._unrecorded.pop(job_id, None)
+        return True
+
+    def _retry_unrecorded(self):
+        with self._unrecorded_lock:
+            pending = list(self._unrecorded.items())
+        return all([self._fail(job_id, error) for job_id, error in pending])
+
+    def _loop(self):
+        worker = _worker_name()
+        while not self._stopping:
+            if not self._retry_unrecorded():
+                job = None      # don't take on more while an outcome is unwritten
+            else:
+                try:
+                    job = _claim(worker)
+                except Exception:
+                    job = None      # e.g. the database is busy; try again next poll
+            if job is None:
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+                continue
+            try:
+                run_job(*job)
+            except Exception as e:
+                # the outcome could not be recorded (the job function's own
+                # errors are handled by run_job); the loop must survive it
+                self._fail(job[0], f"could not record the job's outcome: {_error(e)}")
+            # a finished writer may unblock another worker's writer job
+            self.wake()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler, started on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = Scheduler()
+                scheduler.start()
+                _scheduler = scheduler
+    return _scheduler
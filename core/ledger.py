@@ -0,0 +1,172 @@
+import json
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from core.cache import cached
+from core.db import connection
+
+# -------------------------------------------------
+# Per-account balance ledger
+# -------------------------------------------------
+# One row per (account, day) with the closing balance: balance_after of
+# the last row ingested for that day. Statement files list transactions
+# in posting order and upserts keep a row's rowid, so MAX(rowid) is the
+# last posting of the day - unlike ORDER BY transaction_date, which is
+# arbitrary among same-day rows.
+#
+# The table is WITHOUT ROWID, i.e. stored in (account, date) order, so an
+# as-of lookup is a single B-tree seek.
+
+LEDGER_TABLES = {
+    "account_daily_balance": """
+    CREATE TABLE IF NOT EXISTS account_daily_balance (
+        account_number TEXT NOT NULL,
+        balance_date TEXT NOT NULL,
+        closing_balance REAL NOT NULL,
+        last_transaction_id TEXT,
+        PRIMARY KEY (account_number, balance_date)
+    ) WITHOUT ROWID""",
+}
+
+LEDGER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_bank_account_date ON bank_statements (account_number, transaction_date)",
+]
+
+HOOK_COLUMNS = ["account_number", "transaction_date"]
+
+_LATEST = "9999-12-31"
+
+
+@dataclass
+class AccountBalance:
+    account_number: str
+    balance_date: str
+    balance: float
+
+
+def create_tables(cur):
+    for ddl in LEDGER_TABLES.values():
+        cur.execute(ddl)
+    for ddl in LEDGER_INDEXES:
+        cur.execute(ddl)
+
+
+def _refresh(cur, keys_json=None):
+    """Recompute closing balances for the (account, date) pairs in
+    `keys_json` ([[account, date], ...]), or for everything if None."""
+    scope = """
+        JOIN (SELECT json_extract(value, '$[0]') AS account_number,
+                     json_extract(value, '$[1]') AS transaction_date
+              FROM json_each(?)) k
+          ON b.account_number = k.account_number AND b.transaction_date = k.transaction_date
+    """ if keys_json is not None else ""
+    params = (keys_json,) if keys_json is not None else ()
+
+    if keys_json is None:
+        cur.execute("DELETE FROM account_daily_balance")
+    else:
+        cur.execute("""
+            DELETE FROM account_daily_balance
+            WHERE (account_number, balance_date) IN (
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+                FROM json_each(?)
+            )
+        """, params)
+
+    cur.execute(f"""
+        INSERT INTO account_daily_balance
+            (account_number, balance_date, closing_balance, last_transaction_id)
+        SELECT b.account_number, b.transaction_date, b.balance_after, b.transaction_id
+        FROM bank_statements b
+        JOIN (
+            SELECT b.account_number, b.transaction_date, MAX(b.rowid) AS last_rowid
+            FROM bank_statements b
+            {scope}
+            WHERE b.account_number IS NOT NULL
+              AND b.transaction_date IS NOT NULL
+              AND b.balance_after IS NOT NULL
+            GROUP BY b.account_number, b.transaction_date
+        ) l ON b.rowid = l.last_rowid
+    """, params)
+
+
+def rebuild(cur):
+    """Recompute the whole ledger (migration / repair only)."""
+    _refresh(cur)
+
+
+def apply_transactions(cur, new_rows, old_rows=None):
+    """Refresh the days touched by an ingested bank_statements chunk."""
+    frames = [new_rows[HOOK_COLUMNS]]
+    if old_rows is not None and not old_rows.empty:
+        frames.append(old_rows[HOOK_COLUMNS])
+    keys = pd.concat(frames).dropna().astype(str).drop_duplicates()
+    if not keys.empty:
+        _refresh(cur, json.dumps(keys.values.tolist()))
+
+# -------------------------------------------------
+# Point lookups (B-tree seek per account)
+# -------------------------------------------------
+@cached()
+def get_account_balances(as_of=None):
+    """Closing balance of every account on or before `as_of` (ISO date;
+    latest if None)."""
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT a.account_number, l.balance_date, l.closing_balance
+            FROM (SELECT DISTINCT account_number FROM account_daily_balance) a
+            JOIN account_daily_balance l
+              ON l.account_number = a.account_number
+             AND l.balance_date = (
+                 SELECT MAX(balance_date) FROM account_daily_balance
+                 WHERE account_number = a.account_number AND balance_date <= ?
+             )
+            ORDER BY a.account_number
+        """, (as_of or _LATEST,)).fetchall()
+    return [AccountBalance(*r) for r in rows]
+
+
+def get_balance(as_of=None, account_number=None):
+    """Balance of one account, or consolidated across accounts when
+    `account_number` is None. Assumes a single reporting currency."""
+    balances = get_account_balances(as_of)
+    if account_number is not None:
+        balances = [b for b in balances if b.account_number == account_number]
+    return float(sum(b.balance for b in balances))
+
+
+def get_accounts():
+    return [b.account_number for b in get_account_balances()]
+
+# -------------------------------------------------
+# Vectorized series (binary search over cached arrays)
+# -------------------------------------------------
+@cached()
+def _ledger_arrays():
+    with connection() as conn:
+        df = pd.read_sql("""
+            SELECT account_number, balance_date, closing_balance
+            FROM account_daily_balance
+            ORDER BY account_number, balance_date
+        """, conn)
+    return {
+        account: (
+            g["balance_date"].to_numpy(dtype="datetime64[D]"),
+            g["closing_balance"].to_numpy(np.float64),
+        )
+        for account, g in df.groupby("account_number")
+    }
+
+
+def balance_on(dates, account_number=None):
+    """Closing balance on each of `dates` (consolidated unless an account
+    is given); 0 before an account's first transaction."""
+    dates = np.asarray(pd.to_datetime(dates).to_numpy(dtype="datetime64[D]"))
+    total = np.zeros(len(dates))
+    for account, (days, closing) in _ledger_arrays().items():
+        if account_number is not None and account != account_number:
+            continue
+        idx = np.searchsorted(days, dates, side="right") - 1
+        total += np.where(idx >= 0, closing[np.maximum(idx, 0)], 0.0)
+    return total
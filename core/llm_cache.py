@@ -0,0 +1,281 @@
+import contextvars
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from langchain_core.messages import (
+    AIMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict
+)
+from core.cache import QueryCache, get_data_version
+from core.db import connection
+from core.instrumentation import observe
+
+# -------------------------------------------------
+# LLM response cache
+# -------------------------------------------------
+# Answers depend on the data the model was shown, so the key includes
+# the data version: a new ingest naturally retires every cached answer.
+
+LLM_TIMEOUT_S = 30
+LLM_MAX_RETRIES = 2
+LLM_BACKOFF_S = 0.5
+LLM_DISK_TTL_S = 7 * 24 * 3600
+
+
+class LLMUnavailableError(RuntimeError):
+    pass
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(messages):
+    parts = []
+    for m in messages:
+        content = m.content if isinstance(m.content, str) else json.dumps(m.content, sort_keys=True)
+        content = _WHITESPACE_RE.sub(" ", content).strip().casefold()
+        calls = [(c["name"], c["args"]) for c in getattr(m, "tool_calls", None) or []]
+        if calls:
+            content += " " + json.dumps(calls, sort_keys=True, default=str)
+        parts.append(f"{m.type}:{content}")
+    return "\n".join(parts)
+
+
+def cache_key(model, messages, data_version):
+    raw = f"{model}\x00{data_version}\x00{normalize_prompt(messages)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CachedLLM:
+    """Wraps a chat model with memory + SQLite response caching,
+    single-flight coalescing of identical prompts, and a timeout/retry
+    budget. Any LangChain chat model works, including the fakes in
+    langchain_core.language_models.fake_chat_models."""
+
+    def __init__(self, llm, model, timeout_s=LLM_TIMEOUT_S, max_retries=LLM_MAX_RETRIES,
+                 backoff_s=LLM_BACKOFF_S, disk_ttl_s=LLM_DISK_TTL_S, persist=True,
+                 memory=None, max_workers=4):
+        self.llm = llm
+        self.model = model
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.disk_ttl_s = disk_ttl_s
+        self.persist = persist
+        self.memory = memory or QueryCache(max_entries=512, max_bytes=32 * 1024 * 1024)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0,
+            "llm_calls": 0, "retries": 0, "timeouts": 0, "failures": 0,
+        }
+
+    def _bump(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    # ---------------- disk tier ----------------
+    def _disk_get(self, key):
+        if not self.persist:
+            return None
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT response FROM llm_responses
+                WHERE cache_key = ?
+                  AND created_at >= datetime('now', ?)
+            """, (key, f"-{int(self.disk_ttl_s)} seconds")).fetchone()
+        if row is None:
+            return None
+        try:
+            return messages_from_dict([json.loads(row[0])])[0]
+        except (ValueError, KeyError, TypeError):
+            return AIMessage(content=row[0])
+
+    def _disk_set(self, key, prompt, message, data_version):
+        if not self.persist:
+            return
+        with connection() as conn:
+            with conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO llm_responses
+                        (cache_key, model, prompt, response, data_version, created_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, (key, self.model, prompt, json.dumps(message_to_dict(message)), data_version))
+
+    def _lookup(self, key):
+        hit, message = self.memory.get(key)
+        if hit:
+            self._bump("memory_hits")
+            return message
+        message = self._disk_get(key)
+        if message is not None:
+            self._bump("disk_hits")
+            self.memory.set(key, message)
+        return message
+
+    def _store(self, key, messages, message, data_version):
+        self.memory.set(key, message)
+        self._disk_set(key, normalize_prompt(messages), message, data_version)
+
+    def _join_inflight(self, key):
+        """Return (future, is_leader) for single-flight coalescing."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                return future, True
+            self._stats["coalesced"] += 1
+            return future, False
+
+    def _leave_inflight(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    # ---------------- model call ----------------
+    def _call_with_budget(self, messages):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._bump("retries")
+                time.sleep(self.backoff_s * 2 ** (attempt - 1))
+            self._bump("llm_calls")
+            start = time.perf_counter()
+            future = self._executor.submit(
+                contextvars.copy_context().run, self.llm.invoke, messages
+            )
+            try:
+                message = future.result(timeout=self.timeout_s)
+                observe("llm", self.model, (time.perf_counter() - start) * 1000)
+                return message
+            except FutureTimeout as e:
+                # the worker thread cannot be interrupted; it finishes in the background
+                self._bump("timeouts")
+                last_error = e
+            except Exception as e:
+                last_error = e
+        self._bump("failures")
+        raise LLMUnavailableError(
+            f"LLM call failed after {self.max_retries + 1} attempts"
+        ) from last_error
+
+    def _stream_with_budget(self, messages):
+        """Yield message chunks; `timeout_s` bounds every gap between chunks.
+
+        The model streams on a worker thread (with the caller's context,
+        so LangChain callbacks still fire) and hands chunks over a queue.
+        A failure before the first chunk is retried; after it, it is not.
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._bump("retries")
+                time.sleep(self.backoff_s * 2 ** (attempt - 1))
+            self._bump("llm_calls")
+
+            chunks = queue.Queue()
+
+            def produce():
+                try:
+                    for chunk in self.llm.stream(messages):
+                        chunks.put(("chunk", chunk))
+                    chunks.put(("done", None))
+                except Exception as e:
+                    chunks.put(("error", e))
+
+            start = time.perf_counter()
+            self._executor.submit(contextvars.copy_context().run, produce)
+            started = False
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=self.timeout_s)
+                except queue.Empty:
+                    self._bump("timeouts")
+                    last_error = TimeoutError(f"No LLM output for {self.timeout_s}s")
+                    break
+                if kind == "chunk":
+                    if not started:
+                        observe("llm_first_chunk", self.model, (time.perf_counter() - start) * 1000)
+                    started = True
+                    yield value
+                elif kind == "done":
+                    observe("llm", self.model, (time.perf_counter() - start) * 1000)
+                    return
+                else:
+                    last_error = value
+                    break
+            if started:
+                break
+        self._bump("failures")
+        raise LLMUnavailableError("LLM stream failed") from last_error
+
+    def stream(self, messages):
+        """Like `invoke` but yields message chunks as they arrive.
+
+        Cached answers arrive as one complete message. Add the chunks
+        together (`a + b`) to get the final message, tool calls included.
+        """
+        data_version = get_data_version()
+        key = cache_key(self.model, messages, data_version)
+
+        message = self._lookup(key)
+        if message is not None:
+            yield message
+            return
+
+        future, leader = self._join_inflight(key)
+        if not leader:
+            yield future.result()
+            return
+
+        self._bump("misses")
+        final = None
+        try:
+            for chunk in self._stream_with_budget(messages):
+                final = chunk if final is None else final + chunk
+                yield chunk
+            message = message_chunk_to_message(final) if final is not None else AIMessage(content="")
+            self._store(key, messages, message, data_version)
+            future.set_result(message)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave_inflight(key)
+
+    def invoke(self, messages):
+        data_version = get_data_version()
+        key = cache_key(self.model, messages, data_version)
+
+        message = self._lookup(key)
+        if message is not None:
+            return message
+
+        # single flight: the first caller computes, identical callers wait on it
+        future, leader = self._join_inflight(key)
+        if not leader:
+            return future.result()
+
+        self._bump("misses")
+        try:
+            message = self._call_with_budget(messages)
+            self._store(key, messages, message, data_version)
+            future.set_result(message)
+            return message
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave_inflight(key)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "memory": self.memory.stats()}
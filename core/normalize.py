@@ -0,0 +1,206 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from core.db import connection, NATURAL_KEYS
+
+# -------------------------------------------------
+# Column types
+# -------------------------------------------------
+# Every chunk is normalized before it is upserted:
+#   dates  -> ISO YYYY-MM-DD text, so they sort and range-scan as strings
+#   months -> YYYY-MM text
+#   money  -> rounded through integer paise and stored as paise / 100
+#   enums  -> stripped, upper-cased and checked against the allowed values
+# plus a derived year_month column from the table's primary date and a
+# counterparty_key (stripped, casefolded name) that reconciliation joins on.
+# A row with a value that is present but unparseable, or a missing
+# required value, is not written: it goes to ingest_quarantine with the
+# reason, and the rest of the chunk is loaded.
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+
+SCHEMAS = {
+    "bank_statements": {
+        "dates": ["transaction_date", "value_date"],
+        "money": ["amount", "balance_after"],
+        "enums": {"transaction_type": ("CREDIT", "DEBIT")},
+        "required": ["transaction_date", "transaction_type", "amount"],
+    },
+    "vendor_invoices": {
+        "dates": ["invoice_date", "due_date"],
+        "money": ["gross_amount", "tax_amount", "net_amount"],
+        "required": ["due_date", "net_amount"],
+    },
+    "client_invoices": {
+        "dates": ["invoice_date", "due_date"],
+        "money": ["gross_amount", "tax_amount", "net_amount"],
+        "required": ["due_date", "net_amount"],
+    },
+    "payroll": {
+        "months": ["pay_period"],
+        "money": ["gross_salary", "tax_deduction", "net_salary"],
+    },
+    "expense_receipts": {
+        "dates": ["expense_date"],
+        "money": ["amount", "tax_amount"],
+        "required": ["expense_date", "amount"],
+    },
+    "cash_forecast": {
+        "dates": ["forecast_date"],
+        "money": ["expected_inflow", "expected_outflow"],
+    },
+}
+
+# table -> date column its year_month is derived from
+MONTH_SOURCES = {
+    "bank_statements": "transaction_date",
+    "vendor_invoices": "invoice_date",
+    "client_invoices": "invoice_date",
+    "expense_receipts": "expense_date",
+}
+MONTH_COLUMN = "year_month"
+
+# table -> name column its counterparty_key is derived from
+NAME_SOURCES = {
+    "bank_statements": "counterparty_name",
+    "vendor_invoices": "vendor_name",
+    "client_invoices": "client_name",
+}
+KEY_COLUMN = "counterparty_key"
+
+
+def counterparty_key(names):
+    """Stripped, casefolded names; "" where the name is missing."""
+    return names.fillna("").astype(str).str.strip().str.casefold()
+
+
+def parse_dates(values):
+    """Series of datetimes; NaT where no DATE_FORMATS entry parses."""
+    text = values.astype("string").str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        todo = parsed.isna() & text.notna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+    return parsed
+
+
+def to_paise(values):
+    """Float amounts -> nullable Int64 paise, rounded half away from zero."""
+    amounts = pd.to_numeric(values, errors="coerce").astype("float64")
+    amounts = amounts.where(np.isfinite(amounts))
+    return (np.sign(amounts) * np.floor(np.abs(amounts) * 100 + 0.5)).astype("Int64")
+
+
+def from_paise(paise):
+    return paise.astype("float64") / 100
+
+# -------------------------------------------------
+# Normalize
+# -------------------------------------------------
+def _present(values):
+    text = values.astype("string").str.strip()
+    return (text.notna() & (text != "")).fillna(False).astype(bool)
+
+
+def normalize(table, df):
+    """(clean, rejects) for one chunk of `table`.
+
+    `rejects` holds the offending rows as read, with a `reason` column.
+    """
+    schema = SCHEMAS.get(table, {})
+    key = NATURAL_KEYS[table]
+    df = df.copy()
+    reasons = pd.Series(None, index=df.index, dtype=object)
+
+    def reject(mask, reason):
+        reasons[mask & reasons.isna()] = reason
+
+    raw = df.copy()
+    reject(~_present(df[key]), f"missing {key}")
+
+    for col in schema.get("dates", []):
+        if col not in df.columns:
+            continue
+        parsed = parse_dates(df[col])
+        reject(_present(df[col]) & parsed.isna(), f"unparseable date in {col}")
+        df[col] = parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None)
+
+    for col in schema.get("months", []):
+        if col not in df.columns:
+            continue
+        parsed = parse_dates(df[col].astype("string").str.strip() + "-01")
+        reject(_present(df[col]) & parsed.isna(), f"unparseable month in {col}")
+        df[col] = parsed.dt.strftime("%Y-%m").astype(object).where(parsed.notna(), None)
+
+    for col in schema.get("money", []):
+        if col not in df.columns:
+            continue
+        paise = to_paise(df[col])
+        reject(_present(df[col]) & paise.isna(), f"non-numeric amount in {col}")
+        df[col] = from_paise(paise)
+
+    for col, allowed in schema.get("enums", {}).items():
+        if col not in df.columns:
+            continue
+        values = df[col].astype("string").str.strip().str.upper()
+        reject(_present(df[col]) & ~values.isin(allowed).fillna(False), f"unknown {col}")
+        df[col] = values.astype(object).where(values.notna(), None)
+
+    for col in schema.get("required", []):
+        missing = ~df[col].notna() if col in df.columns else pd.Series(True, index=df.index)
+        reject(missing, f"missing {col}")
+
+    if table in MONTH_SOURCES and MONTH_SOURCES[table] in df.columns:
+        df[MONTH_COLUMN] = df[MONTH_SOURCES[table]].str[:7]
+    if table in NAME_SOURCES and NAME_SOURCES[table] in df.columns:
+        df[KEY_COLUMN] = counterparty_key(df[NAME_SOURCES[table]])
+
+    bad = reasons.notna()
+    rejects = raw[bad].assign(reason=reasons[bad])
+    return df[~bad], rejects
+
+# -------------------------------------------------
+# Quarantine
+# -------------------------------------------------
+def _row_json(row):
+    return json.dumps(
+        {k: (None if pd.isna(v) else v) for k, v in row.items()},
+        default=str, sort_keys=True
+    )
+
+
+def quarantine(conn, table, source_path, rejects):
+    """Keep rejected rows for inspection; the same row is stored once."""
+    if rejects.empty:
+        return 0
+    key = NATURAL_KEYS[table]
+    rows = []
+    for row in rejects.drop(columns="reason").to_dict(orient="records"):
+        raw = _row_json(row)
+        rows.append((
+            table, source_path,
+            None if pd.isna(row.get(key)) else str(row.get(key)),
+            hashlib.sha1(raw.encode()).hexdigest(), raw,
+        ))
+    conn.executemany("""
+        INSERT OR IGNORE INTO ingest_quarantine
+            (table_name, source_path, row_key, row_hash, raw, reason)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, [r + (reason,) for r, reason in zip(rows, rejects["reason"])])
+    return len(rows)
+
+
+def get_quarantine(table=None, limit=100):
+    """Most recently quarantined rows, optionally for one table."""
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT table_name, source_path, row_key, reason, raw, quarantined_at
+            FROM ingest_quarantine
+            WHERE (? IS NULL OR table_name = ?)
+            ORDER BY id DESC
+            LIMIT ?
+        """, conn, params=(table, table, limit))
@@ -0,0 +1,482 @@
+import json
+
+import numpy as np
+import pandas as pd
+from core.cache import cached, RELATIVE_WINDOW_TTL
+from core.db import connection
+from core.normalize import counterparty_key
+
+# -------------------------------------------------
+# Bank-to-document reconciliation
+# -------------------------------------------------
+# A bank row matches an invoice when the counterparty is the same, the
+# amounts agree within tolerance and the payment falls between the
+# invoice date and GRACE_DAYS after the due date. Matching is one-to-one.
+#
+# Candidates come from a hash partition on counterparty and a binary
+# search over amount-sorted invoices, so the cost is O(n log n) rather
+# than invoices x payments.
+#
+# Maintained incrementally by core.data_loader. The greedy match of a
+# row only depends on the rows it is connected to through candidate
+# pairs, so each ingested chunk re-matches the connected rows around
+# it: the new rows, the counterparts that lost their match when a row
+# was overwritten, and whatever those share an amount / date window with,
+# found on the counterparty_key indexes. That gives the same matches as
+# rebuild() whatever order or chunking the rows arrived in, at a cost
+# that follows the chunk rather than the counterparties' history.
+
+AMOUNT_TOLERANCE_ABS = 1.0       # rupees
+AMOUNT_TOLERANCE_PCT = 0.005     # of the bank amount
+GRACE_DAYS = 60
+
+DOCUMENT_SOURCES = {
+    "vendor_invoice": {
+        "table": "vendor_invoices", "key": "invoice_id", "name": "vendor_name",
+        "status": "payment_status", "settled": ("Paid",), "transaction_type": "DEBIT",
+        "key_index": "ix_vendor_inv_counterparty_key",
+    },
+    "client_invoice": {
+        "table": "client_invoices", "key": "invoice_id", "name": "client_name",
+        "status": "collection_status", "settled": ("Collected",), "transaction_type": "CREDIT",
+        "key_index": "ix_client_inv_counterparty_key",
+    },
+}
+RECEIPT = "expense_receipt"
+
+RECONCILIATION_TABLES = {
+    "reconciliation_matches": """
+    CREATE TABLE IF NOT EXISTS reconciliation_matches (
+        document_type TEXT NOT NULL,
+        document_id TEXT NOT NULL,
+        transaction_id TEXT NOT NULL,
+        amount_diff REAL NOT NULL DEFAULT 0,
+        days_from_due INTEGER,
+        method TEXT NOT NULL,
+        matched_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (document_type, document_id)
+    )""",
+}
+
+RECONCILIATION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_recon_txn ON reconciliation_matches (transaction_id)",
+]
+
+HOOK_COLUMNS = {
+    "bank_statements": ["transaction_id"],
+    "vendor_invoices": ["invoice_id"],
+    "client_invoices": ["invoice_id"],
+    "expense_receipts": ["receipt_id"],
+}
+
+
+def _reader(cur):
+    """pandas needs the connection; migrations hand us a cursor."""
+    return getattr(cur, "connection", cur)
+
+
+def create_tables(cur):
+    for ddl in RECONCILIATION_TABLES.values():
+        cur.execute(ddl)
+    for ddl in RECONCILIATION_INDEXES:
+        cur.execute(ddl)
+
+# -------------------------------------------------
+# Matching
+# -------------------------------------------------
+def _prepare_transactions(df):
+    return pd.DataFrame({
+        "transaction_id": df["transaction_id"].astype(str),
+        "name": counterparty_key(df["counterparty_name"]),
+        "amount": pd.to_numeric(df["amount"], errors="coerce"),
+        "date": pd.to_datetime(df["transaction_date"], format="ISO8601", errors="coerce"),
+    }).dropna(subset=["amount", "date"])
+
+
+def _prepare_documents(df, source):
+    due = pd.to_datetime(df["due_date"], format="ISO8601", errors="coerce")
+    issued = pd.to_datetime(df["invoice_date"], format="ISO8601", errors="coerce")
+    return pd.DataFrame({
+        "document_id": df[source["key"]].astype(str),
+        "name": counterparty_key(df[source["name"]]),
+        "amount": pd.to_numeric(df["net_amount"], errors="coerce"),
+        "due": due,
+        "start": issued.fillna(due),
+        "end": due + pd.Timedelta(days=GRACE_DAYS),
+    }).dropna(subset=["amount", "due"])
+
+
+def _candidate_pairs(txns, docs):
+    """(txn_idx, doc_idx) pairs with the same counterparty and an amount
+    inside tolerance, via searchsorted on amount-sorted documents."""
+    t_parts, d_parts = [], []
+    doc_groups = docs.groupby("name").indices
+    for name, t_idx in txns.groupby("name").indices.items():
+        d_idx = doc_groups.get(name)
+        if d_idx is None:
+            continue
+        d_idx = d_idx[np.argsort(docs["amount"].to_numpy()[d_idx], kind="stable")]
+        d_amount = docs["amount"].to_numpy()[d_idx]
+
+        t_amount = txns["amount"].to_numpy()[t_idx]
+        tol = np.maximum(AMOUNT_TOLERANCE_ABS, AMOUNT_TOLERANCE_PCT * np.abs(t_amount))
+        lo = np.searchsorted(d_amount, t_amount - tol, side="left")
+        hi = np.searchsorted(d_amount, t_amount + tol, side="right")
+        counts = hi - lo
+        if not counts.any():
+            continue
+
+        starts = np.repeat(lo, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t_parts.append(np.repeat(t_idx, counts))
+        d_parts.append(d_idx[starts + offsets])
+
+    if not t_parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(t_parts), np.concatenate(d_parts)
+
+
+def match(txns, docs):
+    """One-to-one matches between prepared transactions and documents.
+
+    Pairs are ranked by amount difference, then distance from the due
+    date. Each round keeps the pairs that are the best remaining option
+    for both sides, which gives the same result as a greedy pass over the
+    ranked pairs without a Python loop over them.
+    """
+    empty = pd.DataFrame(columns=["transaction_id", "document_id", "amount_diff", "days_from_due"])
+    if txns.empty or docs.empty:
+        return empty
+
+    txns = txns.reset_index(drop=True)
+    docs = docs.reset_index(drop=True)
+    t_idx, d_idx = _candidate_pairs(txns, docs)
+
+    t_date = txns["date"].to_numpy()[t_idx]
+    in_window = (t_date >= docs["start"].to_numpy()[d_idx]) & (t_date <= docs["end"].to_numpy()[d_idx])
+    t_idx, d_idx = t_idx[in_window], d_idx[in_window]
+    if len(t_idx) == 0:
+        return empty
+
+    pairs = pd.DataFrame({
+        "t": t_idx,
+        "d": d_idx,
+        "amount_diff": np.abs(txns["amount"].to_numpy()[t_idx] - docs["amount"].to_numpy()[d_idx]),
+        "days_from_due": (
+            (txns["date"].to_numpy()[t_idx] - docs["due"].to_numpy()[d_idx]) // np.timedelta64(1, "D")
+        ).astype(np.int64),
+    })
+    pairs["rank_days"] = pairs["days_from_due"].abs()
+    pairs = pairs.sort_values(["amount_diff", "rank_days", "t", "d"], kind="stable")
+
+    accepted = []
+    while not pairs.empty:
+        best_t = ~pairs.duplicated("t")
+        best_d = ~pairs.duplicated("d")
+        mutual = pairs[best_t & best_d]
+        # the first remaining pair is always mutual, so every round progresses
+        accepted.append(mutual)
+        pairs = pairs[~pairs["t"].isin(mutual["t"]) & ~pairs["d"].isin(mutual["d"])]
+
+    matched = pd.concat(accepted)
+    return pd.DataFrame({
+        "transaction_id": txns["transaction_id"].to_numpy()[matched["t"].to_numpy()],
+        "document_id": docs["document_id"].to_numpy()[matched["d"].to_numpy()],
+        "amount_diff": matched["amount_diff"].to_numpy(),
+        "days_from_due": matched["days_from_due"].to_numpy(),
+    })
+
+# -------------------------------------------------
+# Persistence
+# -------------------------------------------------
+# Both sides are read in key order, so ties in match() break the same
+# way for a few connected rows as for all of them.
+def _transactions(cur, transaction_type, scoped=False):
+    scope = "JOIN _recon_txns s ON s.id = b.transaction_id" if scoped else ""
+    return pd.read_sql(f"""
+        SELECT b.transaction_id, b.counterparty_name, b.amount, b.transaction_date
+        FROM bank_statements b {scope}
+        WHERE b.transaction_type = ?
+        ORDER BY b.transaction_id
+    """, _reader(cur), params=(transaction_type,))
+
+
+def _documents(cur, document_type, scoped=False):
+    source = DOCUMENT_SOURCES[document_type]
+    scope = f"JOIN _recon_docs s ON s.id = d.{source['key']}" if scoped else ""
+    return pd.read_sql(f"""
+        SELECT d.{source["key"]}, d.{source["name"]}, d.net_amount, d.invoice_date, d.due_date
+        FROM {source["table"]} d {scope}
+        ORDER BY d.{source["key"]}
+    """, _reader(cur))
+
+
+def _save_matches(cur, document_type, matches):
+    cur.executemany("""
+        INSERT OR REPLACE INTO reconciliation_matches
+            (document_type, document_id, transaction_id, amount_diff, days_from_due, method)
+        VALUES (?, ?, ?, ?, ?, 'auto')
+    """, (
+        (document_type, d, t, float(a), int(n))
+        for t, d, a, n in matches[["transaction_id", "document_id", "amount_diff", "days_from_due"]]
+        .itertuples(index=False, name=None)
+    ))
+
+
+def _forget(cur, column, document_type, ids):
+    if ids:
+        type_filter = "document_type = ? AND" if document_type else ""
+        cur.execute(f"""
+            DELETE FROM reconciliation_matches
+            WHERE {type_filter} {column} IN (SELECT value FROM json_each(?))
+        """, ((document_type,) if document_type else ()) + (json.dumps(ids),))
+
+
+def _counterparts(cur, column, document_type, ids):
+    """(document_type, document_id, transaction_id) of the automatic
+    matches that `ids` take part in, before they are forgotten."""
+    if not ids:
+        return []
+    type_filter = "document_type = ? AND" if document_type else ""
+    return cur.execute(f"""
+        SELECT document_type, document_id, transaction_id
+        FROM reconciliation_matches
+        WHERE {type_filter} method = 'auto' AND {column} IN (SELECT value FROM json_each(?))
+    """, ((document_type,) if document_type else ()) + (json.dumps(ids),)).fetchall()
+
+
+def _link_receipts(cur, column, ids):
+    """Receipts carry the bank transaction id, so they join directly."""
+    cur.execute(f"""
+        INSERT OR REPLACE INTO reconciliation_matches
+            (document_type, document_id, transaction_id, amount_diff, method)
+        SELECT ?, e.receipt_id, b.transaction_id, ABS(b.amount - e.amount), 'linked'
+        FROM expense_receipts e
+        JOIN bank_statements b ON b.transaction_id = e.linked_transaction_id
+        WHERE e.{column} IN (SELECT value FROM json_each(?))
+    """, (RECEIPT, json.dumps(ids)))
+
+
+# A bank amount t and an invoice amount d are candidates when
+# |t - d| <= max(ABS, PCT * |t|); seen from the invoice that bounds |t - d|
+# by max(ABS, PCT * |d| / (1 - PCT)). A paisa of slack keeps float
+# rounding on the safe side: extra rows only widen the set re-matched.
+_TXN_MARGIN = f"MAX({AMOUNT_TOLERANCE_ABS}, {AMOUNT_TOLERANCE_PCT} * ABS(b.amount)) + 0.01"
+_DOC_MARGIN = (
+    f"MAX({AMOUNT_TOLERANCE_ABS}, {AMOUNT_TOLERANCE_PCT / (1 - AMOUNT_TOLERANCE_PCT)} * ABS(d.net_amount)) + 0.01"
+)
+_IN_WINDOW = (
+    f"b.transaction_date BETWEEN COALESCE(d.invoice_date, d.due_date) "
+    f"AND date(d.due_date, '+{GRACE_DAYS} days')"
+)
+
+
+def _connected(cur, document_type, transaction_ids, document_ids):
+    """Fill _recon_txns / _recon_docs with the seed rows and every row
+    reachable from them through candidate pairs, one frontier at a time.
+    The join order and indexes are pinned: frontier, its rows, then the
+    (counterparty_key, amount) range on the other side."""
+    source = DOCUMENT_SOURCES[document_type]
+    for scope in ("_recon_txns", "_recon_docs"):
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {scope} (id TEXT PRIMARY KEY, round INTEGER NOT NULL)")
+        cur.execute(f"DELETE FROM {scope}")
+    cur.execute("""
+        INSERT OR IGNORE INTO _recon_txns (id, round)
+        SELECT transaction_id, 0 FROM bank_statements
+        WHERE transaction_id IN (SELECT value FROM json_each(?)) AND transaction_type = ?
+    """, (json.dumps(transaction_ids), source["transaction_type"]))
+    cur.execute(f"""
+        INSERT OR IGNORE INTO _recon_docs (id, round)
+        SELECT {source["key"]}, 0 FROM {source["table"]}
+        WHERE {source["key"]} IN (SELECT value FROM json_each(?))
+    """, (json.dumps(document_ids),))
+
+    frontier = 0
+    while True:
+        added = cur.execute(f"""
+            INSERT OR IGNORE INTO _recon_docs (id, round)
+            SELECT d.{source["key"]}, ?
+            FROM _recon_txns s
+            CROSS JOIN bank_statements b ON b.transaction_id = s.id
+            CROSS JOIN {source["table"]} d INDEXED BY {source["key_index"]}
+              ON d.counterparty_key = b.counterparty_key
+             AND d.net_amount BETWEEN b.amount - ({_TXN_MARGIN}) AND b.amount + ({_TXN_MARGIN})
+            WHERE s.round = ? AND {_IN_WINDOW}
+        """, (frontier + 1, frontier)).rowcount
+        added += cur.execute(f"""
+            INSERT OR IGNORE INTO _recon_txns (id, round)
+            SELECT b.transaction_id, ?
+            FROM _recon_docs s
+            CROSS JOIN {source["table"]} d ON d.{source["key"]} = s.id
+            CROSS JOIN bank_statements b INDEXED BY ix_bank_counterparty_key
+              ON b.counterparty_key = d.counterparty_key
+             AND b.transaction_type = ?
+             AND b.amount BETWEEN d.net_amount - ({_DOC_MARGIN}) AND d.net_amount + ({_DOC_MARGIN})
+            WHERE s.round = ? AND {_IN_WINDOW}
+        """, (frontier + 1, source["transaction_type"], frontier)).rowcount
+        if not added:
+            return
+        frontier += 1
+
+
+def _rematch(cur, document_type, transaction_ids, document_ids):
+    """Drop and redo the automatic matches of `document_type` for the rows
+    connected to the given bank transactions and documents."""
+    transaction_ids = sorted(set(transaction_ids))
+    document_ids = sorted(set(document_ids))
+    if not transaction_ids and not document_ids:
+        return
+    _connected(cur, document_type, transaction_ids, document_ids)
+    if cur.execute("SELECT 1 FROM _recon_docs LIMIT 1").fetchone() is None:
+        return  # no document within reach, e.g. bank rows loaded before invoices
+    cur.execute("""
+        DELETE FROM reconciliation_matches
+        WHERE document_type = ? AND method = 'auto'
+          AND document_id IN (SELECT id FROM _recon_docs)
+    """, (document_type,))
+    source = DOCUMENT_SOURCES[document_type]
+    txns = _prepare_transactions(_transactions(cur, source["transaction_type"], scoped=True))
+    docs = _prepare_documents(_documents(cur, document_type, scoped=True), source)
+    _save_matches(cur, document_type, match(txns, docs))
+
+
+def apply_transactions(cur, new_rows, old_rows=None):
+    """Re-match the rows connected to a chunk of upserted bank_statements
+    rows, including invoices an overwritten row was matched to."""
+    ids = new_rows["transaction_id"].astype(str).tolist()
+    freed = []
+    if old_rows is not None and not old_rows.empty:
+        old_ids = old_rows["transaction_id"].astype(str).tolist()
+        freed = _counterparts(cur, "transaction_id", None, old_ids)
+        _forget(cur, "transaction_id", None, old_ids)
+
+    for document_type in DOCUMENT_SOURCES:
+        _rematch(cur, document_type, ids, [d for t, d, _ in freed if t == document_type])
+
+    _link_receipts(cur, "linked_transaction_id", ids)
+
+
+def _document_hook(document_type):
+    source = DOCUMENT_SOURCES[document_type]
+
+    def apply_documents(cur, new_rows, old_rows=None):
+        ids = new_rows[source["key"]].astype(str).tolist()
+        freed = []
+        if old_rows is not None and not old_rows.empty:
+            old_ids = old_rows[source["key"]].astype(str).tolist()
+            freed = [txn for _, _, txn in _counterparts(cur, "document_id", document_type, old_ids)]
+            _forget(cur, "document_id", document_type, old_ids)
+        _rematch(cur, document_type, freed, ids)
+
+    apply_documents.__name__ = f"apply_{source['table']}"
+    return apply_documents
+
+
+apply_vendor_invoices = _document_hook("vendor_invoice")
+apply_client_invoices = _document_hook("client_invoice")
+
+
+def apply_expense_receipts(cur, new_rows, old_rows=None):
+    ids = new_rows["receipt_id"].astype(str).tolist()
+    _forget(cur, "document_id", RECEIPT, ids)
+    _link_receipts(cur, "receipt_id", ids)
+
+
+def rebuild(cur):
+    """Re-match everything from scratch (migration / repair only)."""
+    cur.execute("DELETE FROM reconciliation_matches")
+    for document_type, source in DOCUMENT_SOURCES.items():
+        txns = _prepare_transactions(_transactions(cur, source["transaction_type"]))
+        docs = _prepare_documents(_documents(cur, document_type), source)
+        _save_matches(cur, document_type, match(txns, docs))
+    cur.execute("""
+        INSERT OR REPLACE INTO reconciliation_matches
+            (document_type, document_id, transaction_id, amount_diff, method)
+        SELECT ?, e.receipt_id, b.transaction_id, ABS(b.amount - e.amount), 'linked'
+        FROM expense_receipts e
+        JOIN bank_statements b ON b.transaction_id = e.linked_transaction_id
+    """, (RECEIPT,))
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+@cached()
+def get_reconciliation_summary():
+    """Matched / unmatched counts and amounts per document type."""
+    parts = []
+    with connection() as conn:
+        for document_type, source in DOCUMENT_SOURCES.items():
+            parts.append(pd.read_sql(f"""
+                SELECT ? AS document_type,
+                       COUNT(*) AS documents,
+                       COUNT(m.document_id) AS matched,
+                       COUNT(*) - COUNT(m.document_id) AS unmatched,
+                       SUM(CASE WHEN m.document_id IS NULL THEN d.net_amount ELSE 0 END)
+                           AS unmatched_amount
+                FROM {source["table"]} d
+                LEFT JOIN reconciliation_matches m
+                  ON m.document_type = ? AND m.document_id = d.{source["key"]}
+            """, conn, params=(document_type, document_type)))
+    return pd.concat(parts, ignore_index=True)
+
+
+@cached()
+def get_status_mismatches():
+    """Invoices whose recorded status disagrees with the bank: settled
+    without a matching bank row, or open although a payment matched."""
+    parts = []
+    with connection() as conn:
+        for document_type, source in DOCUMENT_SOURCES.items():
+            settled = ", ".join("?" for _ in source["settled"])
+            parts.append(pd.read_sql(f"""
+                SELECT ? AS document_type,
+                       d.{source["key"]} AS document_id,
+                       d.{source["name"]} AS counterparty,
+                       d.invoice_number, d.due_date, d.net_amount,
+                       d.{source["status"]} AS status,
+                       m.transaction_id,
+                       CASE WHEN m.document_id IS NULL
+                            THEN 'settled without bank match'
+                            ELSE 'open but bank match found' END AS issue
+                FROM {source["table"]} d
+                LEFT JOIN reconciliation_matches m
+                  ON m.document_type = ? AND m.document_id = d.{source["key"]}
+                WHERE (d.{source["status"]} IN ({settled})) = (m.document_id IS NULL)
+            """, conn, params=(document_type, document_type, *source["settled"])))
+    return pd.concat(parts, ignore_index=True)
+
+
+@cached()
+def get_unmatched_transactions(transaction_type=None):
+    """Vendor payments / client collections with no matching invoice."""
+    types = [transaction_type] if transaction_type else ["DEBIT", "CREDIT"]
+    with connection() as conn:
+        return pd.read_sql(f"""
+            SELECT b.transaction_id, b.transaction_date, b.transaction_type,
+                   b.counterparty_name, b.amount, b.category
+            FROM bank_statements b
+            WHERE b.category IN ('Vendor Payment', 'Client Collection')
+              AND b.transaction_type IN ({", ".join("?" for _ in types)})
+              AND NOT EXISTS (
+                  SELECT 1 FROM reconciliation_matches m
+                  WHERE m.transaction_id = b.transaction_id
+              )
+            ORDER BY b.transaction_date
+        """, conn, params=types)
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def get_missing_vendor_payments():
+    """Vendor invoices past due with no matching bank payment."""
+    with connection() as conn:
+        df = pd.read_sql("""
+            SELECT v.invoice_id, v.vendor_name, v.invoice_number, v.due_date,
+                   v.net_amount, v.payment_status
+            FROM vendor_invoices v
+            WHERE v.due_date < date('now')
+              AND NOT EXISTS (
+                SELECT 1 FROM reconciliation_matches m
+                WHERE m.document_type = 'vendor_invoice' AND m.document_id = v.invoice_id
+            )
+        """, conn)
+    return df
@@ -0,0 +1,274 @@
+import pandas as pd
+from core.cache import cached, RELATIVE_WINDOW_TTL
+from core.db import connection
+
+# -------------------------------------------------
+# Materialized cash rollups
+# -------------------------------------------------
+# Maintained incrementally by core.data_loader: every ingested chunk of
+# bank_statements is applied as a delta (new rows added, the previous
+# version of upserted rows subtracted), so the tables never need a full
+# rebuild after the initial backfill. Groups whose last row was replaced
+# away are deleted, and a counterparty's last_date is re-read when one of
+# its rows was replaced, so the tables stay equal to rebuild().
+
+ROLLUP_TABLES = {
+    "daily_cash_flow": """
+    CREATE TABLE IF NOT EXISTS daily_cash_flow (
+        transaction_date TEXT PRIMARY KEY,
+        inflow REAL NOT NULL DEFAULT 0,
+        outflow REAL NOT NULL DEFAULT 0,
+        net_flow REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        running_balance REAL NOT NULL DEFAULT 0
+    )""",
+    "daily_category_flow": """
+    CREATE TABLE IF NOT EXISTS daily_category_flow (
+        transaction_date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        inflow REAL NOT NULL DEFAULT 0,
+        outflow REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (transaction_date, category)
+    )""",
+    "monthly_category_flow": """
+    CREATE TABLE IF NOT EXISTS monthly_category_flow (
+        year_month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        inflow REAL NOT NULL DEFAULT 0,
+        outflow REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (year_month, category)
+    )""",
+    "counterparty_flow": """
+    CREATE TABLE IF NOT EXISTS counterparty_flow (
+        counterparty_name TEXT NOT NULL,
+        transaction_type TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        last_date TEXT,
+        PRIMARY KEY (counterparty_name, transaction_type)
+    )""",
+}
+
+ROLLUP_COLUMNS = [
+    "transaction_date", "transaction_type", "amount",
+    "category", "counterparty_name",
+]
+
+
+def create_tables(cur):
+    for ddl in ROLLUP_TABLES.values():
+        cur.execute(ddl)
+
+
+def rebuild(cur):
+    """Recompute every rollup from bank_statements (migration / repair only)."""
+    for table in ROLLUP_TABLES:
+        cur.execute(f"DELETE FROM {table}")
+
+    cur.execute("""
+        INSERT INTO daily_category_flow
+            (transaction_date, category, inflow, outflow, txn_count)
+        SELECT
+            transaction_date,
+            COALESCE(category, ''),
+            SUM(CASE WHEN transaction_type='CREDIT' THEN amount ELSE 0 END),
+            SUM(CASE WHEN transaction_type='DEBIT' THEN amount ELSE 0 END),
+            COUNT(*)
+        FROM bank_statements
+        WHERE transaction_date IS NOT NULL
+        GROUP BY transaction_date, COALESCE(category, '')
+    """)
+    cur.execute("""
+        INSERT INTO daily_cash_flow
+            (transaction_date, inflow, outflow, net_flow, txn_count)
+        SELECT transaction_date, SUM(inflow), SUM(outflow),
+               SUM(inflow) - SUM(outflow), SUM(txn_count)
+        FROM daily_category_flow
+        GROUP BY transaction_date
+    """)
+    cur.execute("""
+        INSERT INTO monthly_category_flow
+            (year_month, category, inflow, outflow, txn_count)
+        SELECT substr(transaction_date, 1, 7), category,
+               SUM(inflow), SUM(outflow), SUM(txn_count)
+        FROM daily_category_flow
+        GROUP BY substr(transaction_date, 1, 7), category
+    """)
+    cur.execute("""
+        INSERT INTO counterparty_flow
+            (counterparty_name, transaction_type, total, txn_count, last_date)
+        SELECT COALESCE(counterparty_name, ''), transaction_type,
+               SUM(amount), COUNT(*), MAX(transaction_date)
+        FROM bank_statements
+        WHERE transaction_type IS NOT NULL
+        GROUP BY COALESCE(counterparty_name, ''), transaction_type
+    """)
+    _refresh_running_balance(cur, None)
+
+# -------------------------------------------------
+# Incremental maintenance
+# -------------------------------------------------
+def _signed(df, sign):
+    df = df[ROLLUP_COLUMNS].dropna(subset=["transaction_date", "transaction_type"])
+    amount = df["amount"].fillna(0) * sign
+    is_credit = df["transaction_type"] == "CREDIT"
+    return pd.DataFrame({
+        "transaction_date": df["transaction_date"].astype(str),
+        "year_month": df["transaction_date"].astype(str).str[:7],
+        "transaction_type": df["transaction_type"],
+        "category": df["category"].fillna(""),
+        "counterparty_name": df["counterparty_name"].fillna(""),
+        "amount": amount,
+        "inflow": amount.where(is_credit, 0),
+        "outflow": amount.where(~is_credit, 0),
+        "txn_count": sign,
+    })
+
+
+def _upsert_deltas(cur, table, keys, deltas):
+    cols = keys + ["inflow", "outflow", "txn_count"]
+    cur.executemany(f"""
+        INSERT INTO {table} ({", ".join(cols)})
+        VALUES ({", ".join("?" for _ in cols)})
+        ON CONFLICT({", ".join(keys)}) DO UPDATE SET
+            inflow = inflow + excluded.inflow,
+            outflow = outflow + excluded.outflow,
+            txn_count = txn_count + excluded.txn_count
+    """, deltas[cols].itertuples(index=False, name=None))
+
+
+def _refresh_running_balance(cur, since):
+    """Recompute running_balance for dates >= `since` (all dates if None)."""
+    since = since or ""
+    row = cur.execute("""
+        SELECT running_balance FROM daily_cash_flow
+        WHERE transaction_date < ?
+        ORDER BY transaction_date DESC LIMIT 1
+    """, (since,)).fetchone()
+    opening = row[0] if row else 0.0
+
+    cur.execute("""
+        UPDATE daily_cash_flow
+        SET running_balance = w.balance
+        FROM (
+            SELECT transaction_date,
+                   ? + SUM(net_flow) OVER (ORDER BY transaction_date) AS balance
+            FROM daily_cash_flow
+            WHERE transaction_date >= ?
+        ) AS w
+        WHERE daily_cash_flow.transaction_date = w.transaction_date
+    """, (opening, since))
+
+
+def apply_transactions(cur, new_rows, old_rows=None):
+    """Fold a chunk of upserted bank_statements rows into the rollups.
+
+    `old_rows` holds the previous version of any rows the chunk
+    overwrote; they are subtracted so re-ingesting is idempotent.
+    """
+    removed = _signed(old_rows, -1) if old_rows is not None and not old_rows.empty else None
+    delta = pd.concat([_signed(new_rows, 1), removed], ignore_index=True)
+    if delta.empty:
+        return
+
+    sums = ["inflow", "outflow", "txn_count"]
+    daily_cat = delta.groupby(
+        ["transaction_date", "category"], as_index=False
+    )[sums].sum()
+    _upsert_deltas(cur, "daily_category_flow", ["transaction_date", "category"], daily_cat)
+
+    monthly_cat = delta.groupby(
+        ["year_month", "category"], as_index=False
+    )[sums].sum()
+    _upsert_deltas(cur, "monthly_category_flow", ["year_month", "category"], monthly_cat)
+
+    daily = delta.groupby("transaction_date", as_index=False)[sums].sum()
+    cur.executemany("""
+        INSERT INTO daily_cash_flow
+            (transaction_date, inflow, outflow, net_flow, txn_count)
+        VALUES (?, ?, ?, ? - ?, ?)
+        ON CONFLICT(transaction_date) DO UPDATE SET
+            inflow = inflow + excluded.inflow,
+            outflow = outflow + excluded.outflow,
+            net_flow = net_flow + excluded.net_flow,
+            txn_count = txn_count + excluded.txn_count
+    """, (
+        (d, i, o, i, o, n)
+        for d, i, o, n in daily[["transaction_date"] + sums].itertuples(index=False, name=None)
+    ))
+
+    party = delta.groupby(
+        ["counterparty_name", "transaction_type"], as_index=False
+    ).agg(total=("amount", "sum"), txn_count=("txn_count", "sum"),
+          last_date=("transaction_date", "max"))
+    cur.executemany("""
+        INSERT INTO counterparty_flow
+            (counterparty_name, transaction_type, total, txn_count, last_date)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(counterparty_name, transaction_type) DO UPDATE SET
+            total = total + excluded.total,
+            txn_count = txn_count + excluded.txn_count,
+            last_date = MAX(COALESCE(last_date, ''), excluded.last_date)
+    """, party[["counterparty_name", "transaction_type", "total", "txn_count", "last_date"]]
+        .itertuples(index=False, name=None))
+
+    if removed is not None:
+        _drop_replaced(cur, daily_cat, monthly_cat, daily, party, removed)
+
+    _refresh_running_balance(cur, daily["transaction_date"].min())
+
+
+def _drop_replaced(cur, daily_cat, monthly_cat, daily, party, removed):
+    """Delete groups left with no rows and re-read last_date for the
+    counterparties that lost a row; MAX() cannot go back down on its own."""
+    for table, keys, groups in (
+        ("daily_category_flow", ["transaction_date", "category"], daily_cat),
+        ("monthly_category_flow", ["year_month", "category"], monthly_cat),
+        ("daily_cash_flow", ["transaction_date"], daily),
+        ("counterparty_flow", ["counterparty_name", "transaction_type"], party),
+    ):
+        cur.executemany(f"""
+            DELETE FROM {table}
+            WHERE {" AND ".join(f"{k} = ?" for k in keys)} AND txn_count = 0
+        """, groups[keys].itertuples(index=False, name=None))
+
+    cur.executemany("""
+        UPDATE counterparty_flow
+        SET last_date = (
+            SELECT MAX(b.transaction_date) FROM bank_statements b
+            WHERE b.transaction_type = counterparty_flow.transaction_type
+              AND (b.counterparty_name = counterparty_flow.counterparty_name
+                   OR (counterparty_flow.counterparty_name = '' AND b.counterparty_name IS NULL))
+        )
+        WHERE counterparty_name = ? AND transaction_type = ?
+    """, removed[["counterparty_name", "transaction_type"]].drop_duplicates()
+        .itertuples(index=False, name=None))
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+@cached()
+def get_daily_cash_flow():
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT transaction_date, inflow, outflow, net_flow,
+                   running_balance AS balance
+            FROM daily_cash_flow
+            ORDER BY transaction_date
+        """, conn)
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def get_top_categories_since(modifier="-30 day", limit=5):
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT category, SUM(outflow) AS total_spent
+            FROM daily_category_flow
+            WHERE transaction_date >= date('now', ?)
+              AND outflow > 0
+            GROUP BY category
+            ORDER BY total_spent DESC
+            LIMIT ?
+        """, conn, params=(modifier, limit))
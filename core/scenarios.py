@@ -0,0 +1,192 @@
+import itertools
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from core import ledger
+from core.cache import cached
+from core.db import connection
+
+# -------------------------------------------------
+# What-if scenario engine
+# -------------------------------------------------
+# A scenario scales each category's daily flows by (1 + pct / 100) and can
+# push client collections back by N days. The projected balance is linear
+# in those multipliers, so with per-category cumulative flows G[c, t]
+#
+#     balance[s, t] = opening + sum_c m[s, c] * G[c, t - delay_c[s]]
+#
+# and a whole grid of scenarios is a handful of array ops, chunked to keep
+# memory bounded.
+
+CATEGORIES = ("Salary", "Vendor Payment", "Rent", "Operating Expense", "Client Collection")
+DELAY = "collection_delay_days"
+DELAYED_CATEGORY = "Client Collection"
+DRIVERS = CATEGORIES + (DELAY,)
+
+BASELINE_WINDOW_DAYS = 90
+HORIZON_DAYS = 365
+CHUNK_SCENARIOS = 4096
+
+
+@dataclass
+class ScenarioBaseline:
+    start_date: pd.Timestamp
+    window: tuple                 # (first, last) ISO date of the history used
+    opening_balance: float
+    categories: tuple             # CATEGORIES + ("Other",)
+    cumulative: np.ndarray        # (categories x horizon) cumulative signed flow
+    outflow_30d: np.ndarray       # (categories,) outflow over the first 30 days
+
+
+@dataclass
+class ScenarioResults:
+    runway_days: np.ndarray       # first day the balance goes negative, else horizon
+    min_balance: np.ndarray
+    end_balance: np.ndarray
+    outflow_30d: np.ndarray
+    horizon_days: int
+
+
+@cached()
+def load_baseline(window_days=BASELINE_WINDOW_DAYS, horizon_days=HORIZON_DAYS):
+    """Category flows of the last `window_days` of history, repeated
+    over the horizon. The window ends at the latest transaction rather
+    than today so a stale dataset still has a baseline."""
+    with connection() as conn:
+        last = conn.execute("""
+            SELECT transaction_date, running_balance FROM daily_cash_flow
+            ORDER BY transaction_date DESC LIMIT 1
+        """).fetchone()
+        if last is None:
+            end = pd.Timestamp.now(tz="UTC").tz_localize(None).normalize()
+            flows = pd.DataFrame(columns=["transaction_date", "category", "inflow", "outflow"])
+        else:
+            end = pd.Timestamp(last[0])
+            flows = pd.read_sql("""
+                SELECT transaction_date, category, inflow, outflow
+                FROM daily_category_flow
+                WHERE transaction_date > ?
+            """, conn, params=((end - pd.Timedelta(days=window_days)).date().isoformat(),))
+
+    categories = CATEGORIES + ("Other",)
+    flows["category"] = flows["category"].where(flows["category"].isin(CATEGORIES), "Other")
+    dates = pd.date_range(end - pd.Timedelta(days=window_days - 1), end).strftime("%Y-%m-%d")
+
+    def matrix(column):
+        return (
+            flows.pivot_table(index="category", columns="transaction_date",
+                              values=column, aggfunc="sum")
+            .reindex(index=list(categories), columns=dates)
+            .fillna(0.0)
+            .to_numpy(np.float64)
+        )
+
+    inflow, outflow = matrix("inflow"), matrix("outflow")
+    tiled = np.arange(horizon_days) % window_days
+    signed = (inflow - outflow)[:, tiled]
+
+    return ScenarioBaseline(
+        start_date=end + pd.Timedelta(days=1),
+        window=(dates[0], dates[-1]),
+        opening_balance=ledger.get_balance(),
+        categories=categories,
+        cumulative=np.cumsum(signed, axis=1),
+        outflow_30d=outflow[:, tiled[:30]].sum(axis=1),
+    )
+
+
+def _evaluate_chunk(baseline, multipliers, delays):
+    horizon = baseline.cumulative.shape[1]
+    delayed = baseline.categories.index(DELAYED_CATEGORY)
+    others = [i for i in range(len(baseline.categories)) if i != delayed]
+
+    balance = baseline.opening_balance + multipliers[:, others] @ baseline.cumulative[others]
+
+    shifted = np.arange(horizon)[None, :] - delays[:, None]
+    collected = np.where(shifted >= 0, baseline.cumulative[delayed][np.maximum(shifted, 0)], 0.0)
+    balance += multipliers[:, [delayed]] * collected
+
+    negative = balance < 0
+    runway = np.where(negative.any(axis=1), negative.argmax(axis=1), horizon)
+    return runway, balance.min(axis=1), balance[:, -1]
+
+
+def evaluate(baseline, adjustments, delays=None):
+    """Evaluate a batch of scenarios.
+
+    `adjustments` maps category -> array of % changes (one per scenario);
+    missing categories stay at 0%. `delays` holds collection delays in days.
+    """
+    size = max((len(np.atleast_1d(v)) for v in adjustments.values()), default=1)
+    if delays is not None:
+        size = max(size, len(np.atleast_1d(delays)))
+
+    multipliers = np.ones((size, len(baseline.categories)))
+    for category, pct in adjustments.items():
+        multipliers[:, baseline.categories.index(category)] = 1 + np.asarray(pct, np.float64) / 100
+    delays = np.broadcast_to(np.asarray(0 if delays is None else delays, np.int64), (size,))
+
+    runway, min_balance, end_balance = (np.empty(size, dtype) for dtype in (np.int64, np.float64, np.float64))
+    for lo in range(0, size, CHUNK_SCENARIOS):
+        hi = lo + CHUNK_SCENARIOS
+        runway[lo:hi], min_balance[lo:hi], end_balance[lo:hi] = _evaluate_chunk(
+            baseline, multipliers[lo:hi], delays[lo:hi]
+        )
+
+    return ScenarioResults(
+        runway_days=runway,
+        min_balance=min_balance,
+        end_balance=end_balance,
+        outflow_30d=multipliers @ baseline.outflow_30d,
+        horizon_days=baseline.cumulative.shape[1],
+    )
+
+
+def evaluate_grid(baseline, axes, fixed=None):
+    """Evaluate every combination of `axes` (driver -> values) in one batch.
+
+    Drivers are categories (% change) or DELAY (days). `fixed` pins the
+    other drivers. Returns a DataFrame with one row per combination.
+    """
+    fixed = dict(fixed or {})
+    names = list(axes)
+    combos = np.array(list(itertools.product(*(axes[n] for n in names))), dtype=np.float64)
+
+    values = {**{k: np.full(len(combos), v, np.float64) for k, v in fixed.items()},
+              **{n: combos[:, i] for i, n in enumerate(names)}}
+    delays = values.pop(DELAY, None)
+    results = evaluate(baseline, values, None if delays is None else delays.astype(np.int64))
+
+    grid = pd.DataFrame(combos, columns=names)
+    grid["runway_days"] = results.runway_days
+    grid["min_balance"] = results.min_balance
+    grid["end_balance"] = results.end_balance
+    grid["outflow_30d"] = results.outflow_30d
+    return grid
+
+
+def tornado(baseline, ranges, fixed=None, metric="end_balance"):
+    """Swing in `metric` when each driver moves alone to its low and high
+    value (others held at `fixed`); all 2 * len(ranges) + 1 runs in one batch."""
+    fixed = dict(fixed or {})
+    drivers = list(ranges)
+    runs = [dict(fixed)]
+    for d in drivers:
+        runs += [{**fixed, d: ranges[d][0]}, {**fixed, d: ranges[d][1]}]
+
+    keys = set(fixed) | set(drivers)
+    values = {k: np.array([r.get(k, 0) for r in runs], np.float64) for k in keys}
+    delays = values.pop(DELAY, None)
+    results = evaluate(baseline, values, None if delays is None else delays.astype(np.int64))
+    out = getattr(results, metric)
+
+    df = pd.DataFrame({
+        "driver": drivers,
+        "low": [ranges[d][0] for d in drivers],
+        "high": [ranges[d][1] for d in drivers],
+        "at_low": out[1::2] - out[0],
+        "at_high": out[2::2] - out[0],
+    })
+    df["swing"] = (df["at_high"] - df["at_low"]).abs()
+    return df.sort_values("swing").reset_index(drop=True)
@@ -0,0 +1,294 @@
+import operator
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+
+import pandas as pd
+from core.db import connection, DB_PATH, NATURAL_KEYS
+
+# -------------------------------------------------
+# Pluggable scan backends
+# -------------------------------------------------
+# Full-history reads of the raw tables go through `get_store().scan(...)`.
+# SQLiteStore runs a parameterized SELECT; ParquetStore reads a copy of
+# the same tables written as month-partitioned Parquet, so a scan touches
+# only the columns it asks for and the months its date range overlaps.
+#
+# STORAGE_BACKEND=parquet switches reads over (SQLite stays the system of
+# record); COLUMNAR_MIRROR=1 keeps the Parquet copy current on ingest
+# without switching reads. pyarrow is only needed for the Parquet side.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+COLUMNAR_MIRROR = os.getenv("COLUMNAR_MIRROR", "") not in ("", "0", "false")
+COLUMNAR_ROOT = os.getenv(
+    "COLUMNAR_ROOT",
+    os.path.join(os.path.dirname(os.path.abspath(DB_PATH)) if DB_PATH else os.getcwd(), "columnar")
+)
+
+# table -> date column used for partitioning and date_range pruning
+PARTITION_DATES = {
+    "bank_statements": "transaction_date",
+    "vendor_invoices": "invoice_date",
+    "client_invoices": "invoice_date",
+}
+PARTITION_COLUMN = "year_month"
+
+FILTER_OPS = ("=", "!=", "<", "<=", ">", ">=", "in")
+_COMPARE = {
+    "=": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+def columnar_enabled():
+    return STORAGE_BACKEND == "parquet" or COLUMNAR_MIRROR
+
+
+def _check_filters(filters):
+    for column, op, _ in filters:
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown operator: {op}")
+
+
+class TransactionStore(ABC):
+    """scan(table, columns, filters, date_range) -> DataFrame.
+
+    `filters` is a sequence of (column, op, value) with op in FILTER_OPS;
+    `date_range` is an inclusive (start, end) pair of ISO dates on the
+    table's PARTITION_DATES column.
+    """
+    name = "base"
+
+    @abstractmethod
+    def scan(self, table, columns=None, filters=(), date_range=None):
+        ...
+
+
+class SQLiteStore(TransactionStore):
+    name = "sqlite"
+
+    def _columns(self, conn, table):
+        return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+    def scan(self, table, columns=None, filters=(), date_range=None):
+        if table not in PARTITION_DATES:
+            raise ValueError(f"Unknown table: {table}")
+        _check_filters(filters)
+        with connection() as conn:
+            known = self._columns(conn, table)
+            columns = list(columns or known)
+            for c in columns + [f[0] for f in filters]:
+                if c not in known:
+                    raise ValueError(f"Unknown column: {c}")
+
+            where, params = [], []
+            for column, op, value in filters:
+                if op == "in":
+                    values = list(value)
+                    where.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                    params += values
+                else:
+                    where.append(f"{column} {op} ?")
+                    params.append(value)
+            if date_range:
+                where.append(f"{PARTITION_DATES[table]} BETWEEN ? AND ?")
+                params += list(date_range)
+
+            return pd.read_sql(
+                f"SELECT {', '.join(columns)} FROM {table}"
+                + (f" WHERE {' AND '.join(where)}" if where else ""),
+                conn, params=params
+            )
+
+
+class ParquetStore(TransactionStore):
+    name = "parquet"
+
+    def __init__(self, root=COLUMNAR_ROOT):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(
+                "The parquet storage backend needs pyarrow (pip install pyarrow)"
+            ) from e
+        self.root = root
+        self._lock = threading.Lock()
+
+    # ---------------- layout ----------------
+    def _table_dir(self, table):
+        return os.path.join(self.root, table)
+
+    def _partition_file(self, table, year_month):
+        return os.path.join(
+            self._table_dir(table), f"{PARTITION_COLUMN}={year_month}", "part-0.parquet"
+        )
+
+    def exists(self, table):
+        return os.path.isdir(self._table_dir(table))
+
+    def _schema(self, table):
+        import pyarrow as pa
+        types = {"REAL": pa.float64(), "INTEGER": pa.int64()}
+        with connection() as conn:
+            cols = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        # year_month is carried by the partition directory, not the files
+        return pa.schema([
+            (c[1], types.get(c[2].upper(), pa.string())) for c in cols if c[1] != PARTITION_COLUMN
+        ])
+
+    @staticmethod
+    def _year_month(dates):
+        parsed = pd.to_datetime(dates, format="ISO8601", errors="coerce")
+        return parsed.dt.strftime("%Y-%m").fillna("unknown")
+
+    # ---------------- writes ----------------
+    def _write_partition(self, table, year_month, df, schema):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        path = self._partition_file(table, year_month)
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = pa.Table.from_pandas(
+            df[schema.names].astype({
+                f.name: "float64" for f in schema if pa.types.is_floating(f.type)
+            }),
+            schema=schema, preserve_index=False
+        )
+        tmp = path + ".tmp"
+        pq.write_table(data, tmp)
+        os.replace(tmp, path)
+
+    def upsert(self, table, new_rows, old_rows=None):
+        """Merge rows into their month partitions, replacing by natural key.
+
+        Only the partitions the rows (and their previous versions) fall
+        in are rewritten.
+        """
+        import pyarrow.parquet as pq
+        key = NATURAL_KEYS[table]
+        date_col = PARTITION_DATES[table]
+        schema = self._schema(table)
+
+        new_rows = new_rows.reindex(columns=schema.names).copy()
+        new_rows[key] = new_rows[key].astype(str)
+        for f in schema:
+            if str(f.type) == "string":
+                new_rows[f.name] = new_rows[f.name].map(lambda v: None if pd.isna(v) else str(v))
+        months = self._year_month(new_rows[date_col])
+
+        touched = set(months)
+        if old_rows is not None and not old_rows.empty:
+            touched |= set(self._year_month(old_rows[date_col]))
+        keys = set(new_rows[key])
+
+        with self._lock:
+            for month in touched:
+                path = self._partition_file(table, month)
+                merged = new_rows[months == month]
+                if os.path.exists(path):
+                    existing = pq.read_table(path).to_pandas()
+                    existing = existing[~existing[key].isin(keys)]
+                    if not existing.empty:
+                        merged = pd.concat([existing, merged], ignore_index=True)
+                self._write_partition(table, month, merged, schema)
+
+    def export_from_sqlite(self, table):
+        """(Re)write the whole table from SQLite."""
+        with connection() as conn:
+            df = pd.read_sql(f"SELECT * FROM {table}", conn)
+        with self._lock:
+            shutil.rmtree(self._table_dir(table), ignore_errors=True)
+        self.upsert(table, df)
+
+    # ---------------- reads ----------------
+    def scan(self, table, columns=None, filters=(), date_range=None):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        if table not in PARTITION_DATES:
+            raise ValueError(f"Unknown table: {table}")
+        _check_filters(filters)
+
+        schema = self._schema(table)
+        columns = list(columns or schema.names)
+        if not self.exists(table):
+            return pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+
+        dataset = ds.dataset(
+            self._table_dir(table), format="parquet", partitioning="hive",
+            schema=schema.append(pa.field(PARTITION_COLUMN, pa.string()))
+        )
+        predicates = [
+            pc.field(column).isin(list(value)) if op == "in"
+            else _COMPARE[op](pc.field(column), value)
+            for column, op, value in filters
+        ]
+        if date_range:
+            start, end = date_range
+            date_field = pc.field(PARTITION_DATES[table])
+            # the year_month bounds prune whole partitions before any file is opened
+            predicates += [
+                pc.field(PARTITION_COLUMN) >= start[:7], pc.field(PARTITION_COLUMN) <= end[:7],
+                date_field >= start, date_field <= end,
+            ]
+        expr = None
+        for p in predicates:
+            expr = p if expr is None else expr & p
+
+        return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store for STORAGE_BACKEND, created on first use. The
+    Parquet copy is exported from SQLite the first time it is needed."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STORAGE_BACKEND == "parquet":
+                store = ParquetStore()
+                for table in PARTITION_DATES:
+                    if not store.exists(table):
+                        store.export_from_sqlite(table)
+                _store = store
+            else:
+                _store = SQLiteStore()
+        return _store
+
+
+_mirror = None
+
+
+def _columnar_store():
+    """The Parquet store ingestion writes to, even while reads use SQLite."""
+    global _mirror
+    store = get_store()
+    if isinstance(store, ParquetStore):
+        return store
+    with _store_lock:
+        if _mirror is None:
+            _mirror = ParquetStore()
+        return _mirror
+
+
+def columnar_hook(table):
+    """Commit hook mirroring upserted rows into the Parquet copy."""
+    def mirror(conn, new_rows, old_rows=None):
+        _columnar_store().upsert(table, new_rows, old_rows)
+
+    mirror.__name__ = f"mirror_{table}"
+    return mirror
+
+
+def export_all():
+    store = _columnar_store()
+    for table in PARTITION_DATES:
+        store.export_from_sqlite(table)
+    return store.root
@@ -1,61 +1,283 @@
 import pandas as pd
-from core.db import get_conn
+from core.db import connection
+from core import aging, ledger, rollups, storage
+from core.cache import cached, RELATIVE_WINDOW_TTL
+from core.dashboard import get_dashboard_metrics
 from langchain.tools import tool
 
 # =================================================
 # PURE PYTHON FUNCTIONS (CALLABLE)
 # =================================================
 
-def _get_current_cash_balance():
-    conn = get_conn()
-    df = pd.read_sql("""
-        SELECT balance_after
-        FROM bank_statements
-        ORDER BY transaction_date DESC
-        LIMIT 1
-    """, conn)
-    conn.close()
+def _get_current_cash_balance(account_number=None):
+    return {
+        "currency": "INR",
+        "balance": ledger.get_balance(account_number=account_number),
+    }
 
-    if df.empty:
-        return {"currency": "INR", "balance": 0.0}
 
+def _get_cash_balance_as_of(date, account_number=None):
     return {
         "currency": "INR",
-        "balance": float(df.iloc[0]["balance_after"])
+        "as_of": date,
+        "balance": ledger.get_balance(as_of=date, account_number=account_number),
+        "accounts": [
+            {"account_number": b.account_number, "balance_date": b.balance_date, "balance": b.balance}
+            for b in ledger.get_account_balances(date)
+            if account_number is None or b.account_number == account_number
+        ],
     }
 
 
+@cached(ttl=RELATIVE_WINDOW_TTL)
 def _get_top_cash_outflows_last_30_days():
-    conn = get_conn()
-    df = pd.read_sql("""
-        SELECT
-            category,
-            SUM(amount) AS total_spent
-        FROM bank_statements
-        WHERE transaction_type = 'DEBIT'
-          AND transaction_date >= date('now', '-30 day')
-        GROUP BY category
-        ORDER BY total_spent DESC
-        LIMIT 5
-    """, conn)
-    conn.close()
+    df = rollups.get_top_categories_since("-30 day", limit=5)
 
     return {
         "currency": "INR",
         "outflows": df.to_dict(orient="records")
     }
 
+@cached()
+def _get_flow_summary(start_date, end_date, category=None, counterparty=None):
+    """Inflow/outflow between two ISO dates (inclusive), per category."""
+    if counterparty:
+        filters = [("counterparty_name", "=", counterparty)]
+        if category:
+            filters.append(("category", "=", category))
+        rows = storage.get_store().scan(
+            "bank_statements", ["category", "transaction_type", "amount"],
+            filters, date_range=(start_date, end_date)
+        )
+        df = (
+            rows.assign(
+                inflow=rows["amount"].where(rows["transaction_type"] == "CREDIT", 0.0),
+                outflow=rows["amount"].where(rows["transaction_type"] == "DEBIT", 0.0),
+            )
+            .groupby("category", as_index=False)[["inflow", "outflow"]].sum()
+            .sort_values("outflow", ascending=False)
+        )
+    else:
+        with connection() as conn:
+            df = pd.read_sql("""
+                SELECT category, SUM(inflow) AS inflow, SUM(outflow) AS outflow
+                FROM daily_category_flow
+                WHERE transaction_date BETWEEN ? AND ?
+                  AND (? IS NULL OR category = ?)
+                GROUP BY category
+                ORDER BY outflow DESC
+            """, conn, params=(start_date, end_date, category, category))
+
+    return {
+        "currency": "INR",
+        "start_date": start_date,
+        "end_date": end_date,
+        "category": category,
+        "counterparty": counterparty,
+        "inflow": float(df["inflow"].sum()),
+        "outflow": float(df["outflow"].sum()),
+        "by_category": df.to_dict(orient="records")
+    }
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def _get_vendor_dues(vendor=None):
+    """Open (not Paid) vendor invoices per vendor, with the overdue part
+    and the part a bank payment already matched (see core.aging)."""
+    with connection() as conn:
+        by_vendor = pd.read_sql("""
+            SELECT
+                v.vendor_name,
+                COUNT(*) AS open_invoices,
+                SUM(v.net_amount) AS total_due,
+                TOTAL(CASE WHEN v.due_date < date('now') THEN v.net_amount END) AS overdue,
+                TOTAL(CASE WHEN m.document_id IS NOT NULL THEN v.net_amount END) AS paid_per_bank
+            FROM vendor_invoices v
+            LEFT JOIN reconciliation_matches m
+              ON m.document_type = 'vendor_invoice' AND m.document_id = v.invoice_id
+            WHERE v.payment_status != 'Paid'
+              AND (? IS NULL OR v.vendor_name = ?)
+            GROUP BY v.vendor_name
+            ORDER BY total_due DESC
+        """, conn, params=(vendor, vendor))
+
+    return {
+        "currency": "INR",
+        "total_due": float(by_vendor["total_due"].sum()),
+        "total_overdue": float(by_vendor["overdue"].sum()),
+        # status still Unpaid but a matching bank payment exists: a status
+        # mismatch, and why payables aging reports less open
+        "total_paid_per_bank": float(by_vendor["paid_per_bank"].sum()),
+        "vendors": by_vendor.to_dict(orient="records")
+    }
+
+
+@cached(ttl=RELATIVE_WINDOW_TTL)
+def _get_overdue_collections(client=None):
+    """Uncollected client invoices past their due date, per client."""
+    with connection() as conn:
+        df = pd.read_sql("""
+            SELECT
+                client_name,
+                COUNT(*) AS overdue_invoices,
+                SUM(net_amount) AS overdue_amount,
+                MIN(due_date) AS oldest_due_date
+            FROM client_invoices
+            WHERE collection_status != 'Collected'
+              AND due_date < date('now')
+              AND (? IS NULL OR client_name = ?)
+            GROUP BY client_name
+            ORDER BY overdue_amount DESC
+        """, conn, params=(client, client))
+
+    return {
+        "currency": "INR",
+        "total_overdue": float(df["overdue_amount"].sum()),
+        "clients": df.to_dict(orient="records")
+    }
+
+
+@cached()
+def _get_payroll_summary(pay_period=None):
+    """Payroll totals for a YYYY-MM pay period (latest period if None)."""
+    with connection() as conn:
+        if pay_period is None:
+            row = conn.execute("SELECT MAX(pay_period) FROM payroll").fetchone()
+            pay_period = row[0]
+        df = pd.read_sql("""
+            SELECT
+                COUNT(*) AS employees,
+                SUM(gross_salary) AS gross,
+                SUM(net_salary) AS net,
+                SUM(CASE WHEN payment_status = 'Paid' THEN net_salary ELSE 0 END) AS paid
+            FROM payroll
+            WHERE pay_period = ?
+        """, conn, params=(pay_period,))
+
+    row = df.iloc[0]
+    return {
+        "currency": "INR",
+        "pay_period": pay_period,
+        "employees": int(row["employees"] or 0),
+        "gross": float(row["gross"] or 0),
+        "net": float(row["net"] or 0),
+        "paid": float(row["paid"] or 0)
+    }
+
+
+def _get_cash_runway():
+    metrics = get_dashboard_metrics()
+    return {
+        "currency": "INR",
+        "balance": metrics.current_balance,
+        "burn_rate_per_day": metrics.burn_rate,
+        "runway_days": metrics.runway_days
+    }
+
+
+def _aging_summary(side, as_of=None, counterparty=None):
+    report = aging.get_aging(side, as_of)
+    rows = report.by_counterparty
+    if counterparty:
+        rows = rows[rows["counterparty"] == counterparty]
+    curve = report.curve.set_index("days_ahead")["expected_settled"]
+    return {
+        "currency": "INR",
+        "as_of": report.as_of,
+        "buckets": report.totals,
+        aging.SIDES[side]["turnover"] + "_days": report.turnover_days,
+        "expected_settled_within": {f"{d}_days": float(curve.get(d, 0.0)) for d in (30, 60, 90)},
+        # marked open but paid per the bank, so not in the buckets
+        "status_mismatch": report.status_mismatch,
+        "counterparties": rows.head(20).to_dict(orient="records"),
+    }
+
+
+def _get_receivables_aging(as_of=None, client=None):
+    """Open client invoices by days past due, DSO and expected collections."""
+    return _aging_summary("receivables", as_of, client)
+
+
+def _get_payables_aging(as_of=None, vendor=None):
+    """Open vendor invoices by days past due, DPO and expected payments."""
+    return _aging_summary("payables", as_of, vendor)
+
 # =================================================
 # TOOL WRAPPERS (FOR LLM ONLY)
 # =================================================
 
 @tool
-def get_current_cash_balance():
-    """Returns current cash balance in INR."""
-    return _get_current_cash_balance()
+def get_current_cash_balance(account_number: str = None):
+    """Returns current cash balance in INR, consolidated across accounts unless an account_number is given."""
+    return _get_current_cash_balance(account_number)
+
+
+@tool
+def get_cash_balance_as_of(date: str, account_number: str = None):
+    """Returns the closing cash balance in INR on a YYYY-MM-DD date, per account and consolidated."""
+    return _get_cash_balance_as_of(date, account_number)
 
 
 @tool
 def get_top_cash_outflows_last_30_days():
     """Returns top spending categories in last 30 days."""
     return _get_top_cash_outflows_last_30_days()
+
+
+@tool
+def get_flow_summary(start_date: str, end_date: str, category: str = None, counterparty: str = None):
+    """Returns inflow and outflow in INR between two YYYY-MM-DD dates, per category, optionally for one category or counterparty."""
+    return _get_flow_summary(start_date, end_date, category, counterparty)
+
+
+@tool
+def get_vendor_dues(vendor: str = None):
+    """Returns unpaid vendor invoice totals per vendor, including the overdue amount."""
+    return _get_vendor_dues(vendor)
+
+
+@tool
+def get_overdue_collections(client: str = None):
+    """Returns overdue, uncollected client invoice totals per client."""
+    return _get_overdue_collections(client)
+
+
+@tool
+def get_receivables_aging(as_of: str = None, client: str = None):
+    """Returns open client invoices in INR bucketed current/1-30/31-60/61-90/90+ days past due as of a YYYY-MM-DD date (today if omitted), per client, with DSO and expected collections over the next 30/60/90 days."""
+    return _get_receivables_aging(as_of, client)
+
+
+@tool
+def get_payables_aging(as_of: str = None, vendor: str = None):
+    """Returns open vendor invoices in INR bucketed current/1-30/31-60/61-90/90+ days past due as of a YYYY-MM-DD date (today if omitted), per vendor, with DPO and expected payments over the next 30/60/90 days."""
+    return _get_payables_aging(as_of, vendor)
+
+
+@tool
+def get_payroll_summary(pay_period: str = None):
+    """Returns payroll totals for a YYYY-MM pay period (latest if omitted)."""
+    return _get_payroll_summary(pay_period)
+
+
+@tool
+def get_cash_runway():
+    """Returns current balance, daily burn rate and cash runway in days."""
+    return _get_cash_runway()
+
+
+# Every tool the LLM may call, in the order they are offered.
+TOOLS = [
+    get_current_cash_balance,
+    get_cash_balance_as_of,
+    get_top_cash_outflows_last_30_days,
+    get_flow_summary,
+    get_vendor_dues,
+    get_overdue_collections,
+    get_receivables_aging,
+    get_payables_aging,
+    get_payroll_summary,
+    get_cash_runway,
+]
+
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+from core.cache import bump_data_version, cached
+from core.db import connection
+
+# -------------------------------------------------
+# Vendor risk scoring
+# -------------------------------------------------
+# Scores every vendor in vendor_invoices from five features in [0, 1]:
+#   concentration - share of all vendor spend, relative to the largest vendor
+#   late_ratio    - due invoices paid after the due date (per the matched
+#                   bank debit) or still unpaid past it, over all due invoices
+#   volatility    - coefficient of variation of monthly spend since the
+#                   vendor's first payment, capped at VOLATILITY_CAP
+#   growth        - least-squares slope of the last GROWTH_MONTHS of spend
+#                   relative to their mean, per month, capped at GROWTH_CAP
+#   exposure      - unpaid invoice amount, relative to the largest vendor
+# score = 100 * sum(WEIGHTS[f] * f).
+#
+# Monthly spend per counterparty is kept in vendor_monthly_flow by an
+# ingest hook, so bank rows are aggregated once. After each ingest run
+# core.data_loader calls refresh(), which computes all features as
+# vendors x months arrays and stores them as a new snapshot; the
+# dashboard only reads the latest one. late_ratio and exposure depend on
+# date('now'), so a snapshot taken before today is_stale() and the
+# dashboard queues a re-score. Only the newest KEEP_SNAPSHOTS are kept.
+
+WEIGHTS = {
+    "concentration": 0.25,
+    "late_ratio": 0.25,
+    "volatility": 0.15,
+    "growth": 0.10,
+    "exposure": 0.25,
+}
+FEATURES = list(WEIGHTS)
+VOLATILITY_CAP = 1.5     # CV at which volatility saturates
+GROWTH_CAP = 0.25        # +25% of mean spend per month saturates growth
+GROWTH_MONTHS = 6
+KEEP_SNAPSHOTS = 90
+
+VENDOR_RISK_TABLES = {
+    "vendor_monthly_flow": """
+    CREATE TABLE IF NOT EXISTS vendor_monthly_flow (
+        counterparty_key TEXT NOT NULL,     -- stripped, casefolded name
+        year_month TEXT NOT NULL,
+        total REAL NOT NULL DEFAULT 0,
+        txn_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (counterparty_key, year_month)
+    )""",
+    "vendor_risk_snapshots": """
+    CREATE TABLE IF NOT EXISTS vendor_risk_snapshots (
+        id INTEGER PRIMARY KEY,
+        data_version INTEGER NOT NULL,
+        computed_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "vendor_risk_scores": f"""
+    CREATE TABLE IF NOT EXISTS vendor_risk_scores (
+        snapshot_id INTEGER NOT NULL,
+        vendor_name TEXT NOT NULL,
+        {"".join(f"{f} REAL NOT NULL, " for f in FEATURES)}
+        total_paid REAL NOT NULL,
+        unpaid REAL NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (snapshot_id, vendor_name)
+    )""",
+}
+
+VENDOR_RISK_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_vendor_risk_vendor ON vendor_risk_scores (vendor_name, snapshot_id)",
+]
+
+HOOK_COLUMNS = ["transaction_date", "transaction_type", "amount", "counterparty_name"]
+
+
+def _reader(cur):
+    """pandas needs the connection; migrations hand us a cursor."""
+    return getattr(cur, "connection", cur)
+
+
+def _key(names):
+    return names.fillna("").astype(str).str.strip().str.casefold()
+
+
+def create_tables(cur):
+    for ddl in VENDOR_RISK_TABLES.values():
+        cur.execute(ddl)
+    for ddl in VENDOR_RISK_INDEXES:
+        cur.execute(ddl)
+
+# -------------------------------------------------
+# Incremental maintenance
+# -------------------------------------------------
+def _monthly(df, sign):
+    df = df[df["transaction_type"] == "DEBIT"].dropna(subset=["transaction_date"])
+    return pd.DataFrame({
+        "counterparty_key": _key(df["counterparty_name"]),
+        "year_month": df["transaction_date"].astype(str).str[:7],
+        "total": df["amount"].fillna(0) * sign,
+        "txn_count": sign,
+    })
+
+
+def _upsert_monthly(cur, monthly):
+    cur.executemany("""
+        INSERT INTO vendor_monthly_flow (counterparty_key, year_month, total, txn_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(counterparty_key, year_month) DO UPDATE SET
+            total = total + excluded.total,
+            txn_count = txn_count + excluded.txn_count
+    """, monthly[["counterparty_key", "year_month", "total", "txn_count"]]
+        .itertuples(index=False, name=None))
+
+
+def apply_transactions(cur, new_rows, old_rows=None):
+    """Fold a chunk of upserted bank_statements rows into vendor_monthly_flow,
+    subtracting the previous version of overwritten rows."""
+    parts = [_monthly(new_rows, 1)]
+    if old_rows is not None and not old_rows.empty:
+        parts.append(_monthly(old_rows, -1))
+    delta = pd.concat(parts, ignore_index=True)
+    if delta.empty:
+        return
+    _upsert_monthly(
+        cur, delta.groupby(["counterparty_key", "year_month"], as_index=False)[["total", "txn_count"]].sum()
+    )
+
+
+def rebuild(cur):
+    """Recompute vendor_monthly_flow from bank_statements and take a
+    fresh snapshot (migration / repair only)."""
+    cur.execute("DELETE FROM vendor_monthly_flow")
+    flows = pd.read_sql("""
+        SELECT counterparty_name, year_month, SUM(amount) AS total, COUNT(*) AS txn_count
+        FROM bank_statements
+        WHERE transaction_type = 'DEBIT' AND year_month IS NOT NULL
+        GROUP BY counterparty_name, year_month
+    """, _reader(cur))
+    flows["counterparty_key"] = _key(flows["counterparty_name"])
+    _upsert_monthly(
+        cur, flows.groupby(["counterparty_key", "year_month"], as_index=False)[["total", "txn_count"]].sum()
+    )
+    snapshot(cur)
+
+# -------------------------------------------------
+# Features + scores
+# -------------------------------------------------
+def _invoice_stats(conn):
+    return pd.read_sql("""
+        SELECT v.vendor_name,
+               SUM(v.due_date <= date('now')) AS due_invoices,
+               SUM(COALESCE(m.days_from_due > 0,
+                            v.payment_status != 'Paid' AND v.due_date < date('now'))) AS late_invoices,
+               TOTAL(CASE WHEN v.payment_status != 'Paid' THEN v.net_amount END) AS unpaid
+        FROM vendor_invoices v
+        LEFT JOIN reconciliation_matches m
+          ON m.document_type = 'vendor_invoice' AND m.document_id = v.invoice_id
+        WHERE v.vendor_name IS NOT NULL
+        GROUP BY v.vendor_name
+    """, conn)
+
+
+def _relative(values):
+    top = values.max() if len(values) else 0.0
+    return values / top if top > 0 else np.zeros_like(values)
+
+
+def compute_features(invoices, flows):
+    """Feature frame, one row per vendor in `invoices`.
+
+    `invoices`: vendor_name, due_invoices, late_invoices, unpaid.
+    `flows`: counterparty_key, year_month, total.
+    """
+    vendors = invoices["vendor_name"].astype(str).to_numpy()
+    keys = _key(invoices["vendor_name"]).to_numpy()
+
+    # vendors x months spend matrix; months span every vendor payment
+    flows = flows[flows["counterparty_key"].isin(keys)]
+    months = np.sort(flows["year_month"].unique())
+    row_of = {k: i for i, k in enumerate(keys)}
+    spend = np.zeros((len(vendors), len(months)))
+    if len(months):
+        rows = flows["counterparty_key"].map(row_of).to_numpy()
+        cols = np.searchsorted(months, flows["year_month"].to_numpy())
+        np.add.at(spend, (rows, cols), flows["total"].to_numpy(dtype=float))
+
+    total_paid = spend.sum(axis=1)
+    active = spend > 0
+    first = active.argmax(axis=1) if spend.size else np.zeros(len(vendors), dtype=int)
+    first = np.where(active.any(axis=1), first, spend.shape[1])
+    span = np.arange(spend.shape[1])[None, :] >= first[:, None]
+    n = span.sum(axis=1)
+    mean = np.divide(total_paid, n, out=np.zeros_like(total_paid), where=n > 0)
+    var = np.divide(((spend - mean[:, None]) ** 2 * span).sum(axis=1), n,
+                    out=np.zeros_like(total_paid), where=n > 0)
+    cv = np.divide(np.sqrt(var), mean, out=np.zeros_like(mean), where=mean > 0)
+
+    recent = spend[:, -GROWTH_MONTHS:]
+    x = np.arange(recent.shape[1]) - (recent.shape[1] - 1) / 2
+    recent_mean = recent.mean(axis=1) if recent.shape[1] else np.zeros(len(vendors))
+    slope = recent @ x / (x @ x) if recent.shape[1] > 1 else np.zeros(len(vendors))
+    growth = np.divide(slope, recent_mean, out=np.zeros_like(slope), where=recent_mean > 0)
+
+    due = invoices["due_invoices"].fillna(0).to_numpy(dtype=float)
+    late = invoices["late_invoices"].fillna(0).to_numpy(dtype=float)
+    unpaid = invoices["unpaid"].fillna(0).to_numpy(dtype=float)
+
+    features = pd.DataFrame({
+        "vendor_name": vendors,
+        "concentration": _relative(total_paid),
+        "late_ratio": np.divide(late, due, out=np.zeros_like(late), where=due > 0),
+        "volatility": np.clip(cv / VOLATILITY_CAP, 0, 1),
+        "growth": np.clip(growth / GROWTH_CAP, 0, 1),
+        "exposure": _relative(unpaid),
+        "total_paid": total_paid,
+        "unpaid": unpaid,
+    })
+    features["score"] = 100 * features[FEATURES].to_numpy() @ np.array([WEIGHTS[f] for f in FEATURES])
+    return features
+
+
+def _prune(cur, keep=KEEP_SNAPSHOTS):
+    cutoff = cur.execute(
+        "SELECT id FROM vendor_risk_snapshots ORDER BY id DESC LIMIT 1 OFFSET ?", (keep - 1,)
+    ).fetchone()
+    if cutoff is None:
+        return
+    cur.execute("DELETE FROM vendor_risk_scores WHERE snapshot_id < ?", cutoff)
+    cur.execute("DELETE FROM vendor_risk_snapshots WHERE id < ?", cutoff)
+
+
+def snapshot(cur):
+    """Score every vendor and store the result as a new snapshot.
+
+    Bumps the data version itself, so the snapshot records the version
+    its own write commits at."""
+    reader = _reader(cur)
+    invoices = _invoice_stats(reader)
+    flows = pd.read_sql("SELECT counterparty_key, year_month, total FROM vendor_monthly_flow", reader)
+    features = compute_features(invoices, flows)
+
+    bump_data_version(cur)
+    version = cur.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+    cur.execute("INSERT INTO vendor_risk_snapshots (data_version) VALUES (?)", (version[0],))
+    snapshot_id = cur.lastrowid
+    cols = ["vendor_name"] + FEATURES + ["total_paid", "unpaid", "score"]
+    cur.executemany(f"""
+        INSERT INTO vendor_risk_scores (snapshot_id, {", ".join(cols)})
+        VALUES (?, {", ".join("?" for _ in cols)})
+    """, ((snapshot_id, *row) for row in features[cols].itertuples(index=False, name=None)))
+    _prune(cur)
+    return snapshot_id
+
+
+def refresh():
+    """Take a snapshot after an ingest run."""
+    with connection() as conn:
+        with conn:
+            return snapshot(conn.cursor())
+
+
+def is_stale():
+    """True when there is no snapshot yet or the latest was taken before
+    today (UTC, as date('now')), so its date-relative features are old."""
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT date(MAX(computed_at)) < date('now') OR MAX(computed_at) IS NULL
+            FROM vendor_risk_snapshots
+        """).fetchone()
+    return bool(row[0])
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+@cached()
+def get_vendor_risk(limit=None):
+    """Latest snapshot, riskiest first, with the change since the previous one."""
+    with connection() as conn:
+        return pd.read_sql(f"""
+            WITH latest AS (SELECT MAX(id) AS id FROM vendor_risk_snapshots),
+                 previous AS (
+                    SELECT MAX(id) AS id FROM vendor_risk_snapshots
+                    WHERE id < (SELECT id FROM latest)
+                 )
+            SELECT s.vendor_name AS vendor, s.score,
+                   s.score - p.score AS score_change,
+                   {", ".join(f"s.{f}" for f in FEATURES)},
+                   s.total_paid, s.unpaid, snap.computed_at
+            FROM vendor_risk_scores s
+            JOIN vendor_risk_snapshots snap ON snap.id = s.snapshot_id
+            LEFT JOIN vendor_risk_scores p
+              ON p.snapshot_id = (SELECT id FROM previous) AND p.vendor_name = s.vendor_name
+            WHERE s.snapshot_id = (SELECT id FROM latest)
+            ORDER BY s.score DESC
+            {"LIMIT ?" if limit else ""}
+        """, conn, params=(limit,) if limit else ())
+
+
+@cached()
+def get_score_history(vendor_name):
+    with connection() as conn:
+        return pd.read_sql(f"""
+            SELECT snap.computed_at, s.score, {", ".join(f"s.{f}" for f in FEATURES)}
+            FROM vendor_risk_scores s
+            JOIN vendor_risk_snapshots snap ON snap.id = s.snapshot_id
+            WHERE s.vendor_name = ?
+            ORDER BY s.snapshot_id
+        """, conn, params=(vendor_name,))
@@ -1,10 +1,11 @@
+import os
 import pandas as pd
 from datetime import datetime, timedelta
 import random
 
 rows = []
 year=2025
-data_folder="../data/"
+data_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "")
 
 for day in range(365):
     date = datetime(year,1,1) + timedelta(days=day)
@@ -1,10 +1,11 @@
+import os
 import pandas as pd
 import random
 from datetime import datetime, timedelta
 import uuid
 
 year=2025
-data_folder="../data/"
+data_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "")
 CATEGORIES = [
     ("Travel","Uber"),
     ("Food","Restaurant"),
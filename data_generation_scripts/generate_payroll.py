@@ -1,9 +1,10 @@
+import os
 import pandas as pd
 from datetime import datetime
 import uuid
 
 year=2025
-data_folder="../data/"
+data_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "")
 EMPLOYEES = [
     ("E001","Rahul Sharma","Engineer","Technology",30000),
     ("E002","Neha Verma","Engineer","Technology",35000),
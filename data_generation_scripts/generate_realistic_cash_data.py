@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import random
 from datetime import datetime, timedelta
@@ -5,7 +6,7 @@ import uuid
 
 random.seed(42)
 year=2025
-data_folder="../data/"
+data_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "")
 START = datetime(year, 1, 1)
 END = datetime(year, 12, 31)
 DATES = pd.date_range(START, END)
@@ -0,0 +1,340 @@
+"""Synthetic cash-management data at any scale.
+
+    python generate_scale_data.py --years 5 --accounts 20 --rows-per-day 100
+
+Writes the same six CSVs as the per-table scripts, with the same columns
+and value ranges, but every column is drawn with NumPy for a whole
+(account, year) block at once, so tens of millions of bank rows take
+minutes instead of hours. The defaults reproduce the shipped data set's
+shape: one account, one year, ~13 bank rows a day. Output is
+deterministic for a given seed.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data")
+CURRENCY = "INR"
+
+BASE_ACCOUNT = 29833423
+BASE_CLIENTS = [
+    "Alpha Corp", "Beta Solutions", "Gamma Technologies",
+    "Delta Systems", "Epsilon Infotech",
+]
+# (name, invoice category, tax %)
+BASE_VENDORS = [
+    ("AWS India Pvt Ltd", "Cloud Services", 18),
+    ("BESCOM", "Electricity", 5),
+    ("ACT Fibernet", "Internet", 18),
+    ("Prestige Office Rentals", "Rent", 0),
+    ("Staples India", "Office Supplies", 18),
+    ("Uber India", "Travel", 5),
+    ("Swiggy", "Food", 5),
+    ("Zomato", "Food", 5),
+]
+BASE_EMPLOYEES = [
+    ("Rahul Sharma", "Engineer", "Technology", 30000),
+    ("Neha Verma", "Engineer", "Technology", 35000),
+    ("Amit Singh", "Sales Exec", "Sales", 25000),
+    ("Pooja Mehta", "HR Manager", "HR", 20000),
+    ("Suman Patel", "Admin", "Admin", 20000),
+]
+RENT_PAYEE, RENT_AMOUNT = "Prestige Office Rentals", 40000
+SALARY_PAYEE, SALARY_AMOUNT = "ABC Tech Payroll", 180000
+OPENING_BALANCE = 1_200_000
+
+# Random bank rows a day in the original generator: 2-6 collections,
+# 1-4 vendor payments and 3-10 expenses, i.e. 4 + 2.5 + 6.5 on average.
+# --rows-per-day scales all three by the same factor.
+#   (share, type, counterparty pool, amount range, narration, category, mode)
+BANK_FLOWS = [
+    (4.0, "CREDIT", "clients", (25_000, 250_000), ("IMPS-CLIENT-", 1000, 9999), "Client Collection", "IMPS"),
+    (2.5, "DEBIT", "vendors", (3_000, 80_000), ("NEFT-VENDOR-", 1000, 9999), "Vendor Payment", "NEFT"),
+    (6.5, "DEBIT", "vendors", (200, 7_000), ("UPI-EXP-", 10000, 99999), "Operating Expense", "UPI"),
+]
+BASE_ROWS_PER_DAY = sum(f[0] for f in BANK_FLOWS)
+
+VENDOR_INVOICES_PER_VENDOR_YEAR = 450    # 3600 a year for the 8 base vendors
+CLIENT_INVOICES_PER_CLIENT_YEAR = 760    # 3800 a year for the 5 base clients
+EXPENSE_RECEIPTS_PER_ACCOUNT_YEAR = 6500
+
+BANK_COLUMNS = [
+    "transaction_id", "account_number", "transaction_date", "value_date",
+    "transaction_type", "amount", "balance_after", "currency",
+    "counterparty_name", "narration", "category", "payment_mode",
+]
+
+# -------------------------------------------------
+# Helpers
+# -------------------------------------------------
+def _uuids(rng, n):
+    """n random version-4 style UUID strings without a Python loop."""
+    digits = np.frombuffer(rng.bytes(16 * n).hex().encode(), dtype="S1").reshape(n, 32)
+    out = np.full((n, 36), b"-", dtype="S1")
+    out[:, [i for i in range(36) if i not in (8, 13, 18, 23)]] = digits
+    out[:, 14] = b"4"
+    return out.view("S36").ravel().astype(str)
+
+
+def _tagged(rng, prefix, low, high, n):
+    """`prefix` followed by a random integer in [low, high], n times."""
+    return np.char.add(prefix, rng.integers(low, high + 1, n).astype(str))
+
+
+def _pick(rng, pool, n):
+    return np.asarray(pool, dtype=object)[rng.integers(0, len(pool), n)]
+
+
+def accounts(count):
+    return [f"HDFC-CA-{BASE_ACCOUNT + i:08d}" for i in range(count)]
+
+
+def clients(count):
+    names = BASE_CLIENTS + [f"Client {i:04d} Ltd" for i in range(len(BASE_CLIENTS) + 1, count + 1)]
+    return [(f"C{i + 1:03d}", name) for i, name in enumerate(names[:count])]
+
+
+def vendors(count):
+    extra = [
+        (f"Vendor {i:04d} Pvt Ltd", BASE_VENDORS[i % len(BASE_VENDORS)][1], 18)
+        for i in range(len(BASE_VENDORS) + 1, count + 1)
+    ]
+    return [(f"V{i + 1:03d}", *v) for i, v in enumerate((BASE_VENDORS + extra)[:count])]
+
+
+def employees(count):
+    extra = [
+        (f"Employee {i:04d}", *BASE_EMPLOYEES[i % len(BASE_EMPLOYEES)][1:])
+        for i in range(len(BASE_EMPLOYEES) + 1, count + 1)
+    ]
+    return [(f"E{i + 1:03d}", *e) for i, e in enumerate((BASE_EMPLOYEES + extra)[:count])]
+
+
+def _year_days(year):
+    return pd.date_range(f"{year}-01-01", f"{year}-12-31")
+
+# -------------------------------------------------
+# Tables
+# -------------------------------------------------
+def bank_block(rng, account, days, client_names, vendor_names, rows_per_day, opening):
+    """One account's statement for `days`, in posting order. Returns the
+    frame and the closing balance."""
+    day_str = days.strftime("%Y-%m-%d").to_numpy()
+    pools = {"clients": client_names, "vendors": vendor_names}
+    scale = rows_per_day / BASE_ROWS_PER_DAY
+
+    # Fixed items first each day (rent on the 1st, salary on the 5th), then
+    # collections, vendor payments and expenses - the original posting order.
+    parts = []
+    rent = np.flatnonzero(days.day == 1)
+    salary = np.flatnonzero(days.day == 5)
+    parts.append((0, rent, "DEBIT", np.full(len(rent), RENT_AMOUNT),
+                  np.full(len(rent), RENT_PAYEE, dtype=object),
+                  np.full(len(rent), "ACH-OFFICE-RENT", dtype=object), "Rent", "ACH"))
+    parts.append((1, salary, "DEBIT", np.full(len(salary), SALARY_AMOUNT),
+                  np.full(len(salary), SALARY_PAYEE, dtype=object),
+                  np.char.add("NEFT-SALARY-", days[salary].strftime("%b%y").to_numpy().astype(str)),
+                  "Salary", "NEFT"))
+    for order, (share, ttype, pool, (low, high), (prefix, nlow, nhigh), category, mode) in enumerate(BANK_FLOWS, 2):
+        day_idx = np.repeat(np.arange(len(days)), rng.poisson(share * scale, len(days)))
+        n = len(day_idx)
+        parts.append((order, day_idx, ttype, rng.integers(low, high + 1, n),
+                      _pick(rng, pools[pool], n), _tagged(rng, prefix, nlow, nhigh, n),
+                      category, mode))
+
+    order = np.concatenate([np.full(len(p[1]), p[0]) for p in parts])
+    day_idx = np.concatenate([p[1] for p in parts])
+    posting = np.lexsort((order, day_idx))
+
+    ttype = np.concatenate([np.full(len(p[1]), p[2], dtype=object) for p in parts])[posting]
+    amount = np.concatenate([p[3] for p in parts]).astype(np.int64)[posting]
+    balance = opening + np.cumsum(np.where(ttype == "DEBIT", -amount, amount))
+    dates = day_str[day_idx[posting]]
+    n = len(posting)
+
+    df = pd.DataFrame({
+        "transaction_id": _uuids(rng, n),
+        "account_number": account,
+        "transaction_date": dates,
+        "value_date": dates,
+        "transaction_type": ttype,
+        "amount": amount,
+        "balance_after": balance,
+        "currency": CURRENCY,
+        "counterparty_name": np.concatenate([p[4] for p in parts])[posting],
+        "narration": np.concatenate([p[5].astype(object) for p in parts])[posting],
+        "category": np.concatenate([np.full(len(p[1]), p[6], dtype=object) for p in parts])[posting],
+        "payment_mode": np.concatenate([np.full(len(p[1]), p[7], dtype=object) for p in parts])[posting],
+    }, columns=BANK_COLUMNS)
+    return df, (int(balance[-1]) if n else opening)
+
+
+def vendor_invoices(rng, days, vendor_list, per_vendor):
+    n = per_vendor * len(vendor_list)
+    v = rng.integers(0, len(vendor_list), n)
+    ids, names, categories, rates = (np.asarray(c, dtype=object) for c in zip(*vendor_list))
+    inv = days[rng.integers(0, len(days), n)]
+    due = inv + pd.to_timedelta(rng.choice([15, 30], n), unit="D")
+    gross = rng.integers(3000, 80001, n)
+    tax = np.round(gross * rates[v].astype(float) / 100, 2)
+    return pd.DataFrame({
+        "invoice_id": _uuids(rng, n),
+        "vendor_id": ids[v],
+        "vendor_name": names[v],
+        "invoice_number": np.char.add(np.char.add(ids[v].astype(str), "-"),
+                                      rng.integers(10000, 100000, n).astype(str)),
+        "invoice_date": inv.strftime("%Y-%m-%d"),
+        "due_date": due.strftime("%Y-%m-%d"),
+        "category": categories[v],
+        "gross_amount": gross,
+        "tax_amount": tax,
+        "net_amount": gross + tax,
+        "payment_status": _pick(rng, ["Paid", "Unpaid", "Late"], n),
+        "expected_payment_mode": "Bank Transfer",
+    })
+
+
+def client_invoices(rng, days, client_list, per_client):
+    n = per_client * len(client_list)
+    c = rng.integers(0, len(client_list), n)
+    ids, names = (np.asarray(col, dtype=object) for col in zip(*client_list))
+    inv = days[rng.integers(0, len(days), n)]
+    due = inv + pd.to_timedelta(rng.choice([30, 45], n), unit="D")
+    gross = rng.integers(50000, 300001, n)
+    tax = np.round(gross * 18 / 100, 2)
+    return pd.DataFrame({
+        "invoice_id": _uuids(rng, n),
+        "client_id": ids[c],
+        "client_name": names[c],
+        "invoice_number": np.char.add(np.char.add(ids[c].astype(str), "-INV-"),
+                                      rng.integers(10000, 100000, n).astype(str)),
+        "invoice_date": inv.strftime("%Y-%m-%d"),
+        "due_date": due.strftime("%Y-%m-%d"),
+        "service_type": "IT Consulting",
+        "gross_amount": gross,
+        "tax_amount": tax,
+        "net_amount": gross + tax,
+        "collection_status": _pick(rng, ["Collected", "Pending", "Overdue"], n),
+    })
+
+
+def expense_receipts(rng, days, n):
+    categories = [("Travel", "Uber"), ("Food", "Restaurant"), ("Office Supplies", "Staples"),
+                  ("Maintenance", "Service Center"), ("Client Entertainment", "Hotel")]
+    k = rng.integers(0, len(categories), n)
+    category, merchant = (np.asarray(col, dtype=object)[k] for col in zip(*categories))
+    amount = rng.integers(300, 8001, n)
+    return pd.DataFrame({
+        "receipt_id": _uuids(rng, n),
+        "expense_date": days[rng.integers(0, len(days), n)].strftime("%Y-%m-%d"),
+        "merchant_name": merchant,
+        "expense_category": category,
+        "amount": amount,
+        "tax_amount": np.round(amount * 0.05, 2),
+        "payment_mode": _pick(rng, ["Cash", "UPI", "Card"], n),
+        "linked_transaction_id": None,
+    })
+
+
+def payroll(rng, year, employee_list):
+    periods = [f"{year}-{m:02d}" for m in range(1, 13)]
+    emp = pd.DataFrame(employee_list, columns=[
+        "employee_id", "employee_name", "designation", "department", "gross_salary"
+    ])
+    df = emp.merge(pd.DataFrame({"pay_period": periods}), how="cross")
+    df["tax_deduction"] = np.round(df["gross_salary"] * 0.1, 2)
+    df["net_salary"] = df["gross_salary"] - df["tax_deduction"]
+    df["payment_status"] = "Paid"
+    df["payment_reference"] = "SAL-" + df["pay_period"]
+    df.insert(0, "payroll_id", _uuids(rng, len(df)))
+    return df[[
+        "payroll_id", "employee_id", "employee_name", "designation", "department",
+        "pay_period", "gross_salary", "tax_deduction", "net_salary",
+        "payment_status", "payment_reference",
+    ]]
+
+
+def cash_forecast(rng, days):
+    n = len(days)
+    return pd.DataFrame({
+        "forecast_date": days.strftime("%Y-%m-%d"),
+        "expected_inflow": rng.choice([0, 50000, 100000, 200000], n),
+        "expected_outflow": rng.choice([0, 40000, 80000, 120000], n),
+        "source": _pick(rng, ["Client Invoice", "Payroll", "Rent", "Utility"], n),
+        "confidence_level": _pick(rng, ["High", "Medium", "Low"], n),
+    })
+
+# -------------------------------------------------
+# Driver
+# -------------------------------------------------
+def generate(out_dir=DATA_DIR, years=1, start_year=2025, n_accounts=1, n_clients=5,
+             n_vendors=8, rows_per_day=BASE_ROWS_PER_DAY, n_employees=5, seed=42):
+    """Write the six CSVs to `out_dir`; returns {table: row count}.
+
+    Each (account, year) block is generated and appended separately, so
+    memory stays bounded by one block whatever the total size.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    client_list, vendor_list = clients(n_clients), vendors(n_vendors)
+    employee_list = employees(n_employees)
+    client_names = [c[1] for c in client_list]
+    vendor_names = [v[1] for v in vendor_list]
+    counts = dict.fromkeys([
+        "bank_statements", "vendor_invoices", "client_invoices",
+        "payroll", "expense_receipts", "cash_forecast",
+    ], 0)
+
+    def write(table, df, first):
+        df.to_csv(os.path.join(out_dir, f"{table}.csv"), mode="w" if first else "a",
+                  header=first, index=False)
+        counts[table] += len(df)
+
+    balances = dict.fromkeys(accounts(n_accounts), OPENING_BALANCE)
+    for y, year in enumerate(range(start_year, start_year + years)):
+        days = _year_days(year)
+        first = y == 0
+        for a, account in enumerate(balances):
+            df, balances[account] = bank_block(
+                rng, account, days, client_names, vendor_names, rows_per_day, balances[account]
+            )
+            write("bank_statements", df, first and a == 0)
+        write("vendor_invoices", vendor_invoices(rng, days, vendor_list, VENDOR_INVOICES_PER_VENDOR_YEAR), first)
+        write("client_invoices", client_invoices(rng, days, client_list, CLIENT_INVOICES_PER_CLIENT_YEAR), first)
+        write("expense_receipts", expense_receipts(rng, days, EXPENSE_RECEIPTS_PER_ACCOUNT_YEAR * n_accounts), first)
+        write("payroll", payroll(rng, year, employee_list), first)
+        write("cash_forecast", cash_forecast(rng, days), first)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=DATA_DIR, help="output directory (default: the repo's data/)")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--start-year", type=int, default=2025)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--vendors", type=int, default=8)
+    parser.add_argument("--employees", type=int, default=5)
+    parser.add_argument("--rows-per-day", type=float, default=BASE_ROWS_PER_DAY,
+                        help="average bank rows per account per day")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(
+        args.out, years=args.years, start_year=args.start_year, n_accounts=args.accounts,
+        n_clients=args.clients, n_vendors=args.vendors, rows_per_day=args.rows_per_day,
+        n_employees=args.employees, seed=args.seed,
+    )
+    elapsed = time.perf_counter() - start
+    for table, n in counts.items():
+        print(f"{table:>18}: {n:>12,} rows")
+    print(f"✅ Generated {sum(counts.values()):,} rows in {elapsed:.1f}s -> {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
+import os
 import pandas as pd
 import random
 from datetime import datetime, timedelta
 import uuid
 
-data_folder="../data/"
+data_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "")
 random.seed(42)
 year=2025
 START = datetime(year, 1, 1)
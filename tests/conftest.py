@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["JOB_WORKERS"] = "0"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An empty, migrated database in tmp_path for the duration of a test."""
+    from core import db as core_db
+    from core.cache import query_cache
+
+    core_db.get_pool().close_all()
+    monkeypatch.setattr(core_db, "DB_PATH", str(tmp_path / "test.db"))
+    core_db.init_db(force=True)
+    query_cache.clear()
+    yield core_db
+    core_db.get_pool().close_all()
+    query_cache.clear()
+
+
+@pytest.fixture
+def load_sample(db):
+    """load_sample(*tables, chunksize=...) ingests the bundled sample CSVs."""
+    from core.data_loader import CSV_SOURCES, load_all
+
+    def load(*tables, chunksize=50_000):
+        sources = {t: os.path.join(REPO, CSV_SOURCES[t]) for t in tables or CSV_SOURCES}
+        return load_all(sources, chunksize=chunksize)
+
+    return load
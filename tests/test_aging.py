@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import aging
+from core.data_loader import load_csv
+
+AS_OF = "2025-06-30"
+
+# days past due -> bucket
+BOUNDARIES = [
+    (-5, "current"), (0, "current"),
+    (1, "1-30"), (30, "1-30"),
+    (31, "31-60"), (60, "31-60"),
+    (61, "61-90"), (90, "61-90"),
+    (91, "90+"), (400, "90+"),
+]
+
+COLUMNS = [
+    "invoice_id", "vendor_id", "vendor_name", "invoice_number", "invoice_date", "due_date",
+    "category", "gross_amount", "tax_amount", "net_amount", "payment_status", "expected_payment_mode",
+]
+
+
+def _due(days_past_due):
+    return pd.Timestamp(AS_OF) - pd.Timedelta(days=days_past_due)
+
+
+def test_bucket_edges():
+    due = np.array(sorted(_due(d) for d, _ in BOUNDARIES), dtype="datetime64[D]")
+    codes = aging._bucket_codes(due, np.datetime64(AS_OF, "D"))
+    expected = [b for _, b in sorted(BOUNDARIES, key=lambda x: _due(x[0]))]
+    assert [aging.BUCKETS[c] for c in codes] == expected
+
+
+@pytest.fixture
+def payables(db, tmp_path):
+    rows = []
+    for i, (days, _) in enumerate(BOUNDARIES):
+        due = _due(days)
+        issued = min(due, pd.Timestamp(AS_OF)) - pd.Timedelta(days=30)
+        rows.append((f"INV{i}", "V1", "Acme", f"N{i}", issued.strftime("%Y-%m-%d"),
+                     due.strftime("%Y-%m-%d"), "Misc", 100.0, 0, 100.0, "Unpaid", "NEFT"))
+    # settled by status, and not yet issued as of AS_OF: neither is open
+    rows.append(("PAID", "V1", "Acme", "P", "2025-01-01", "2025-02-01", "Misc", 7.0, 0, 7.0, "Paid", "NEFT"))
+    rows.append(("LATER", "V2", "Beta", "L", "2025-07-01", "2025-07-31", "Misc", 9.0, 0, 9.0, "Unpaid", "NEFT"))
+    path = tmp_path / "vendor_invoices.csv"
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+    load_csv("vendor_invoices", str(path))
+
+
+def test_report_buckets_open_invoices(payables):
+    report = aging.get_aging("payables", AS_OF)
+
+    expected = {b: 100.0 * sum(1 for _, x in BOUNDARIES if x == b) for b in aging.BUCKETS}
+    assert {b: report.totals[b] for b in aging.BUCKETS} == expected
+    assert report.totals["total"] == 100.0 * len(BOUNDARIES)
+    assert report.totals["overdue"] == report.totals["total"] - expected["current"]
+    assert report.by_counterparty["counterparty"].tolist() == ["Acme"]
+    assert report.by_counterparty.loc[0, "open_invoices"] == len(BOUNDARIES)
+    assert report.status_mismatch == {"invoices": 0, "amount": 0.0}
+
+    # the not-yet-issued invoice opens once its invoice date has passed
+    later = aging.get_aging("payables", "2025-07-01")
+    assert later.totals["current"] == 9.0 + 100.0 * sum(1 for d, _ in BOUNDARIES if d < -1)
@@ -0,0 +1,66 @@
+import pandas as pd
+
+from core import anomalies
+from core.db import connection
+
+
+def _rows(rows):
+    return pd.DataFrame(rows, columns=anomalies.SCORE_COLUMNS)
+
+
+def _history(n=20, amount=50_000.0):
+    """Monthly rent payments of a near-constant amount."""
+    dates = pd.date_range("2024-01-01", periods=n, freq="MS") + pd.Timedelta(days=4)
+    return [
+        (f"T{i}", d.strftime("%Y-%m-%d"), "Debit", amount + 100 * (i % 3), "Landlord", "Rent")
+        for i, d in enumerate(dates)
+    ]
+
+
+def _score(rows):
+    with connection() as conn:
+        with conn:
+            return anomalies.score(conn.cursor(), _rows(rows))
+
+
+def _alerts():
+    with connection() as conn:
+        return set(conn.execute(
+            "SELECT transaction_id, rule, scope FROM anomaly_alerts"
+        ).fetchall())
+
+
+def test_planted_amount_spike_is_flagged_in_both_scopes(db):
+    history = _history()
+    assert _score(history) == 0
+
+    _score([("SPIKE", "2025-09-20", "Debit", 500_000.0, "Landlord", "Rent")])
+    alerts = _alerts()
+    assert alerts == {
+        ("SPIKE", "amount_spike", "counterparty"),
+        ("SPIKE", "amount_spike", "category"),
+    }
+
+    with connection() as conn:
+        score, expected = conn.execute(
+            "SELECT score, expected FROM anomaly_alerts WHERE scope = 'counterparty'"
+        ).fetchone()
+    assert score >= anomalies.Z_THRESHOLD
+    assert 49_000 < expected < 51_000
+
+
+def test_payment_days_after_the_last_one_is_unusual_frequency(db):
+    history = _history()
+    _score(history)
+    last = pd.Timestamp(history[-1][1])
+
+    _score([("EARLY", (last + pd.Timedelta(days=2)).strftime("%Y-%m-%d"),
+             "Debit", 50_100.0, "Landlord", "Rent")])
+    assert ("EARLY", "unusual_frequency", "counterparty") in _alerts()
+    assert not {a for a in _alerts() if a[1] == "amount_spike"}
+
+
+def test_short_history_raises_no_alerts(db):
+    history = _history(n=anomalies.MIN_HISTORY - 1)
+    history.append(("SPIKE", "2025-09-20", "Debit", 500_000.0, "Landlord", "Rent"))
+    assert _score(history) == 0
@@ -0,0 +1,41 @@
+from core import cache
+from core.cache import QueryCache, bump_data_version, cached, get_data_version
+from core.db import connection
+
+
+def test_data_version_bump_invalidates_cached_reads(db):
+    calls = []
+
+    @cached()
+    def read(x):
+        calls.append(x)
+        return len(calls)
+
+    assert read(1) == 1
+    assert read(1) == 1
+    assert read.peek(1) == (True, 1)
+
+    version = get_data_version()
+    with connection() as conn:
+        with conn:
+            bump_data_version(conn)
+    assert get_data_version() == version + 1
+
+    assert read.peek(1) == (False, None)
+    assert read(1) == 2
+    assert calls == [1, 1]
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    store = QueryCache()
+    store.set("relative", "value", ttl=300)
+    store.set("absolute", "value")
+
+    now[0] += 299
+    assert store.get("relative") == (True, "value")
+    now[0] += 1
+    assert store.get("relative") == (False, None)
+    assert store.get("absolute") == (True, "value")
+    assert store.stats()["expirations"] == 1
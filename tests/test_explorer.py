@@ -0,0 +1,20 @@
+from core.explorer import Filter, fetch_page, query_key
+
+
+def _query(filters):
+    return query_key("bank_statements", ["transaction_id", "category"], "transaction_id", False, filters, 50)
+
+
+def test_filters_differing_only_by_value_get_different_pages(load_sample):
+    load_sample("bank_statements")
+    rent = [Filter("category", "=", "Rent")]
+    salary = [Filter("category", "=", "Salary")]
+
+    assert _query(rent) != _query(salary)
+    assert _query(rent) == _query([Filter("category", "=", "Rent")])
+
+    rent_page = fetch_page("bank_statements", ["transaction_id", "category"], rent, page_size=50)
+    salary_page = fetch_page("bank_statements", ["transaction_id", "category"], salary, page_size=50)
+    assert set(rent_page.rows["category"]) == {"Rent"}
+    assert set(salary_page.rows["category"]) == {"Salary"}
+    assert not set(rent_page.rows["transaction_id"]) & set(salary_page.rows["transaction_id"])
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from core.forecast import PERCENTILES, ForecastInputs, Schedule, simulate
+
+
+def _inputs(schedules=()):
+    return ForecastInputs(
+        start_date=pd.Timestamp("2026-01-01"),
+        opening_balance=1_000.0,
+        hist_net=np.array([-50.0, 0.0, 20.0, 40.0]),
+        schedules=list(schedules),
+    )
+
+
+def test_result_shape_follows_days_and_percentiles():
+    result = simulate(_inputs(), days=30, paths=500, threshold=900.0)
+
+    assert len(result.dates) == 30
+    assert result.dates[0] == pd.Timestamp("2026-01-01")
+    assert result.dates[-1] == pd.Timestamp("2026-01-30")
+    assert set(result.percentiles) == set(PERCENTILES)
+    assert all(len(band) == 30 for band in result.percentiles.values())
+    assert len(result.prob_shortfall) == len(result.expected_balance) == 30
+    assert ((0 <= result.prob_shortfall) & (result.prob_shortfall <= 1)).all()
+    bands = np.vstack([result.percentiles[p] for p in PERCENTILES])
+    assert (np.diff(bands, axis=0) >= 0).all()
+
+    frame = result.to_frame()
+    assert len(frame) == 30
+
+
+def test_same_seed_gives_the_same_forecast():
+    inputs = _inputs()
+    first = simulate(inputs, days=60, paths=1_000, seed=7)
+    again = simulate(inputs, days=60, paths=1_000, seed=7)
+    other = simulate(inputs, days=60, paths=1_000, seed=8)
+
+    for p in PERCENTILES:
+        np.testing.assert_array_equal(first.percentiles[p], again.percentiles[p])
+    np.testing.assert_array_equal(first.expected_balance, again.expected_balance)
+    np.testing.assert_array_equal(first.prob_shortfall, again.prob_shortfall)
+    assert not np.array_equal(first.expected_balance, other.expected_balance)
+
+
+def test_certain_schedule_shifts_every_path():
+    flat = ForecastInputs(pd.Timestamp("2026-01-01"), 1_000.0, np.zeros(5), [])
+    rent = Schedule(day=np.array([2]), count=np.array([1]),
+                    amount=np.array([-300.0]), prob=np.array([1.0]))
+    result = simulate(flat, days=5, paths=100)
+    paid = simulate(ForecastInputs(flat.start_date, 1_000.0, np.zeros(5), [rent]),
+                    days=5, paths=100, threshold=800.0)
+
+    np.testing.assert_allclose(result.percentiles[50], 1_000.0)
+    np.testing.assert_allclose(paid.percentiles[5], [1_000, 1_000, 700, 700, 700])
+    np.testing.assert_allclose(paid.prob_shortfall, [0, 0, 1, 1, 1])
@@ -0,0 +1,30 @@
+import time
+
+from core import intents
+from core.intents import match_category
+
+CATEGORIES = ["Rent", "Salary", "Software Subscriptions", "Office Supplies"]
+
+
+def test_category_matches_whole_tokens():
+    assert match_category("how much rent did we pay in may 2025", CATEGORIES) == "Rent"
+    assert match_category("software subscriptions last month", CATEGORIES) == "Software Subscriptions"
+
+
+def test_category_ignores_substrings_of_other_words():
+    # "rent" sits inside both words but neither is the Rent category
+    assert match_category("current expenses in 2025", CATEGORIES) is None
+    assert match_category("what were our outflows in the current year", CATEGORIES) is None
+    assert match_category("rental deposits received", CATEGORIES) is None
+
+
+def test_fallbacks_record_their_routing_time(monkeypatch):
+    def slow_classify(query):
+        time.sleep(0.005)
+        return None
+
+    monkeypatch.setattr(intents, "classify", slow_classify)
+    before = intents.routing_metrics()["by_intent"].get("llm_fallback", 0)
+    assert intents.route("tell me a joke") is None
+    assert intents.routing_metrics()["by_intent"]["llm_fallback"] == before + 1
+    assert intents._route_latencies_ms[-1] >= 5
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from core import jobs
+from core.db import connection
+
+
+@pytest.fixture
+def probe(db, monkeypatch):
+    """A "probe" job kind whose calls are recorded; it reports progress
+    once, so a cancel request stops it."""
+    calls = []
+
+    def run(ctx, value=None):
+        calls.append(value)
+        ctx.progress(0.5, "halfway")
+        return {"value": value}
+
+    monkeypatch.setitem(jobs.JOB_TYPES, "probe", (run, 0))
+    return calls
+
+
+def _status(job_id):
+    return jobs.get_job(job_id)["status"]
+
+
+def _insert_running(worker):
+    with connection() as conn:
+        with conn:
+            return conn.execute(
+                "INSERT INTO jobs (kind, params, priority, status, worker) VALUES ('probe', '{}', 0, ?, ?)",
+                (jobs.RUNNING, worker)
+            ).lastrowid
+
+
+def test_identical_pending_jobs_are_deduplicated(probe):
+    first = jobs.submit("probe", {"value": 1})
+    assert jobs.submit("probe", {"value": 1}) == first
+    assert jobs.submit("probe", {"value": 1}, priority=5) == first
+    assert jobs.get_job(first)["priority"] == 5
+    assert jobs.submit("probe", {"value": 1}, priority=1) == first
+    assert jobs.get_job(first)["priority"] == 5
+    assert jobs.submit("probe", {"value": 2}) != first
+
+    # once it runs, the same request queues a new job
+    job_id, kind, params = jobs._claim("test")
+    assert job_id == first
+    assert jobs.submit("probe", {"value": 1}) != first
+
+
+def test_cancel_pending_and_running_jobs(probe):
+    pending = jobs.submit("probe", {"value": 1})
+    assert jobs.cancel(pending) == jobs.CANCELLED
+    assert jobs._claim("test") is None
+
+    running = jobs.submit("probe", {"value": 2})
+    claimed = jobs._claim("test")
+    assert claimed[0] == running
+    assert jobs.cancel(running) == jobs.RUNNING
+    jobs.run_job(*claimed)
+
+    assert _status(running) == jobs.CANCELLED
+    assert probe == [2]     # it stopped at its progress() call
+
+
+def test_jobs_of_dead_or_restarted_workers_are_requeued(probe):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    pid = os.getpid()
+
+    restarted = _insert_running(f"{pid}:earlier:job-worker-0")
+    dead = _insert_running(f"{exited.pid}:other:job-worker-0")
+    unstamped = _insert_running(None)
+    ours = _insert_running(jobs._worker_name())
+    other_live = _insert_running(f"{os.getppid()}:other:job-worker-0")
+
+    assert jobs.recover_orphans() == 3
+    for job_id in (restarted, dead, unstamped):
+        job = jobs.get_job(job_id)
+        assert job["status"] == jobs.PENDING
+        assert job["worker"] is None
+    assert _status(ours) == jobs.RUNNING
+    assert _status(other_live) == jobs.RUNNING
+
+
+def _wait(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while _status(job_id) in jobs.ACTIVE:
+        assert time.monotonic() < deadline, f"job {job_id} still {_status(job_id)}"
+        time.sleep(0.02)
+    return jobs.get_job(job_id)
+
+
+def test_worker_survives_an_unrecordable_outcome(probe, monkeypatch):
+    write_finish = jobs._write_finish
+    failures = [jobs.FINISH_ATTEMPTS]
+
+    def flaky(*args):
+        if failures[0]:
+            failures[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return write_finish(*args)
+
+    monkeypatch.setattr(jobs, "_write_finish", flaky)
+    scheduler = jobs.Scheduler(workers=1, poll_interval=0.05)
+    scheduler.start()
+    try:
+        lost = jobs.submit("probe", {"value": 1})
+        scheduler.wake()
+        job = _wait(lost)
+        assert job["status"] == jobs.FAILED
+        assert "could not record" in job["error"]
+
+        after = jobs.submit("probe", {"value": 2})
+        scheduler.wake()
+        assert _wait(after)["status"] == jobs.SUCCEEDED
+    finally:
+        scheduler.stop(timeout=5)
+    assert probe == [1, 2]
@@ -0,0 +1,56 @@
+import pandas as pd
+
+from core import ledger
+from core.data_loader import load_csv
+from core.db import connection
+
+COLUMNS = [
+    "transaction_id", "account_number", "transaction_date", "value_date", "transaction_type",
+    "amount", "balance_after", "currency", "counterparty_name", "narration", "category", "payment_mode",
+]
+ACCOUNT, OTHER = "HDFC-CA-1", "ICICI-CA-2"
+
+
+def _row(txn, account, date, kind, amount, balance):
+    return (txn, account, date, date, kind, amount, balance, "INR", "Acme", "NEFT", "Misc", "NEFT")
+
+
+def _load(tmp_path, name, rows):
+    path = tmp_path / f"{name}.csv"
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+    load_csv("bank_statements", str(path))
+
+
+def _ledger():
+    with connection() as conn:
+        with conn:
+            ledger.rebuild(conn.cursor())
+        return conn.execute("SELECT * FROM account_daily_balance ORDER BY 1, 2").fetchall()
+
+
+def test_as_of_balance_follows_a_replaced_row(db, tmp_path):
+    _load(tmp_path, "initial", [
+        _row("T1", ACCOUNT, "2025-01-01", "CREDIT", 1_000, 1_000),
+        _row("T2", ACCOUNT, "2025-01-01", "DEBIT", 200, 800),
+        _row("T3", ACCOUNT, "2025-01-03", "CREDIT", 500, 1_300),
+        _row("T4", OTHER, "2025-01-02", "CREDIT", 50, 50),
+    ])
+    assert ledger.get_balance("2025-01-01", ACCOUNT) == 800
+    assert ledger.get_balance("2025-01-02") == 850
+    assert ledger.get_balance() == 1_350
+    assert ledger.get_balance("2024-12-31") == 0
+
+    # the day's last posting is corrected, and T3 moves to another day
+    _load(tmp_path, "corrected", [
+        _row("T2", ACCOUNT, "2025-01-01", "DEBIT", 300, 700),
+        _row("T3", ACCOUNT, "2025-01-05", "CREDIT", 600, 1_300),
+    ])
+    assert ledger.get_balance("2025-01-01", ACCOUNT) == 700
+    assert ledger.get_balance("2025-01-03", ACCOUNT) == 700
+    assert ledger.get_balance("2025-01-05", ACCOUNT) == 1_300
+    assert list(ledger.balance_on(["2025-01-01", "2025-01-03", "2025-01-05"])) == [700, 750, 1_350]
+
+    with connection() as conn:
+        incremental = conn.execute("SELECT * FROM account_daily_balance ORDER BY 1, 2").fetchall()
+    assert incremental == _ledger()
+    assert ("HDFC-CA-1", "2025-01-03") not in {r[:2] for r in incremental}
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.db import connection
+from core.llm_cache import CachedLLM
+
+
+class SlowModel:
+    """Blocks every call until `release` is set, and counts calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        with self._lock:
+            self.calls += 1
+        self.release.wait(5)
+        return AIMessage(content=f"answer {self.calls}")
+
+
+def test_identical_prompts_in_flight_share_one_call(db):
+    model = SlowModel()
+    llm = CachedLLM(model, "fake", persist=False)
+    prompt = [HumanMessage(content="What is our cash balance?")]
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(llm.invoke(prompt))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while llm.stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    model.release.set()
+    for t in threads:
+        t.join(5)
+
+    assert model.calls == 1
+    assert [r.content for r in results] == ["answer 1"] * 5
+    assert llm.stats()["misses"] == 1
+
+
+def test_disk_cache_serves_until_ttl_then_calls_again(db):
+    model = SlowModel()
+    model.release.set()
+    prompt = [HumanMessage(content="Top vendors this month")]
+
+    assert CachedLLM(model, "fake", disk_ttl_s=3600).invoke(prompt).content == "answer 1"
+    # a new process starts with an empty memory tier and reads the disk
+    fresh = CachedLLM(model, "fake", disk_ttl_s=3600)
+    assert fresh.invoke(prompt).content == "answer 1"
+    assert fresh.stats()["disk_hits"] == 1
+
+    with connection() as conn:
+        with conn:
+            conn.execute("UPDATE llm_responses SET created_at = datetime('now', '-2 hours')")
+    assert CachedLLM(model, "fake", disk_ttl_s=3600).invoke(prompt).content == "answer 2"
+    assert model.calls == 2
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+
+from core import normalize
+from core.data_loader import load_csv
+from core.db import connection
+
+COLUMNS = [
+    "transaction_id", "account_number", "transaction_date", "value_date", "transaction_type",
+    "amount", "balance_after", "currency", "counterparty_name", "narration", "category", "payment_mode",
+]
+ROWS = [
+    ("OK1", "AC1", "03/15/2025", "2025-03-15", " credit ", "100.005", "1000", "INR", " Acme Ltd ", "", "Misc", "NEFT"),
+    ("OK2", "AC1", "2025-03-16T10:30:00", "", "DEBIT", "-0.125", "999.87", "INR", None, "", "Misc", "NEFT"),
+    ("BADDATE", "AC1", "2025-13-45", "2025-03-15", "CREDIT", "10", "1", "INR", "X", "", "Misc", "NEFT"),
+    ("BADAMT", "AC1", "2025-03-15", "2025-03-15", "CREDIT", "ten", "1", "INR", "X", "", "Misc", "NEFT"),
+    ("BADENUM", "AC1", "2025-03-15", "2025-03-15", "REFUND", "10", "1", "INR", "X", "", "Misc", "NEFT"),
+    ("NOAMT", "AC1", "2025-03-15", "2025-03-15", "CREDIT", "", "1", "INR", "X", "", "Misc", "NEFT"),
+    (None, "AC1", "2025-03-15", "2025-03-15", "CREDIT", "10", "1", "INR", "X", "", "Misc", "NEFT"),
+]
+REASONS = {
+    "BADDATE": "unparseable date in transaction_date",
+    "BADAMT": "non-numeric amount in amount",
+    "BADENUM": "unknown transaction_type",
+    "NOAMT": "missing amount",
+    None: "missing transaction_id",
+}
+
+
+def _frame():
+    return pd.DataFrame(ROWS, columns=COLUMNS, dtype=object)
+
+
+def test_valid_rows_are_normalized():
+    clean, rejects = normalize.normalize("bank_statements", _frame())
+    clean = clean.set_index("transaction_id")
+
+    assert list(clean.index) == ["OK1", "OK2"]
+    assert list(clean["transaction_date"]) == ["2025-03-15", "2025-03-16"]
+    assert clean.loc["OK2", "value_date"] is None
+    assert list(clean["transaction_type"]) == ["CREDIT", "DEBIT"]
+    assert list(clean["amount"]) == [100.01, -0.13]
+    assert list(clean["year_month"]) == ["2025-03", "2025-03"]
+    assert list(clean["counterparty_key"]) == ["acme ltd", ""]
+
+
+def test_malformed_rows_are_rejected_with_a_reason():
+    _, rejects = normalize.normalize("bank_statements", _frame())
+    reasons = dict(zip(rejects["transaction_id"].where(rejects["transaction_id"].notna(), None),
+                       rejects["reason"]))
+    assert reasons == REASONS
+    # rejects keep the values as read
+    assert rejects.set_index("reason").loc["unparseable date in transaction_date", "transaction_date"] == "2025-13-45"
+
+
+def test_load_quarantines_rejects_once_and_loads_the_rest(db, tmp_path):
+    path = tmp_path / "bank.csv"
+    _frame().to_csv(path, index=False)
+    assert load_csv("bank_statements", str(path)) == 2
+
+    with connection() as conn:
+        loaded = [r[0] for r in conn.execute("SELECT transaction_id FROM bank_statements ORDER BY 1")]
+    assert loaded == ["OK1", "OK2"]
+
+    stored = normalize.get_quarantine("bank_statements")
+    assert sorted(stored["reason"]) == sorted(REASONS.values())
+    assert set(stored["source_path"]) == {str(path)}
+
+    # a rewritten file is re-ingested from the start
+    os.utime(path, (0, 0))
+    assert load_csv("bank_statements", str(path)) == 2
+    assert len(normalize.get_quarantine("bank_statements")) == len(REASONS)
@@ -0,0 +1,32 @@
+import pytest
+
+from core import reconciliation
+from core.db import connection
+
+MATCHES_SQL = """
+    SELECT document_type, document_id, transaction_id, amount_diff, days_from_due, method
+    FROM reconciliation_matches
+"""
+
+TABLES = ("bank_statements", "vendor_invoices", "client_invoices", "expense_receipts")
+
+
+def _matches():
+    with connection() as conn:
+        return set(conn.execute(MATCHES_SQL).fetchall())
+
+
+@pytest.mark.parametrize("order, chunksize", [
+    (TABLES, 700),
+    (TABLES[::-1], 700),
+    (TABLES, 50_000),
+])
+def test_incremental_matches_equal_rebuild(load_sample, order, chunksize):
+    load_sample(*order, chunksize=chunksize)
+    incremental = _matches()
+    assert incremental
+
+    with connection() as conn:
+        with conn:
+            reconciliation.rebuild(conn.cursor())
+    assert _matches() == incremental
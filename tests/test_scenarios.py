@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import scenarios
+from core.scenarios import DELAY, ScenarioBaseline, evaluate, evaluate_grid, tornado
+
+CATEGORIES = scenarios.CATEGORIES + ("Other",)
+HORIZON = 10
+
+
+def _baseline(opening=100.0):
+    """Salary -10/day, collections +15/day, rent -50 on day 3."""
+    daily = np.zeros((len(CATEGORIES), HORIZON))
+    daily[CATEGORIES.index("Salary")] = -10.0
+    daily[CATEGORIES.index("Client Collection")] = 15.0
+    daily[CATEGORIES.index("Rent"), 3] = -50.0
+    return ScenarioBaseline(
+        start_date=pd.Timestamp("2026-01-01"),
+        window=("2025-12-22", "2025-12-31"),
+        opening_balance=opening,
+        categories=CATEGORIES,
+        cumulative=np.cumsum(daily, axis=1),
+        outflow_30d=np.maximum(-daily, 0).sum(axis=1),
+    )
+
+
+def test_zero_shock_is_the_baseline():
+    baseline = _baseline()
+    expected = baseline.opening_balance + baseline.cumulative.sum(axis=0)
+
+    result = evaluate(baseline, {})
+    assert result.end_balance[0] == pytest.approx(expected[-1])
+    assert result.min_balance[0] == pytest.approx(expected.min())
+    assert result.runway_days[0] == HORIZON
+    assert result.outflow_30d[0] == pytest.approx(baseline.outflow_30d.sum())
+
+
+def test_shocks_move_the_balance_by_their_share():
+    baseline = _baseline()
+    base = evaluate(baseline, {}).end_balance[0]
+    salary = baseline.cumulative[CATEGORIES.index("Salary"), -1]
+
+    result = evaluate(baseline, {"Salary": [-20, 0, 20]})
+    np.testing.assert_allclose(result.end_balance - base, [-0.2 * salary, 0, 0.2 * salary])
+    assert result.end_balance[2] < base < result.end_balance[0]
+
+    # a 4-day collection delay loses the last four days of collections
+    delayed = evaluate(baseline, {}, delays=[4])
+    assert delayed.end_balance[0] == pytest.approx(base - 4 * 15.0)
+
+    # with a thinner opening balance, the delay makes day 3's rent overdraw
+    tight = _baseline(opening=40.0)
+    assert evaluate(tight, {}).runway_days[0] == HORIZON
+    assert evaluate(tight, {}, delays=[4]).runway_days[0] == 3
+
+
+def test_grid_and_tornado_report_deltas_against_the_baseline():
+    baseline = _baseline()
+    base = evaluate(baseline, {}).end_balance[0]
+
+    grid = evaluate_grid(baseline, {"Salary": [0, 50], DELAY: [0, 4]})
+    assert len(grid) == 4
+    row = grid[(grid["Salary"] == 0) & (grid[DELAY] == 0)].iloc[0]
+    assert row["end_balance"] == pytest.approx(base)
+    row = grid[(grid["Salary"] == 50) & (grid[DELAY] == 4)].iloc[0]
+    assert row["end_balance"] == pytest.approx(base - 0.5 * 10 * HORIZON - 4 * 15.0)
+
+    swings = tornado(baseline, {"Salary": (-10, 10), "Rent": (-10, 10)}).set_index("driver")
+    assert swings.loc["Salary", "at_high"] == pytest.approx(-0.1 * 10 * HORIZON)
+    assert swings.loc["Rent", "at_low"] == pytest.approx(0.1 * 50)
+    assert list(swings.index) == ["Rent", "Salary"]     # smallest swing first
+
+
+def test_sample_baseline_zero_shock_matches_its_flows(load_sample):
+    load_sample("bank_statements")
+    baseline = scenarios.load_baseline()
+
+    assert baseline.window[1] == (baseline.start_date - pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    grid = evaluate_grid(baseline, {"Salary": [0, 25]})
+    flows = baseline.cumulative.sum(axis=0)
+    assert grid["end_balance"][0] == pytest.approx(baseline.opening_balance + flows[-1])
+    assert grid["end_balance"][1] < grid["end_balance"][0]      # salary is an outflow